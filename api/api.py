@@ -1,32 +1,45 @@
 from fastapi import FastAPI
-import os
+import datetime
+import math
 import uuid
 from contextlib import asynccontextmanager
 
-import redis.asyncio as redis
 from fastapi import Depends, FastAPI, HTTPException, Request
-from fastapi_limiter import FastAPILimiter
+from fastapi_limiter import FastAPILimiter, default_identifier
 from fastapi_limiter.depends import RateLimiter
 from playwright.async_api import async_playwright
-from pydantic import BaseModel, Field, validator
+from typing import Any, Dict, List, Literal, Optional
 
+from pydantic import BaseModel, Field, ValidationError, validator
+
+from src.browser.admission import AdmissionController, AdmissionRejectedError
+from src.browser.browser_pool import BrowserPool
+from src.browser.request_filter import RequestFilter
+from src.cache.result_cache import create_result_cache
 from src.config.config import (
+    API_BATCH_MAX_ITEMS,
+    API_BROWSER_POOL_SIZE,
+    API_RETRY_AFTER_SECONDS,
+    RATE_LIMIT_ITEMS_BATCH,
+    RATE_LIMIT_ITEMS_SECONDS_BATCH,
+    RATE_LIMIT_SECONDS_BATCH,
     RATE_LIMIT_SECONDS_HEALTH,
     RATE_LIMIT_SECONDS_SCRAPE,
+    RATE_LIMIT_TIMES_BATCH,
     RATE_LIMIT_TIMES_HEALTH,
     RATE_LIMIT_TIMES_SCRAPE,
+    REQUEST_FILTER_ENABLED,
 )
 from src.config.logger import get_logger
 from src.models.clave_unica import ClaveUnica
-from src.queue.deduplicator import Deduplicator
+from src.parsers.parse_executor import shutdown_parse_executor
+from src.queue.deduplicator import AsyncDeduplicator
 from src.queue.models import Task
-from src.queue.queue_manager import QueueManager
-from src.scrapers.AFC_scraper import AFCScraper
-from src.scrapers.captcha_solver import RecaptchaSolver
-from src.scrapers.CMF_scraper import CMFScraper
-from src.scrapers.login_scraper import LoginScraper
-from src.scrapers.login_strategies.clave_unica_strategy import ClaveUnicaLoginStrategy
-from src.scrapers.SII_scraper import SIIScraper
+from src.queue.queue_manager import AsyncQueueManager
+from src.queue.redis_client import close_async_redis, get_async_redis
+from src.scrapers.scraper_factory import build_scraper
+from src.session.session_cache import create_session_cache
+from src.utils.metrics import metrics
 from src.utils.rut_validator import validate_rut
 
 logger = get_logger(__name__)
@@ -36,22 +49,29 @@ logger = get_logger(__name__)
 async def lifespan(app: FastAPI):
     """Context manager for managing the lifespan of the FastAPI application.
 
-    Initializes Redis connection and FastAPILimiter.
+    Initializes FastAPILimiter on the shared Redis pool (also used by the queue and deduplication),
+    and the browser pool and admission control shared by the synchronous scraping endpoints.
     """
-    redis_host = os.getenv("REDISHOST", "localhost")
-    redis_port = int(os.getenv("REDISPORT", 6379))
-    redis_password = os.getenv("REDISPASSWORD", None) or None
-
-    redis_instance = redis.Redis(
-        host=redis_host,
-        port=redis_port,
-        password=redis_password,
-        encoding="utf-8",
-        decode_responses=True
-    )
+    redis_instance = get_async_redis()
     app.state.redis = redis_instance
     await FastAPILimiter.init(redis_instance)
-    yield
+
+    app.state.browser_pool = None
+    app.state.admission = AdmissionController("api.sync")
+    playwright = await async_playwright().start() if API_BROWSER_POOL_SIZE > 0 else None
+    try:
+        if playwright is not None:
+            app.state.browser_pool = BrowserPool(playwright, size=API_BROWSER_POOL_SIZE)
+            await app.state.browser_pool.start()
+        yield
+    finally:
+        if app.state.browser_pool is not None:
+            await app.state.browser_pool.close()
+        if playwright is not None:
+            await playwright.stop()
+        # Parsing for the sync endpoints runs in the shared parse executor
+        shutdown_parse_executor()
+        await close_async_redis()
 
 
 app = FastAPI(
@@ -96,8 +116,103 @@ async def health_check(request: Request):
         redis_status = "error"
     return {"status": "ok", "redis": redis_status}
 
-queue_manager = QueueManager()
-deduplicator = Deduplicator()
+
+@app.get("/metrics", tags=["Health"],
+         dependencies=[Depends(RateLimiter(
+             times=RATE_LIMIT_TIMES_HEALTH, seconds=RATE_LIMIT_SECONDS_HEALTH))],
+         )
+async def get_metrics(request: Request):
+    """Return the API metrics, the synchronous scraping occupancy, the browser pool health and the queue lanes."""
+    browser_pool = request.app.state.browser_pool
+    return {
+        "metrics": metrics.snapshot(),
+        "sync_admission": request.app.state.admission.stats(),
+        "browser_pool": browser_pool.stats() if browser_pool is not None else None,
+        "queue_lanes": await queue_manager.lane_stats(),
+    }
+
+
+queue_manager = AsyncQueueManager()
+deduplicator = AsyncDeduplicator()
+session_cache = create_session_cache()
+result_cache = create_result_cache()
+
+
+async def enqueue_unique(task: Task) -> Optional[str]:
+    """Enqueue a task unless the same user, webhook and scraper type was submitted within the dedup TTL.
+
+    The check, the dedup mark and the enqueue are one atomic Redis call. Returns the existing task id
+    for a duplicate, else None.
+    """
+    return await queue_manager.enqueue_unique(task, deduplicator.key_for(task), deduplicator.ttl)
+
+
+# Charge ARGV[1] items to a client's budget (KEYS[1]) of ARGV[2] items per ARGV[3] ms, unless they do not fit.
+# Returns 0 once charged, else the milliseconds left until the budget resets
+BATCH_ITEM_BUDGET_SCRIPT = """
+local used = tonumber(redis.call('GET', KEYS[1]) or '0')
+if used + tonumber(ARGV[1]) > tonumber(ARGV[2]) then
+    return math.max(redis.call('PTTL', KEYS[1]), 1)
+end
+if used == 0 then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[3])
+else
+    redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+return 0
+"""
+batch_item_budget = get_async_redis().register_script(BATCH_ITEM_BUDGET_SCRIPT)
+
+
+async def charge_batch_items(http_request: Request, items: int):
+    """Charge the items of a batch to its client's item budget, responding 429 with Retry-After once it is spent.
+
+    Clients are told apart the same way as by the rate limiter.
+    """
+    if items > RATE_LIMIT_ITEMS_BATCH:
+        raise HTTPException(status_code=413,
+                            detail=f"A batch may hold at most RATE_LIMIT_ITEMS_BATCH ({RATE_LIMIT_ITEMS_BATCH}) items.")
+    identifier = await (FastAPILimiter.identifier or default_identifier)(http_request)
+    key = f"{FastAPILimiter.prefix}:batch_items:{identifier}"
+    pexpire = await batch_item_budget(keys=[key], args=[items, RATE_LIMIT_ITEMS_BATCH,
+                                                       RATE_LIMIT_ITEMS_SECONDS_BATCH * 1000])
+    if pexpire:
+        raise HTTPException(status_code=429, detail="Batch item budget exceeded.",
+                            headers={"Retry-After": str(math.ceil(int(pexpire) / 1000))})
+
+
+async def run_sync_scrape(http_request: Request, scraper_type: str, clave_unica: ClaveUnica,
+                          years: Optional[List[int]] = None):
+    """Run a scraper in a context of the API browser pool, once admission control lets the request in.
+
+    With the result cache, a fresh cached result is returned right away and callers of an identical scrape
+    in flight wait for its result without taking a slot. Responds 503 with Retry-After when no slot frees
+    up in time, and 500 when the scraper fails.
+    """
+    browser_pool: Optional[BrowserPool] = http_request.app.state.browser_pool
+    if browser_pool is None:
+        raise HTTPException(status_code=503, detail="Synchronous scraping is disabled on this API node.",
+                            headers={"Retry-After": str(API_RETRY_AFTER_SECONDS)})
+
+    async def scrape():
+        async with http_request.app.state.admission.admit():
+            async with browser_pool.context() as context:
+                if REQUEST_FILTER_ENABLED:
+                    await RequestFilter().attach(context)
+                scraper = build_scraper(scraper_type, context, clave_unica, session_cache=session_cache,
+                                        years=years)
+                return await scraper.run()
+
+    try:
+        if result_cache is not None:
+            return await result_cache.get_or_run(clave_unica, scrape, scraper_type, years=years)
+        return await scrape()
+    except AdmissionRejectedError as e:
+        logger.warning(f"Synchronous {scraper_type} scrape rejected: {e}")
+        raise HTTPException(status_code=503, detail=f"Too many synchronous scrapes in progress. {e}",
+                            headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 class CMFScraperRequest(BaseModel):
@@ -121,6 +236,57 @@ class CMFScraperAsyncRequest(CMFScraperRequest):
 
     webhook_url: str = Field(...,
                              description="URL to send the scraping results")
+    priority: Literal['normal', 'high'] = Field(
+        'normal', description="Queue priority; high priority tasks of a scraper type are taken before normal ones")
+
+
+class AFCScraperRequest(CMFScraperRequest):
+    """Request model for AFC scraper, optionally choosing the cotizaciones years."""
+
+    years: Optional[List[int]] = Field(
+        None, min_length=1, max_length=10,
+        description="Cotizaciones years to fetch concurrently (defaults to the current year and two earlier ones)")
+
+    @validator('years')
+    def years_must_be_in_range(cls, v):  # noqa: N805
+        """Accept years from the start of the unemployment insurance (2002) to the current one, without repeats."""
+        if v is None:
+            return v
+        current_year = datetime.date.today().year
+        for year in v:
+            if not 2002 <= year <= current_year:
+                raise ValueError(f'Year {year} is outside 2002-{current_year}')
+        return list(dict.fromkeys(v))
+
+
+class AFCScraperAsyncRequest(CMFScraperAsyncRequest, AFCScraperRequest):
+    """Request model for asynchronous AFC scraper with webhook URL and cotizaciones years."""
+
+
+class MultiScraperAsyncRequest(AFCScraperAsyncRequest):
+    """Request model for an asynchronous scrape of several sources with one login."""
+
+    sources: List[Literal['cmf', 'afc', 'sii']] = Field(
+        default=['cmf', 'afc', 'sii'], min_length=1,
+        description="Sources to scrape concurrently in the same browser session")
+
+
+class BatchScrapeItem(MultiScraperAsyncRequest):
+    """One item of a batch submission: a scraper type, credentials and its webhook URL.
+
+    ``years`` applies to the 'afc' and 'all' types and ``sources`` to 'all'.
+    """
+
+    scraper_type: Literal['cmf', 'afc', 'sii', 'all'] = Field(..., description="Scraper to run for this item")
+
+
+class BatchScrapeAsyncRequest(BaseModel):
+    """Request model for submitting many asynchronous scraping tasks at once."""
+
+    items: List[Dict[str, Any]] = Field(
+        ..., min_length=1, max_length=API_BATCH_MAX_ITEMS,
+        description="Tasks to enqueue, each with scraper_type, username, password and webhook_url (plus optional "
+                    "years and sources). Items are validated one by one; an invalid item is rejected on its own.")
 
 
 cmf_scrape_example_response = {
@@ -201,27 +367,14 @@ cmf_scrape_example_response = {
               }
           }
           )
-async def scrape_cmf(request: CMFScraperRequest):
+async def scrape_cmf(request: CMFScraperRequest, http_request: Request):
     """Scrape CMF data synchronously."""
-    try:
-        clave_unica = ClaveUnica(
-            rut=request.username,
-            password=request.password
-        )
-
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context()
-
-            login_scraper = LoginScraper(ClaveUnicaLoginStrategy())
-            cmf_scraper = CMFScraper(
-                context=context, login_scraper=login_scraper, clave_unica=clave_unica)
-
-            data = await cmf_scraper.run()
-            await browser.close()
-            return {"status": "success", "data": data}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    clave_unica = ClaveUnica(
+        rut=request.username,
+        password=request.password
+    )
+    data = await run_sync_scrape(http_request, 'cmf', clave_unica)
+    return {"status": "success", "data": data}
 
 
 @app.post("/scrape/afc",
@@ -229,26 +382,14 @@ async def scrape_cmf(request: CMFScraperRequest):
           response_description="AFC data scraped successfully",
           tags=["sync"]
           )
-async def scrape_afc(request: CMFScraperRequest):
+async def scrape_afc(request: AFCScraperRequest, http_request: Request):
     """Scrape AFC data synchronously."""
-    try:
-        clave_unica = ClaveUnica(
-            rut=request.username,
-            password=request.password
-        )
-
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context()
-            login_scraper = LoginScraper(ClaveUnicaLoginStrategy())
-            afc_scraper = AFCScraper(context=context, login_scraper=login_scraper,
-                                     clave_unica=clave_unica, captcha_solver=RecaptchaSolver())
-
-            data = await afc_scraper.run()
-            await browser.close()
-            return {"status": "success", "data": data}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    clave_unica = ClaveUnica(
+        rut=request.username,
+        password=request.password
+    )
+    data = await run_sync_scrape(http_request, 'afc', clave_unica, years=request.years)
+    return {"status": "success", "data": data}
 
 
 sii_scrape_example_response = {
@@ -290,26 +431,14 @@ sii_scrape_example_response = {
               }
           }
           )
-async def scrape_sii(request: CMFScraperRequest):
+async def scrape_sii(request: CMFScraperRequest, http_request: Request):
     """Scrape SII data synchronously."""
-    try:
-        clave_unica = ClaveUnica(
-            rut=request.username,
-            password=request.password
-        )
-
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context()
-            login_scraper = LoginScraper(ClaveUnicaLoginStrategy())
-            sii_scraper = SIIScraper(context=context, login_scraper=login_scraper,
-                                     clave_unica=clave_unica, captcha_solver=RecaptchaSolver())
-
-            data = await sii_scraper.run()
-            await browser.close()
-            return {"status": "success", "data": data}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    clave_unica = ClaveUnica(
+        rut=request.username,
+        password=request.password
+    )
+    data = await run_sync_scrape(http_request, 'sii', clave_unica)
+    return {"status": "success", "data": data}
 
 
 @app.post("/async/scrape/cmf",
@@ -319,11 +448,6 @@ async def scrape_sii(request: CMFScraperRequest):
           )
 async def async_scrape_cmf(request: CMFScraperAsyncRequest):
     """Scrape CMF data asynchronously by enqueuing a task."""
-    if deduplicator.is_duplicate(request.username, request.webhook_url):
-        logger.info(
-            f"Duplicate task detected for user {request.username}. Rejecting.")
-        return {"status": "rejected", "message": "Duplicate task detected within the last 5 minutes."}
-
     task_id = str(uuid.uuid4())
     task = Task(
         task_id=task_id,
@@ -331,11 +455,16 @@ async def async_scrape_cmf(request: CMFScraperAsyncRequest):
         password=request.password,
         webhook_url=request.webhook_url,
         scraper_type='cmf',
+        priority=request.priority,
         retries=0,
         max_retries=3
     )
-    queue_manager.enqueue(task)
-    deduplicator.mark_as_processed(request.username, request.webhook_url)
+    existing_task_id = await enqueue_unique(task)
+    if existing_task_id:
+        logger.info(
+            f"Duplicate task detected for user {request.username}. Rejecting.")
+        return {"status": "rejected", "task_id": existing_task_id,
+                "message": "Duplicate task detected within the last 5 minutes."}
     logger.info(
         f"Task {task_id} enqueued successfully for user {request.username}.")
     return {"status": "accepted", "task_id": task_id, "message": "CMF scraping task enqueued successfully"}
@@ -348,13 +477,8 @@ async def async_scrape_cmf(request: CMFScraperAsyncRequest):
           response_description="AFC scraping task accepted",
           tags=["async"]
           )
-async def async_scrape_afc(request: CMFScraperAsyncRequest):
+async def async_scrape_afc(request: AFCScraperAsyncRequest):
     """Scrape AFC data asynchronously by enqueuing a task."""
-    if deduplicator.is_duplicate(request.username, request.webhook_url):
-        logger.info(
-            f"Duplicate task detected for user {request.username}. Rejecting.")
-        return {"status": "rejected", "message": "Duplicate task detected within the last 5 minutes."}
-
     task_id = str(uuid.uuid4())
     task = Task(
         task_id=task_id,
@@ -362,11 +486,17 @@ async def async_scrape_afc(request: CMFScraperAsyncRequest):
         password=request.password,
         webhook_url=request.webhook_url,
         scraper_type='afc',
+        years=request.years,
+        priority=request.priority,
         retries=0,
         max_retries=3
     )
-    queue_manager.enqueue(task)
-    deduplicator.mark_as_processed(request.username, request.webhook_url)
+    existing_task_id = await enqueue_unique(task)
+    if existing_task_id:
+        logger.info(
+            f"Duplicate task detected for user {request.username}. Rejecting.")
+        return {"status": "rejected", "task_id": existing_task_id,
+                "message": "Duplicate task detected within the last 5 minutes."}
     logger.info(
         f"Task {task_id} enqueued successfully for user {request.username}.")
     return {"status": "accepted", "task_id": task_id, "message": "AFC scraping task enqueued successfully"}
@@ -381,23 +511,118 @@ async def async_scrape_afc(request: CMFScraperAsyncRequest):
           )
 async def async_scrape_sii(request: CMFScraperAsyncRequest):
     """Scrape SII data asynchronously by enqueuing a task."""
-    if deduplicator.is_duplicate(request.username, request.webhook_url):
+    task_id = str(uuid.uuid4())
+    task = Task(
+        task_id=task_id,
+        username=request.username,
+        password=request.password,
+        webhook_url=request.webhook_url,
+        scraper_type='sii',
+        priority=request.priority,
+        retries=0,
+        max_retries=3
+    )
+    existing_task_id = await enqueue_unique(task)
+    if existing_task_id:
         logger.info(
             f"Duplicate task detected for user {request.username}. Rejecting.")
-        return {"status": "rejected", "message": "Duplicate task detected within the last 5 minutes."}
+        return {"status": "rejected", "task_id": existing_task_id,
+                "message": "Duplicate task detected within the last 5 minutes."}
+    logger.info(
+        f"Task {task_id} enqueued successfully for user {request.username}.")
+    return {"status": "accepted", "task_id": task_id, "message": "SII scraping task enqueued successfully"}
+
+
+@app.post("/async/scrape/all",
+          summary="Scrape several sources asynchronously with one login",
+          dependencies=[Depends(RateLimiter(
+              times=RATE_LIMIT_TIMES_SCRAPE, seconds=RATE_LIMIT_SECONDS_SCRAPE))],
+          response_description="Combined scraping task accepted",
+          tags=["async"]
+          )
+async def async_scrape_all(request: MultiScraperAsyncRequest):
+    """Scrape CMF, AFC and/or SII in one browser session by enqueuing a single combined task.
 
+    The results of every source are merged into one webhook notification.
+    """
     task_id = str(uuid.uuid4())
     task = Task(
         task_id=task_id,
         username=request.username,
         password=request.password,
         webhook_url=request.webhook_url,
-        scraper_type='sii',
+        scraper_type='all',
+        sources=list(dict.fromkeys(request.sources)),
+        years=request.years,
+        priority=request.priority,
         retries=0,
         max_retries=3
     )
-    queue_manager.enqueue(task)
-    deduplicator.mark_as_processed(request.username, request.webhook_url)
+    existing_task_id = await enqueue_unique(task)
+    if existing_task_id:
+        logger.info(
+            f"Duplicate task detected for user {request.username}. Rejecting.")
+        return {"status": "rejected", "task_id": existing_task_id,
+                "message": "Duplicate task detected within the last 5 minutes."}
     logger.info(
         f"Task {task_id} enqueued successfully for user {request.username}.")
-    return {"status": "accepted", "task_id": task_id, "message": "SII scraping task enqueued successfully"}
+    return {"status": "accepted", "task_id": task_id, "message": "Combined scraping task enqueued successfully"}
+
+
+def batch_item_task(item: BatchScrapeItem) -> Task:
+    """Build the task of a validated batch item, keeping only the options its scraper type uses."""
+    return Task(
+        task_id=str(uuid.uuid4()),
+        username=item.username,
+        password=item.password,
+        webhook_url=item.webhook_url,
+        scraper_type=item.scraper_type,
+        sources=list(dict.fromkeys(item.sources)) if item.scraper_type == 'all' else None,
+        years=item.years if item.scraper_type in ('afc', 'all') else None,
+        priority=item.priority,
+        retries=0,
+        max_retries=3
+    )
+
+
+@app.post("/async/scrape/batch",
+          summary="Submit many asynchronous scraping tasks at once",
+          dependencies=[Depends(RateLimiter(
+              times=RATE_LIMIT_TIMES_BATCH, seconds=RATE_LIMIT_SECONDS_BATCH))],
+          response_description="Per-item task ids or rejection reasons",
+          tags=["async"]
+          )
+async def async_scrape_batch(request: BatchScrapeAsyncRequest, http_request: Request):
+    """Validate a batch of tasks and enqueue the valid, non-duplicate ones in one Redis transaction.
+
+    Every item is charged to the client's batch item budget first. The response lists, in request order,
+    each item's task id, or why it was rejected (invalid, or a duplicate of a task submitted within the
+    last 5 minutes, possibly earlier in the same batch).
+    """
+    await charge_batch_items(http_request, len(request.items))
+    results: List[Dict[str, Any]] = [{} for _ in request.items]
+    entries = []
+    for index, raw_item in enumerate(request.items):
+        try:
+            item = BatchScrapeItem.model_validate(raw_item)
+        except ValidationError as e:
+            reason = "; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                               for error in e.errors())
+            results[index] = {"index": index, "status": "rejected", "reason": f"Invalid item: {reason}"}
+            continue
+        task = batch_item_task(item)
+        entries.append((index, task))
+
+    existing_task_ids = await queue_manager.enqueue_unique_many(
+        [(task, deduplicator.key_for(task)) for _, task in entries], deduplicator.ttl)
+    for (index, task), existing_task_id in zip(entries, existing_task_ids):
+        if existing_task_id:
+            results[index] = {"index": index, "status": "rejected", "task_id": existing_task_id,
+                              "reason": "Duplicate task detected within the last 5 minutes."}
+        else:
+            results[index] = {"index": index, "status": "accepted", "task_id": task.task_id}
+
+    accepted = sum(1 for result in results if result["status"] == "accepted")
+    logger.info(f"Batch of {len(results)} items: {accepted} tasks enqueued, {len(results) - accepted} rejected.")
+    return {"status": "accepted" if accepted else "rejected", "accepted": accepted,
+            "rejected": len(results) - accepted, "items": results}
@@ -10,7 +10,7 @@ from playwright.async_api import async_playwright
 
 from src.models.clave_unica import ClaveUnica
 from src.scrapers.AFC_scraper import AFCScraper
-from src.scrapers.captcha_solver import RecaptchaSolver
+from src.scrapers.captcha_solver import get_captcha_solver
 from src.scrapers.CMF_scraper import CMFScraper
 from src.scrapers.login_scraper import LoginScraper
 from src.scrapers.SII_scraper import SIIScraper
@@ -45,6 +45,8 @@ async def main():
                             help="Usuario (RUT) para iniciar sesión")
     afc_parser.add_argument("--password", required=True,
                             help="Contraseña para iniciar sesión")
+    afc_parser.add_argument("--years", type=int, nargs="+",
+                            help="Años de cotizaciones a consultar (por defecto, el actual y dos anteriores)")
 
     afc_parser = subparsers.add_parser(
         "sii", help="Ejecuta el scraper de la SII")
@@ -99,7 +101,8 @@ async def main():
             from src.scrapers.login_strategies.clave_unica_strategy import ClaveUnicaLoginStrategy
             login_scraper = LoginScraper(ClaveUnicaLoginStrategy())
             afc_scraper = AFCScraper(
-                context=context, login_scraper=login_scraper, clave_unica=clave_unica, captcha_solver=RecaptchaSolver())
+                context=context, login_scraper=login_scraper, clave_unica=clave_unica,
+                captcha_solver=get_captcha_solver(), years=args.years)
 
             try:
                 data = await afc_scraper.run()
@@ -124,7 +127,8 @@ async def main():
             from src.scrapers.login_strategies.clave_unica_strategy import ClaveUnicaLoginStrategy
             login_scraper = LoginScraper(ClaveUnicaLoginStrategy())
             sii_scraper = SIIScraper(
-                context=context, login_scraper=login_scraper, clave_unica=clave_unica, captcha_solver=RecaptchaSolver())
+                context=context, login_scraper=login_scraper, clave_unica=clave_unica,
+                captcha_solver=get_captcha_solver())
 
             try:
                 data = await sii_scraper.run()
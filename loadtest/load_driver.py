@@ -0,0 +1,189 @@
+"""Submit synthetic tasks to the async API and report throughput and end-to-end latency per scraper type.
+
+    python -m loadtest.load_driver --api http://localhost:8000 --tasks 200 --types cmf,afc,sii --rate 10
+
+Latency is measured from submitting a task until its result reaches the webhook receiver this driver
+runs, so the worker must be able to reach --webhook-base-url. Every task uses a different random RUT,
+which keeps the deduplicator from rejecting it.
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+
+SCRAPER_TYPES = ('cmf', 'afc', 'sii', 'all')
+
+
+@dataclass
+class Sample:
+    """One submitted task."""
+
+    scraper_type: str
+    submitted_at: float
+    completed_at: Optional[float] = None
+    # accepted -> success | failed from the webhook; rejected if the API refused it; lost if no webhook arrived
+    status: str = 'pending'
+
+    @property
+    def latency(self) -> float:
+        """Seconds from submission until the result reached the webhook; NaN while none did."""
+        if self.completed_at is None:
+            return math.nan
+        return self.completed_at - self.submitted_at
+
+
+def random_rut() -> str:
+    """Return a random RUT with a valid check digit, in XX.XXX.XXX-Y format."""
+    body = random.randint(5_000_000, 25_999_999)
+    total, factor = 0, 2
+    for digit in reversed(str(body)):
+        total += int(digit) * factor
+        factor = 2 if factor == 7 else factor + 1
+    dv = {11: '0', 10: 'K'}.get(11 - total % 11, str(11 - total % 11))
+    return f'{body:,}'.replace(',', '.') + f'-{dv}'
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile; NaN for no values."""
+    if not values:
+        return math.nan
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def report(samples: List[Sample], types: List[str]):
+    """Print per-type counts, throughput and latency percentiles."""
+    print(
+        f'{"type":6} {"sent":>6} {"ok":>6} {"failed":>7} {"rejected":>9} {"lost":>6} '
+        f'{"tasks/s":>8} {"p50 s":>8} {"p95 s":>8} {"p99 s":>8}'
+    )
+    for scraper_type in [*types, 'total']:
+        group = [s for s in samples if scraper_type in ('total', s.scraper_type)]
+        completed = [s for s in group if s.completed_at is not None]
+        latencies = [s.latency for s in completed]
+        finished = [s.completed_at for s in completed if s.completed_at is not None]
+        elapsed = max(finished, default=0.0) - min((s.submitted_at for s in group), default=0.0)
+        counts = {
+            status: sum(1 for s in group if s.status == status) for status in ('success', 'failed', 'rejected', 'lost')
+        }
+        print(
+            f'{scraper_type:6} {len(group):6} {counts["success"]:6} {counts["failed"]:7} {counts["rejected"]:9} '
+            f'{counts["lost"]:6} {len(completed) / elapsed if elapsed > 0 else 0:8.2f} '
+            f'{percentile(latencies, 0.50):8.2f} {percentile(latencies, 0.95):8.2f} '
+            f'{percentile(latencies, 0.99):8.2f}'
+        )
+
+
+async def run(args: argparse.Namespace):
+    """Start the webhook receiver, submit the tasks at the requested rate and wait for their results."""
+    samples: Dict[str, Sample] = {}
+    all_done = asyncio.Event()
+
+    def check_done():
+        if all(s.status not in ('pending', 'accepted') for s in samples.values()) and len(samples) == args.tasks:
+            all_done.set()
+
+    receiver = FastAPI()
+
+    @receiver.post('/hook/{sample_id}')
+    async def hook(sample_id: str, request: Request):
+        payload = await request.json()
+        sample = samples.get(sample_id)
+        # Webhooks are delivered at least once; only the first one counts
+        if sample is not None and sample.completed_at is None:
+            sample.completed_at = time.perf_counter()
+            sample.status = 'success' if payload.get('status') == 'success' else 'failed'
+            check_done()
+        return {'status': 'ok'}
+
+    server = uvicorn.Server(
+        uvicorn.Config(receiver, host=args.webhook_host, port=args.webhook_port, log_level='warning')
+    )
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    types = args.types.split(',')
+    webhook_base_url = args.webhook_base_url or f'http://{args.webhook_host}:{args.webhook_port}'
+
+    async def submit(client: httpx.AsyncClient, sample_id: str, sample: Sample):
+        body = {
+            'username': random_rut(),
+            'password': args.password,
+            'webhook_url': f'{webhook_base_url}/hook/{sample_id}',
+        }
+        try:
+            response = await client.post(f'{args.api}/async/scrape/{sample.scraper_type}', json=body)
+            accepted = response.status_code == 200 and response.json().get('status') == 'accepted'
+        except httpx.HTTPError:
+            accepted = False
+        if sample.completed_at is None:
+            sample.status = 'accepted' if accepted else 'rejected'
+        check_done()
+
+    interval = 1 / args.rate if args.rate else 0
+    async with httpx.AsyncClient(timeout=30) as client:
+        submissions = []
+        for n in range(args.tasks):
+            sample_id = uuid.uuid4().hex
+            samples[sample_id] = Sample(types[n % len(types)], time.perf_counter())
+            submissions.append(asyncio.create_task(submit(client, sample_id, samples[sample_id])))
+            if interval:
+                await asyncio.sleep(interval)
+        await asyncio.gather(*submissions)
+
+    try:
+        await asyncio.wait_for(all_done.wait(), timeout=args.timeout)
+    except asyncio.TimeoutError:
+        pass
+    for sample in samples.values():
+        if sample.status == 'accepted':
+            sample.status = 'lost'
+
+    server.should_exit = True
+    await server_task
+    report(list(samples.values()), types)
+
+
+def main():
+    """Run the load test."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--api', default='http://localhost:8000', help='Base URL of the API.')
+    parser.add_argument(
+        '--types',
+        default='cmf,afc,sii',
+        help=f'Comma-separated scraper types, submitted round-robin ({", ".join(SCRAPER_TYPES)}).',
+    )
+    parser.add_argument('--tasks', type=int, default=100, help='Tasks to submit.')
+    parser.add_argument('--rate', type=float, default=5.0, help='Submissions per second (0 for all at once).')
+    parser.add_argument(
+        '--password',
+        default='mock-password',
+        help="ClaveÚnica password sent with every task (the mocks reject 'invalida').",
+    )
+    parser.add_argument('--webhook-host', default='0.0.0.0', help='Interface of the webhook receiver.')
+    parser.add_argument('--webhook-port', type=int, default=8199)
+    parser.add_argument(
+        '--webhook-base-url', help='Receiver URL as seen by the worker (default http://<webhook-host>:<webhook-port>).'
+    )
+    parser.add_argument(
+        '--timeout', type=float, default=600.0, help='Seconds to wait for results after the last submission.'
+    )
+    args = parser.parse_args()
+    unknown = set(args.types.split(',')) - set(SCRAPER_TYPES)
+    if unknown:
+        parser.error(f'unknown scraper types: {", ".join(sorted(unknown))}')
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,339 @@
+"""Local stand-ins for the ClaveÚnica, CMF, AFC and SII portals, for end-to-end load tests.
+
+    python -m loadtest.mock_upstreams --latency-ms 80 --jitter-ms 40 --error-rate 0.01 --rows 20
+
+Each portal listens on its own port (ClaveÚnica on --base-port, then CMF, AFC and SII). The pages
+are built from the saved HTML corpus in tests/fixtures/html and follow the real login flows closely
+enough for the scrapers: SSO redirects through ClaveÚnica, the AFC stub reCAPTCHA and search
+postback, and the SII Carpeta Tributaria frame. On start, the environment the API and worker need
+to target the mocks is printed.
+
+Any password logs in, except INVALID_PASSWORD which gets the "Datos de acceso no válidos" error.
+"""
+
+import argparse
+import asyncio
+import datetime
+import random
+import secrets
+from dataclasses import dataclass
+from html import escape
+from typing import Dict
+from urllib.parse import parse_qs, urlencode
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
+
+from tests.fixtures.corpus import load_page
+
+INVALID_PASSWORD = 'invalida'
+
+
+@dataclass
+class Faults:
+    """Latency and errors injected into every mock response."""
+
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+
+
+def add_faults(app: FastAPI, faults: Faults):
+    """Delay every request and fail a share of them with a 503, like an overloaded portal."""
+
+    @app.middleware('http')
+    async def inject_faults(request: Request, call_next):
+        delay = faults.latency_ms + random.uniform(0, faults.jitter_ms)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if random.random() < faults.error_rate:
+            return html_page('Servicio no disponible', '<h1>Servicio no disponible</h1>', status_code=503)
+        return await call_next(request)
+
+
+def html_page(title: str, body: str, status_code: int = 200) -> HTMLResponse:
+    """Wrap ``body`` in a full HTML document."""
+    return HTMLResponse(
+        f'<!DOCTYPE html><html lang="es"><head><meta charset="utf-8"><title>{escape(title)}</title></head>'
+        f'<body>{body}</body></html>',
+        status_code=status_code,
+    )
+
+
+def redirect(url: str) -> RedirectResponse:
+    """303, so that a redirected form POST is followed with a GET."""
+    return RedirectResponse(url, status_code=303)
+
+
+async def form_data(request: Request) -> Dict[str, str]:
+    """Parse an urlencoded form body (without depending on python-multipart)."""
+    fields = parse_qs((await request.body()).decode(), keep_blank_values=True)
+    return {name: values[-1] for name, values in fields.items()}
+
+
+def authorize_url(clave_unica_base_url: str, redirect_uri: str) -> str:
+    """ClaveÚnica authorization URL returning to ``redirect_uri``."""
+    return f'{clave_unica_base_url}/openid/authorize?{urlencode({"redirect_uri": redirect_uri})}'
+
+
+def clave_unica_app(faults: Faults) -> FastAPI:
+    """ClaveÚnica: login form, error messages and SSO for an already signed-in browser."""
+    app = FastAPI()
+    add_faults(app, faults)
+    cookie = 'mock_claveunica'
+
+    def with_code(redirect_uri: str) -> str:
+        separator = '&' if '?' in redirect_uri else '?'
+        return f'{redirect_uri}{separator}code={secrets.token_hex(8)}'
+
+    def login_form(redirect_uri: str, error: str = '') -> HTMLResponse:
+        error_html = f'<p class="alert alert-danger">{escape(error)}</p>' if error else ''
+        # INGRESA is not a submit button and there are two fields, so Enter does not submit the form
+        return html_page(
+            'ClaveÚnica',
+            f"""
+            <form id="login-form" method="post" action="/openid/login">
+              <input type="hidden" name="redirect_uri" value="{escape(redirect_uri)}">
+              <input type="text" name="run" aria-label="Ingresa tu RUN" autocomplete="off">
+              <input type="password" name="password" role="textbox" aria-label="Ingresa tu ClaveÚnica">
+              {error_html}
+              <button type="button" onclick="document.getElementById('login-form').submit()">INGRESA</button>
+            </form>""",
+        )
+
+    @app.get('/openid/authorize')
+    async def authorize(request: Request, redirect_uri: str):
+        if request.cookies.get(cookie):
+            return redirect(with_code(redirect_uri))
+        return login_form(redirect_uri)
+
+    @app.post('/openid/login')
+    async def login(request: Request):
+        form = await form_data(request)
+        redirect_uri = form.get('redirect_uri', '')
+        if form.get('password') == INVALID_PASSWORD:
+            return login_form(redirect_uri, 'Datos de acceso no válidos')
+        response = redirect(with_code(redirect_uri))
+        response.set_cookie(cookie, secrets.token_hex(16))
+        return response
+
+    return app
+
+
+def cmf_app(faults: Faults, clave_unica_base_url: str, rows: int) -> FastAPI:
+    """CMF 'Conoce tu deuda': the mediator sends unauthenticated users through ClaveÚnica."""
+    app = FastAPI()
+    add_faults(app, faults)
+    cookie = 'mock_cmf'
+    dashboard = f"""
+        <div id="cmfDeuda_resumen_deuda"><p>Deuda total</p><p class="fs-44">$1.250.000</p></div>
+        {load_page('cmf_debt_table.html', rows)}
+        {load_page('cmf_credit_lines_table.html', rows)}"""
+
+    @app.get('/mediador/claveunica/')
+    async def mediador(request: Request):
+        if not request.cookies.get(cookie):
+            return redirect(authorize_url(clave_unica_base_url, f'{request.base_url}mediador/callback'))
+        return html_page('Conoce tu deuda', dashboard)
+
+    @app.get('/mediador/callback')
+    async def callback():
+        response = redirect('/mediador/claveunica/')
+        response.set_cookie(cookie, secrets.token_hex(16))
+        return response
+
+    return app
+
+
+def afc_app(faults: Faults, clave_unica_base_url: str, rows: int) -> FastAPI:
+    """AFC 'Web Afiliados': stub reCAPTCHA before ClaveÚnica, empresas and the cotizaciones search postback."""
+    app = FastAPI()
+    add_faults(app, faults)
+    cookie = 'mock_afc'
+    root = '/WUI.AAP.OVIRTUAL'
+
+    def landing(error: str = '') -> HTMLResponse:
+        error_html = f'<span class="error">{escape(error)}</span>' if error else ''
+        return html_page(
+            'AFC Web Afiliados',
+            f"""
+            <form method="post" action="{root}/Default.aspx">
+              <div class="g-recaptcha" data-sitekey="mock-site-key">Stub reCAPTCHA</div>
+              <textarea name="g-recaptcha-response" style="display: none"></textarea>
+              {error_html}
+              <input type="submit" id="btnCU" name="btnCU" value="Ingresa con ClaveÚnica">
+            </form>""",
+        )
+
+    @app.get(f'{root}/Default.aspx')
+    async def default():
+        return landing()
+
+    @app.post(f'{root}/Default.aspx')
+    async def default_post(request: Request):
+        form = await form_data(request)
+        if not form.get('g-recaptcha-response'):
+            return landing('Debe completar el captcha.')
+        return redirect(authorize_url(clave_unica_base_url, f'{request.base_url}{root.lstrip("/")}/callback'))
+
+    @app.get(f'{root}/callback')
+    async def callback():
+        response = redirect(f'{root}/WebAfiliados/Inicio.aspx')
+        response.set_cookie(cookie, secrets.token_hex(16))
+        return response
+
+    @app.get(f'{root}/WebAfiliados/Inicio.aspx')
+    async def inicio(request: Request):
+        if not request.cookies.get(cookie):
+            return redirect(f'{root}/Default.aspx')
+        return html_page('Inicio', '<h1>Bienvenido a Web Afiliados</h1>')
+
+    @app.get(f'{root}/WebAfiliados/Datos/Empresas.aspx')
+    async def empresas(request: Request):
+        if not request.cookies.get(cookie):
+            return redirect(f'{root}/Default.aspx')
+        return html_page(
+            'Empresas',
+            f'<table id="contentPlaceHolder_gvEmpresas">{load_page("afc_empresas_table.html", rows)}</table>',
+        )
+
+    def cotizaciones(year: int) -> HTMLResponse:
+        current_year = datetime.date.today().year
+        options = ''.join(
+            f'<option value="{y}"{" selected" if y == year else ""}>{y}</option>'
+            for y in range(current_year, current_year - 6, -1)
+        )
+        table = load_page('afc_cotizaciones_table.html', rows).replace(' 2023-', f' {year}-')
+        return html_page(
+            'Cotizaciones pagadas',
+            f"""
+            <form id="aspnetForm" method="post" action="CrtPagadas.aspx?periodo={year}">
+              <input type="hidden" name="__EVENTTARGET" id="__EVENTTARGET" value="">
+              <input type="hidden" name="__EVENTARGUMENT" id="__EVENTARGUMENT" value="">
+              <input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{secrets.token_urlsafe(48)}">
+              <input type="hidden" name="__EVENTVALIDATION" id="__EVENTVALIDATION" value="{secrets.token_urlsafe(24)}">
+              <script>
+                function __doPostBack(eventTarget, eventArgument) {{
+                  var form = document.getElementById("aspnetForm");
+                  form.__EVENTTARGET.value = eventTarget;
+                  form.__EVENTARGUMENT.value = eventArgument;
+                  form.submit();
+                }}
+              </script>
+              <select name="ctl00$contentPlaceHolder$ddlPeriodo" id="contentPlaceHolder_ddlPeriodo">{options}</select>
+              <a id="contentPlaceHolder_btnBuscar"
+                 href="javascript:__doPostBack('ctl00$contentPlaceHolder_btnBuscar','')">Buscar</a>
+              <table id="contentPlaceHolder_dgBusqueda">{table}</table>
+            </form>""",
+        )
+
+    @app.get(f'{root}/WebAfiliados/Certificados/CrtPagadas.aspx')
+    async def crt_pagadas(request: Request, periodo: int):
+        if not request.cookies.get(cookie):
+            return redirect(f'{root}/Default.aspx')
+        return cotizaciones(periodo)
+
+    @app.post(f'{root}/WebAfiliados/Certificados/CrtPagadas.aspx')
+    async def crt_pagadas_postback(request: Request, periodo: int):
+        if not request.cookies.get(cookie):
+            return redirect(f'{root}/Default.aspx')
+        form = await form_data(request)
+        if not form.get('__VIEWSTATE'):
+            return Response('Invalid viewstate', status_code=500)
+        return cotizaciones(int(form.get('ctl00$contentPlaceHolder$ddlPeriodo') or periodo))
+
+    return app
+
+
+def sii_app(faults: Faults, clave_unica_base_url: str, rows: int) -> FastAPI:
+    """SII: the ClaveÚnica entry point, 'Mi SII' and the Carpeta Tributaria with its 'cte' frame.
+
+    Serves the paths of zeusr.sii.cl, misiir.sii.cl and zeus.sii.cl from a single origin.
+    """
+    app = FastAPI()
+    add_faults(app, faults)
+    cookie = 'mock_sii'
+    frame_html = load_page('sii_cte_frame.html', rows)
+
+    @app.get('/cgi_AUT2000/InitClaveUnicaP.cgi')
+    async def init_clave_unica(request: Request, REF: str = ''):  # noqa: N803
+        callback = f'{request.base_url}cgi_AUT2000/callback?{urlencode({"REF": REF})}'
+        return redirect(authorize_url(clave_unica_base_url, callback))
+
+    @app.get('/cgi_AUT2000/callback')
+    async def callback(REF: str = ''):  # noqa: N803
+        response = redirect(REF.removesuffix('-GATO-') or '/cgi_misii/siihome.cgi')
+        response.set_cookie(cookie, secrets.token_hex(16))
+        return response
+
+    @app.get('/cgi_misii/siihome.cgi')
+    async def home(request: Request):
+        if not request.cookies.get(cookie):
+            return redirect('/cgi_AUT2000/InitClaveUnicaP.cgi')
+        return html_page('Mi SII', '<h1>Mi SII</h1>')
+
+    @app.get('/dii_cgi/carpeta_tributaria/cte_acreditar_renta_00.cgi')
+    async def carpeta_tributaria(request: Request):
+        if not request.cookies.get(cookie):
+            return redirect('/cgi_AUT2000/InitClaveUnicaP.cgi')
+        return html_page(
+            'Carpeta Tributaria',
+            '<iframe name="cte" src="cte_acreditar_renta_01.cgi" width="100%" height="900"></iframe>',
+        )
+
+    @app.get('/dii_cgi/carpeta_tributaria/cte_acreditar_renta_01.cgi')
+    async def carpeta_tributaria_frame(request: Request):
+        if not request.cookies.get(cookie):
+            return html_page('Sesión expirada', '<p>Sesión expirada</p>', status_code=401)
+        return HTMLResponse(frame_html)
+
+    return app
+
+
+async def serve(apps: Dict[int, FastAPI], host: str):
+    """Run every app on its port until interrupted."""
+    servers = [
+        uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level='warning')) for port, app in apps.items()
+    ]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def main():
+    """Start the mock portals."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--base-port', type=int, default=8101)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Added to every response.')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Uniform random extra latency.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with a 503.')
+    parser.add_argument('--rows', type=int, default=5, help='Rows in every table and F22 form.')
+    args = parser.parse_args()
+
+    faults = Faults(args.latency_ms, args.jitter_ms, args.error_rate)
+    clave_unica_port, cmf_port, afc_port, sii_port = range(args.base_port, args.base_port + 4)
+    clave_unica_base_url = f'http://{args.host}:{clave_unica_port}'
+    sii_base_url = f'http://{args.host}:{sii_port}'
+    apps = {
+        clave_unica_port: clave_unica_app(faults),
+        cmf_port: cmf_app(faults, clave_unica_base_url, args.rows),
+        afc_port: afc_app(faults, clave_unica_base_url, args.rows),
+        sii_port: sii_app(faults, clave_unica_base_url, args.rows),
+    }
+
+    print('Mock upstreams running. Start the API and worker with:\n')
+    print(f'CLAVE_UNICA_HOST={args.host}:{clave_unica_port}')
+    print(f'CMF_BASE_URL=http://{args.host}:{cmf_port}')
+    print(f'AFC_BASE_URL=http://{args.host}:{afc_port}')
+    print(f'SII_AUTH_BASE_URL={sii_base_url}')
+    print(f'SII_HOME_BASE_URL={sii_base_url}')
+    print(f'SII_BASE_URL={sii_base_url}')
+    print('CAPTCHA_SOLVER=stub\n', flush=True)
+    try:
+        asyncio.run(serve(apps, args.host))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Compare the HTML parser backends on saved pages.
+
+Each page is parsed with every installed backend; the resulting DTOs must be identical.
+
+    python -m scripts.benchmark_html_parsers sii:carpeta.html afc-cotizaciones:cotizaciones.html -n 50
+
+Page kinds: ``sii`` (HTML of the Carpeta Tributaria ``cte`` frame), ``afc-empresas`` and
+``afc-cotizaciones`` (inner HTML of the AFC tables).
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from src.parsers.afc_parser import parse_cotizaciones_table, parse_empresas_table
+from src.parsers.html_backend import SUPPORTED_BACKENDS, backend_available
+from src.parsers.sii_parser import parse_acreditar_renta
+
+PARSERS: Dict[str, Callable[[str, str], Any]] = {
+    'sii': lambda html, backend: parse_acreditar_renta(html, backend),
+    'afc-empresas': lambda html, backend: parse_empresas_table(html, backend),
+    'afc-cotizaciones': lambda html, backend: parse_cotizaciones_table(html, '', backend),
+}
+
+
+def comparable(result: Any) -> Any:
+    """Drop the fields that change between runs."""
+    if isinstance(result, dict):
+        return {key: value for key, value in result.items() if key != 'timestamp'}
+    return result
+
+
+def main() -> int:
+    """Run the benchmark. Exits with 1 when two backends disagree on a page."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pages', nargs='+', help='kind:path of a saved page')
+    parser.add_argument('-n', '--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    backends = [backend for backend in SUPPORTED_BACKENDS if backend_available(backend)]
+    print(f'Backends: {", ".join(backends)}')
+    mismatches = 0
+    for page in args.pages:
+        kind, _, path = page.partition(':')
+        if kind not in PARSERS:
+            parser.error(f"Unknown page kind '{kind}'. Expected one of: {', '.join(PARSERS)}")
+        html = Path(path).read_text(encoding='utf-8')
+        parse = PARSERS[kind]
+
+        reference = None
+        print(f'\n{kind} {path} ({len(html) / 1024:.0f} KiB)')
+        for backend in backends:
+            result = comparable(parse(html, backend))
+            if reference is None:
+                reference = result
+            elif result != reference:
+                mismatches += 1
+                print(f'  {backend}: DTO differs from {backends[0]}')
+
+            timings = []
+            for _ in range(args.iterations):
+                started = time.perf_counter()
+                parse(html, backend)
+                timings.append(time.perf_counter() - started)
+            print(
+                f'  {backend:12} median {statistics.median(timings) * 1000:8.2f} ms   min {min(timings) * 1000:8.2f} ms'
+            )
+
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
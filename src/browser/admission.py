@@ -0,0 +1,94 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from src.config.config import (
+    API_RETRY_AFTER_SECONDS,
+    API_SYNC_CONCURRENCY,
+    API_SYNC_QUEUE_SIZE,
+    API_SYNC_QUEUE_TIMEOUT_SECONDS,
+)
+from src.utils.metrics import metrics
+
+
+class AdmissionRejectedError(Exception):
+    """Raised when a request is turned away; ``retry_after`` is the suggested wait in seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounds the requests running at once, with a bounded and time-limited wait for a slot.
+
+    Up to ``max_concurrent`` requests run, up to ``max_waiting`` more wait at most ``wait_timeout``
+    seconds for a slot, and the rest are rejected right away. The suggested retry delay is the median
+    duration of recent admitted requests, or ``default_retry_after`` before there is any.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: int = API_SYNC_CONCURRENCY,
+        max_waiting: int = API_SYNC_QUEUE_SIZE,
+        wait_timeout: float = API_SYNC_QUEUE_TIMEOUT_SECONDS,
+        default_retry_after: int = API_RETRY_AFTER_SECONDS,
+    ):
+        if max_concurrent < 1:
+            raise ValueError('Admission control needs at least one concurrent slot.')
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.default_retry_after = default_retry_after
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._waiting = 0
+        self._in_flight = 0
+
+        self._rejected = metrics.counter(f'{name}.rejected')
+        self._wait_seconds = metrics.histogram(f'{name}.admission_wait_seconds')
+        self._duration_seconds = metrics.histogram(f'{name}.duration_seconds')
+        metrics.gauge(f'{name}.in_flight', lambda: self._in_flight)
+        metrics.gauge(f'{name}.waiting', lambda: self._waiting)
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """Hold a slot for the duration of the block, raising AdmissionRejectedError if none frees up in time."""
+        if self._slots.locked() and self._waiting >= self.max_waiting:
+            self._reject('All slots are busy and the wait queue is full.')
+
+        started = time.monotonic()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.wait_timeout)
+        except asyncio.TimeoutError:
+            self._reject(f'No slot freed up within {self.wait_timeout}s.')
+        finally:
+            self._waiting -= 1
+        self._wait_seconds.observe(time.monotonic() - started)
+
+        admitted = time.monotonic()
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+            self._duration_seconds.observe(time.monotonic() - admitted)
+
+    def stats(self) -> dict:
+        """Return the current occupancy."""
+        return {
+            'max_concurrent': self.max_concurrent,
+            'in_flight': self._in_flight,
+            'max_waiting': self.max_waiting,
+            'waiting': self._waiting,
+        }
+
+    def _reject(self, reason: str):
+        self._rejected.inc()
+        median = self._duration_seconds.quantile(0.5)
+        retry_after = math.ceil(median) if median else self.default_retry_after
+        raise AdmissionRejectedError(reason, max(1, retry_after))
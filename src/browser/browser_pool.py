@@ -0,0 +1,300 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from playwright.async_api import Browser, BrowserContext, Playwright
+
+from src.config.config import BROWSER_MAX_RSS_MB, BROWSER_MAX_TASKS, BROWSER_POOL_SIZE, BROWSER_RSS_CHECK_SECONDS
+from src.config.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def process_tree_rss_mb(root_pid: int) -> Optional[float]:
+    """Return the resident memory in MB of a process and all of its descendants.
+
+    Chromium runs as grandchildren of the Python process (through the Playwright driver), so the
+    whole tree is measured. Returns None when /proc is not available (non-Linux hosts).
+    """
+    if not os.path.isdir('/proc'):
+        return None
+
+    children: Dict[int, List[int]] = {}
+    rss_kb: Dict[int, int] = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        ppid = 0
+        rss = 0
+        try:
+            with open(f'/proc/{entry}/status') as status:
+                for line in status:
+                    if line.startswith('PPid:'):
+                        ppid = int(line.split()[1])
+                    elif line.startswith('VmRSS:'):
+                        rss = int(line.split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+        rss_kb[int(entry)] = rss
+
+    total_kb = 0
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        total_kb += rss_kb.get(pid, 0)
+        pending.extend(children.get(pid, []))
+    return total_kb / 1024
+
+
+class PooledBrowser:
+    """A Chromium instance owned by the pool, with its usage counters."""
+
+    def __init__(self, slot: int, browser: Browser):
+        self.slot = slot
+        self.browser = browser
+        self.launched_at = time.monotonic()
+        self.tasks_served = 0
+        self.active_contexts = 0
+        self.draining = False
+
+    @property
+    def available(self) -> bool:
+        """Whether the browser can hand out new contexts."""
+        return self.browser.is_connected() and not self.draining
+
+
+class BrowserPool:
+    """A long-lived pool of Chromium browsers handing out one isolated context per task.
+
+    Browsers are recycled once they have served ``max_tasks_per_browser`` tasks, when they disconnect,
+    or when the resident memory of the process tree, sampled every ``rss_check_seconds`` off the event
+    loop, exceeds ``max_rss_mb`` (0 disables the watermark). A browser marked for recycling stops
+    receiving new contexts and is closed once its last context is released; a replacement is launched
+    in the background. When no other browser can serve meanwhile (a pool of one), the replacement is
+    launched right away instead of after the old browser has drained.
+    """
+
+    def __init__(
+        self,
+        playwright: Playwright,
+        size: int = BROWSER_POOL_SIZE,
+        max_tasks_per_browser: int = BROWSER_MAX_TASKS,
+        max_rss_mb: int = BROWSER_MAX_RSS_MB,
+        headless: bool = True,
+        launch_options: Optional[Dict[str, Any]] = None,
+        rss_check_seconds: float = BROWSER_RSS_CHECK_SECONDS,
+    ):
+        if size < 1:
+            raise ValueError('Browser pool size must be at least 1.')
+        self.playwright = playwright
+        self.size = size
+        self.max_tasks_per_browser = max_tasks_per_browser
+        self.max_rss_mb = max_rss_mb
+        self.headless = headless
+        self.launch_options = launch_options or {}
+        self.rss_check_seconds = rss_check_seconds
+        self._slots: List[Optional[PooledBrowser]] = [None] * size
+        # Draining browsers whose slot already holds their replacement
+        self._retiring: List[PooledBrowser] = []
+        self._launching: Set[int] = set()
+        self._background: Set[asyncio.Task] = set()
+        self._monitor: Optional[asyncio.Task] = None
+        self._condition = asyncio.Condition()
+        self._rss_mb: Optional[float] = None
+        self._recycled = 0
+        self._closed = False
+
+    async def start(self):
+        """Launch every browser of the pool up front."""
+        async with self._condition:
+            self._launching.update(range(self.size))
+        await asyncio.gather(*(self._launch(slot) for slot in range(self.size)))
+        if self.max_rss_mb and self.rss_check_seconds > 0:
+            self._monitor = asyncio.create_task(self._monitor_rss())
+        logger.info(f'Browser pool started with {self.size} browser(s).')
+
+    async def close(self):
+        """Close every browser of the pool. Contexts still in use are closed with their browser."""
+        self._closed = True
+        if self._monitor is not None:
+            self._monitor.cancel()
+        for task in list(self._background):
+            task.cancel()
+        async with self._condition:
+            browsers = [pooled for pooled in self._slots if pooled is not None] + self._retiring
+            self._slots = [None] * self.size
+            self._retiring = []
+            self._condition.notify_all()
+        for pooled in browsers:
+            await self._close_browser(pooled)
+        logger.info('Browser pool closed.')
+
+    @asynccontextmanager
+    async def context(self, **context_options: Any) -> AsyncIterator[BrowserContext]:
+        """Yield a fresh BrowserContext from a pooled browser and close it on exit."""
+        pooled = await self._acquire()
+        context: Optional[BrowserContext] = None
+        try:
+            context = await pooled.browser.new_context(**context_options)
+            yield context
+        finally:
+            if context is not None:
+                try:
+                    await context.close()
+                except Exception as e:
+                    logger.warning(f'Error closing browser context: {e}')
+            await self._release(pooled)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the size and health of the pool."""
+        browsers = [pooled for pooled in self._slots if pooled is not None] + self._retiring
+        return {
+            'size': self.size,
+            'browsers': len(browsers),
+            'healthy': sum(1 for pooled in browsers if pooled.available),
+            'draining': sum(1 for pooled in browsers if pooled.draining),
+            'launching': len(self._launching),
+            'active_contexts': sum(pooled.active_contexts for pooled in browsers),
+            'tasks_served': sum(pooled.tasks_served for pooled in browsers),
+            'recycled': self._recycled,
+            'rss_mb': self._rss_mb,
+        }
+
+    async def _acquire(self) -> PooledBrowser:
+        while True:
+            async with self._condition:
+                if self._closed:
+                    raise RuntimeError('Browser pool is closed.')
+                candidates = [pooled for pooled in self._slots if pooled is not None and pooled.available]
+                if candidates:
+                    pooled = min(candidates, key=lambda candidate: candidate.active_contexts)
+                    pooled.active_contexts += 1
+                    pooled.tasks_served += 1
+                    return pooled
+
+                # Browsers that died while idle will never be released, retire them here
+                for idle in self._slots:
+                    if idle is not None and idle.active_contexts == 0 and not idle.browser.is_connected():
+                        self._slots[idle.slot] = None
+                        self._recycled += 1
+
+                free_slots = [
+                    slot for slot, pooled in enumerate(self._slots) if pooled is None and slot not in self._launching
+                ]
+                if not free_slots:
+                    await self._condition.wait()
+                    continue
+                slot = free_slots[0]
+                self._launching.add(slot)
+            # Launch failures propagate to the task that needed the browser
+            await self._launch(slot)
+
+    async def _release(self, pooled: PooledBrowser):
+        retired: List[PooledBrowser] = []
+        async with self._condition:
+            pooled.active_contexts -= 1
+            if not pooled.draining and pooled.tasks_served >= self.max_tasks_per_browser:
+                logger.info(f'Recycling browser {pooled.slot} after {pooled.tasks_served} tasks.')
+                self._drain(pooled)
+
+            relaunch: List[int] = []
+            for candidate in self._slots:
+                if candidate is not None and candidate.active_contexts == 0 and not candidate.available:
+                    self._slots[candidate.slot] = None
+                    self._launching.add(candidate.slot)
+                    retired.append(candidate)
+                    relaunch.append(candidate.slot)
+            for candidate in list(self._retiring):
+                if candidate.active_contexts == 0:
+                    self._retiring.remove(candidate)
+                    retired.append(candidate)
+            self._condition.notify_all()
+
+        for candidate in retired:
+            self._recycled += 1
+            await self._close_browser(candidate)
+        for slot in relaunch:
+            if not self._closed:
+                self._launch_in_background(slot)
+
+    async def _launch(self, slot: int):
+        try:
+            browser = await self.playwright.chromium.launch(headless=self.headless, **self.launch_options)
+        except BaseException:
+            async with self._condition:
+                self._launching.discard(slot)
+                self._condition.notify_all()
+            raise
+
+        pooled = PooledBrowser(slot, browser)
+        browser.on('disconnected', lambda _: logger.warning(f'Browser {slot} disconnected.'))
+        async with self._condition:
+            self._launching.discard(slot)
+            if self._closed:
+                self._condition.notify_all()
+                pooled_to_close: Optional[PooledBrowser] = pooled
+            else:
+                self._slots[slot] = pooled
+                self._condition.notify_all()
+                pooled_to_close = None
+        if pooled_to_close is not None:
+            await self._close_browser(pooled_to_close)
+
+    async def _monitor_rss(self):
+        """Sample the process tree RSS in a thread and recycle the oldest browser above the watermark."""
+        while not self._closed:
+            self._rss_mb = await asyncio.to_thread(process_tree_rss_mb, os.getpid())
+            if self._rss_mb is not None and self._rss_mb > self.max_rss_mb:
+                async with self._condition:
+                    self._drain_oldest()
+            await asyncio.sleep(self.rss_check_seconds)
+
+    def _drain(self, pooled: PooledBrowser):
+        """Stop handing out contexts from ``pooled``; replace it now if it is idle or nothing else can serve."""
+        pooled.draining = True
+        if self._closed:
+            return
+        others = [other for other in self._slots if other is not None and other is not pooled]
+        if pooled.active_contexts and any(other.available for other in others):
+            # Replaced once its last context is released
+            return
+        self._slots[pooled.slot] = None
+        self._launching.add(pooled.slot)
+        self._launch_in_background(pooled.slot)
+        if pooled.active_contexts:
+            self._retiring.append(pooled)
+        else:
+            self._recycled += 1
+            closing = asyncio.create_task(self._close_browser(pooled))
+            self._background.add(closing)
+            closing.add_done_callback(self._background.discard)
+
+    def _drain_oldest(self):
+        browsers = [pooled for pooled in self._slots if pooled is not None]
+        if self._retiring or self._launching or any(pooled.draining for pooled in browsers):
+            # Recycle one browser at a time, memory is re-measured after it is replaced
+            return
+        candidates = [pooled for pooled in browsers if pooled.available]
+        if candidates:
+            oldest = min(candidates, key=lambda candidate: candidate.launched_at)
+            logger.warning(f'Process tree RSS above {self.max_rss_mb} MB. Recycling browser {oldest.slot}.')
+            self._drain(oldest)
+
+    def _launch_in_background(self, slot: int):
+        replacement = asyncio.create_task(self._launch(slot))
+        self._background.add(replacement)
+        replacement.add_done_callback(self._on_background_done)
+
+    def _on_background_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f'Failed to relaunch pooled browser: {task.exception()}')
+
+    async def _close_browser(self, pooled: PooledBrowser):
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            logger.warning(f'Error closing browser {pooled.slot}: {e}')
@@ -0,0 +1,205 @@
+import asyncio
+import re
+import time
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Optional, Pattern, Union
+
+from playwright.async_api import Frame, Page, Response, TimeoutError
+
+from src.config.logger import get_logger
+from src.utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+UrlMatcher = Union[str, Pattern[str], Callable[[str], bool]]
+
+
+class ReadinessCondition(ABC):
+    """A condition a page must meet before a scraper step can continue, with its own timeout (ms)."""
+
+    timeout: float
+
+    @abstractmethod
+    async def wait(self, page: Union[Page, Frame]) -> None:
+        """Return once the condition holds. Raises playwright's TimeoutError when the budget runs out."""
+        pass
+
+
+class SelectorReady(ReadinessCondition):
+    """Ready when an element matching ``selector`` reaches ``state``."""
+
+    def __init__(
+        self, selector: str, timeout: float, state: Literal['attached', 'detached', 'hidden', 'visible'] = 'visible'
+    ):
+        self.selector = selector
+        self.timeout = timeout
+        self.state = state
+
+    async def wait(self, page: Union[Page, Frame]) -> None:
+        """Wait for the selector."""
+        await page.wait_for_selector(self.selector, state=self.state, timeout=self.timeout)
+
+
+class UrlReady(ReadinessCondition):
+    """Ready when the page URL matches a glob, a regex or a predicate."""
+
+    def __init__(
+        self,
+        url: UrlMatcher,
+        timeout: float,
+        wait_until: Literal['commit', 'domcontentloaded', 'load', 'networkidle'] = 'commit',
+    ):
+        self.url = url
+        self.timeout = timeout
+        self.wait_until = wait_until
+
+    async def wait(self, page: Union[Page, Frame]) -> None:
+        """Wait for the URL."""
+        await page.wait_for_url(self.url, wait_until=self.wait_until, timeout=self.timeout)
+
+
+class ResponseReady(ReadinessCondition):
+    """Ready when the page receives a response accepted by ``predicate``.
+
+    Only responses received after the wait started are seen, so the triggering action must be passed
+    to ``wait_until``.
+    """
+
+    def __init__(self, predicate: Callable[[Response], bool], timeout: float):
+        self.predicate = predicate
+        self.timeout = timeout
+
+    async def wait(self, page: Union[Page, Frame]) -> None:
+        """Wait for the response."""
+        target = page.page if isinstance(page, Frame) else page
+        await target.wait_for_event('response', predicate=self.predicate, timeout=self.timeout)
+
+
+class NavigationReady(ReadinessCondition):
+    """Ready when the frame commits a new document, e.g. after a form postback to the same URL.
+
+    Like ``ResponseReady``, the triggering action must be passed to ``wait_until``.
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+
+    async def wait(self, page: Union[Page, Frame]) -> None:
+        """Wait for the navigation to commit."""
+        target = page.page if isinstance(page, Frame) else page
+        frame = page if isinstance(page, Frame) else page.main_frame
+        await target.wait_for_event(
+            'framenavigated', predicate=lambda navigated: navigated == frame, timeout=self.timeout
+        )
+
+
+class LoadStateReady(ReadinessCondition):
+    """Ready on a page load state. Prefer a more specific condition; kept for steps with no better signal."""
+
+    def __init__(self, timeout: float, state: Literal['domcontentloaded', 'load', 'networkidle'] = 'load'):
+        self.timeout = timeout
+        self.state = state
+
+    async def wait(self, page: Union[Page, Frame]) -> None:
+        """Wait for the load state."""
+        await page.wait_for_load_state(self.state, timeout=self.timeout)
+
+
+class AnyReady(ReadinessCondition):
+    """Ready as soon as one of the conditions holds; fails once all of them have failed."""
+
+    def __init__(self, *conditions: ReadinessCondition):
+        if not conditions:
+            raise ValueError('AnyReady needs at least one condition.')
+        self.conditions = conditions
+        self.timeout = max(condition.timeout for condition in conditions)
+
+    async def wait(self, page: Union[Page, Frame]) -> None:
+        """Wait for the first condition to hold."""
+        pending = {asyncio.create_task(condition.wait(page)) for condition in self.conditions}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return
+                    error = task.exception()
+            assert error is not None
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+def url_host_is_not(host: str) -> Callable[[str], bool]:
+    """Return a URL predicate matching any URL outside ``host`` (and its subdomains)."""
+    pattern = re.compile(rf'^[a-z]+://([^/]+\.)?{re.escape(host)}(:\d+)?(/|$)')
+    return lambda url: not pattern.match(url)
+
+
+class WaitReport:
+    """Time spent waiting for readiness, accumulated per step."""
+
+    def __init__(self):
+        self.steps: Dict[str, float] = {}
+        self.timed_out: List[str] = []
+
+    def record(self, step: str, seconds: float, ready: bool):
+        """Add the time spent on a step."""
+        self.steps[step] = self.steps.get(step, 0.0) + seconds
+        if not ready:
+            self.timed_out.append(step)
+
+    def summary(self) -> Dict[str, Any]:
+        """Return the report as a plain dict."""
+        return {
+            'steps': {step: round(seconds, 3) for step, seconds in self.steps.items()},
+            'total': round(sum(self.steps.values()), 3),
+            'timed_out': list(self.timed_out),
+        }
+
+
+_current_report: ContextVar[Optional[WaitReport]] = ContextVar('wait_report', default=None)
+
+
+def start_wait_report() -> WaitReport:
+    """Start collecting readiness waits for the current task (and the coroutines it spawns)."""
+    report = WaitReport()
+    _current_report.set(report)
+    return report
+
+
+async def wait_until(
+    page: Union[Page, Frame],
+    step: str,
+    condition: ReadinessCondition,
+    action: Optional[Callable[[], Awaitable[Any]]] = None,
+):
+    """Run ``action`` (if any) and wait for ``condition``, recording the time spent under ``step``.
+
+    The condition starts listening before the action runs, so responses or navigations triggered by
+    the action cannot be missed.
+    """
+    started = time.perf_counter()
+    waiter = asyncio.ensure_future(condition.wait(page))
+    ready = False
+    try:
+        if action is not None:
+            await action()
+        await waiter
+        ready = True
+    except TimeoutError:
+        logger.warning(f"Step '{step}' not ready within {condition.timeout:.0f} ms.")
+        raise
+    finally:
+        if not waiter.done():
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        elapsed = time.perf_counter() - started
+        metrics.histogram(f'readiness.{step}_seconds').observe(elapsed)
+        report = _current_report.get()
+        if report is not None:
+            report.record(step, elapsed, ready)
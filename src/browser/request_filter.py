@@ -0,0 +1,181 @@
+import re
+from typing import Dict, List, Optional, Pattern, Set, Tuple
+from urllib.parse import urlsplit
+
+from playwright.async_api import BrowserContext, Request, Route
+from pydantic import BaseModel, Field
+
+from src.config.logger import get_logger
+from src.utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+# reCAPTCHA scripts, frames, challenge images and audio: allowed on the sites that may show a challenge
+RECAPTCHA_URL_PATTERNS = [
+    r'^https://(www\.)?google\.com/recaptcha/',
+    r'^https://(www\.)?gstatic\.com/recaptcha/',
+    r'^https://(www\.)?recaptcha\.net/recaptcha/',
+]
+
+ANALYTICS_URL_PATTERNS = [
+    r'google-analytics\.com',
+    r'googletagmanager\.com',
+    r'doubleclick\.net',
+    r'facebook\.(net|com)/',
+    r'hotjar\.com',
+    r'clarity\.ms',
+    r'newrelic\.com',
+    r'nr-data\.net',
+]
+
+# Web fonts are only looks; font files are blocked by type, the stylesheets declaring them by URL
+FONT_URL_PATTERNS = [
+    r'fonts\.googleapis\.com',
+    r'fonts\.gstatic\.com',
+    r'use\.typekit\.net',
+    r'use\.fontawesome\.com',
+]
+
+# Rough transfer size (bytes) of a blocked request by resource type. Blocked requests never reach the
+# network, so the bytes they save can only be estimated
+BLOCKED_BYTES_ESTIMATES: Dict[str, int] = {
+    'image': 20_000,
+    'media': 200_000,
+    'font': 30_000,
+    'script': 25_000,
+    'stylesheet': 10_000,
+}
+DEFAULT_BLOCKED_BYTES_ESTIMATE = 2_000
+
+
+class RequestFilterPolicy(BaseModel):
+    """What the pages of a site may download. Allow patterns win over everything else."""
+
+    allow_url_patterns: List[str] = Field(default_factory=lambda: list(RECAPTCHA_URL_PATTERNS))
+    deny_url_patterns: List[str] = Field(default_factory=lambda: ANALYTICS_URL_PATTERNS + FONT_URL_PATTERNS)
+    # Stylesheets are kept: visibility checks on error messages depend on them
+    blocked_resource_types: Set[str] = Field(default_factory=lambda: {'image', 'media', 'font'})
+
+
+# Unknown sites (e.g. the local mock upstreams) keep reCAPTCHA working
+DEFAULT_POLICY = RequestFilterPolicy()
+
+# The CMF and SII scrapers never solve a captcha, so reCAPTCHA is denied there like any other third party
+NO_CAPTCHA_POLICY = RequestFilterPolicy(
+    allow_url_patterns=[], deny_url_patterns=ANALYTICS_URL_PATTERNS + FONT_URL_PATTERNS + RECAPTCHA_URL_PATTERNS
+)
+
+# Keyed by host suffix of the page (top-level document) that makes the request, so the reCAPTCHA
+# requests of an AFC page follow the AFC policy even though they go to Google
+SITE_POLICIES: Dict[str, RequestFilterPolicy] = {
+    # AFC shows a reCAPTCHA v2 challenge before its certificates; the image and audio solvers need its assets
+    'afc.cl': RequestFilterPolicy(),
+    # ClaveÚnica may challenge a login with reCAPTCHA
+    'claveunica.gob.cl': RequestFilterPolicy(),
+    'cmfchile.cl': NO_CAPTCHA_POLICY,
+    'sii.cl': NO_CAPTCHA_POLICY,
+}
+
+
+class RequestFilter:
+    """Routes every request of a BrowserContext through the allow/deny policy of the site of its page.
+
+    Blocked requests are aborted before they leave the browser and counted with an estimate of the bytes
+    they would have transferred (``BLOCKED_BYTES_ESTIMATES``); allowed ones are counted with their
+    transferred size. One instance is meant to be attached to a single task's context.
+    """
+
+    def __init__(
+        self,
+        site_policies: Optional[Dict[str, RequestFilterPolicy]] = None,
+        default_policy: RequestFilterPolicy = DEFAULT_POLICY,
+    ):
+        self.site_policies = SITE_POLICIES if site_policies is None else site_policies
+        self.default_policy = default_policy
+        self._compiled: Dict[int, Tuple[List[Pattern[str]], List[Pattern[str]]]] = {}
+        self.allowed_requests = 0
+        self.allowed_bytes = 0
+        self.blocked_requests = 0
+        self.blocked_bytes_estimated = 0
+        self.blocked_by_type: Dict[str, int] = {}
+
+    async def attach(self, context: BrowserContext):
+        """Start filtering and measuring the requests of ``context``."""
+        await context.route('**/*', self._handle_route)
+        context.on('requestfinished', self._on_request_finished)
+
+    def stats(self) -> Dict[str, object]:
+        """Return request and byte counters for the context."""
+        return {
+            'allowed_requests': self.allowed_requests,
+            'allowed_bytes': self.allowed_bytes,
+            'blocked_requests': self.blocked_requests,
+            'blocked_bytes_estimated': self.blocked_bytes_estimated,
+            'blocked_by_type': dict(self.blocked_by_type),
+        }
+
+    def policy_for(self, url: str) -> RequestFilterPolicy:
+        """Return the policy of the site serving ``url``."""
+        host = urlsplit(url).hostname or ''
+        for suffix, policy in self.site_policies.items():
+            if host == suffix or host.endswith('.' + suffix):
+                return policy
+        return self.default_policy
+
+    def should_block(self, url: str, resource_type: str, page_url: Optional[str] = None) -> bool:
+        """Whether a request must be aborted, under the policy of ``page_url`` (the request's own URL if unknown)."""
+        policy = self.policy_for(page_url or url)
+        allow, deny = self._patterns(policy)
+        if any(pattern.search(url) for pattern in allow):
+            return False
+        if resource_type in policy.blocked_resource_types:
+            return True
+        return any(pattern.search(url) for pattern in deny)
+
+    def _patterns(self, policy: RequestFilterPolicy) -> Tuple[List[Pattern[str]], List[Pattern[str]]]:
+        compiled = self._compiled.get(id(policy))
+        if compiled is None:
+            compiled = (
+                [re.compile(p) for p in policy.allow_url_patterns],
+                [re.compile(p) for p in policy.deny_url_patterns],
+            )
+            self._compiled[id(policy)] = compiled
+        return compiled
+
+    async def _handle_route(self, route: Route):
+        request = route.request
+        if self.should_block(request.url, request.resource_type, _page_url(request)):
+            estimate = BLOCKED_BYTES_ESTIMATES.get(request.resource_type, DEFAULT_BLOCKED_BYTES_ESTIMATE)
+            self.blocked_requests += 1
+            self.blocked_bytes_estimated += estimate
+            self.blocked_by_type[request.resource_type] = self.blocked_by_type.get(request.resource_type, 0) + 1
+            metrics.counter('network.blocked_requests').inc()
+            metrics.counter('network.blocked_bytes_estimated').inc(estimate)
+            await route.abort('blockedbyclient')
+        else:
+            await route.continue_()
+
+    async def _on_request_finished(self, request: Request):
+        self.allowed_requests += 1
+        metrics.counter('network.allowed_requests').inc()
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            # The page or context may already be closed
+            return
+        transferred = sizes['responseBodySize'] + sizes['responseHeadersSize']
+        self.allowed_bytes += transferred
+        metrics.counter('network.allowed_bytes').inc(transferred)
+
+
+def _page_url(request: Request) -> Optional[str]:
+    """Return the URL of the top-level page making ``request``, or None when it has none yet."""
+    try:
+        if request.is_navigation_request() and request.frame.parent_frame is None:
+            # The page is navigating to this URL
+            return request.url
+        url = request.frame.page.main_frame.url
+    except Exception:
+        # Service worker requests have no frame
+        return None
+    return url if url.startswith('http') else None
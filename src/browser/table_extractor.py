@@ -0,0 +1,33 @@
+from typing import Optional, Union
+
+from playwright.async_api import Frame, Page
+
+from src.dto.table_data import TableSnapshot
+
+# Cells use textContent (as all_text_contents did); headers use innerText, which keeps their line breaks
+_SNAPSHOT_TABLE_JS = """
+([selector, bodyRows, footerRows]) => {
+    const table = document.querySelector(selector);
+    if (!table) {
+        return null;
+    }
+    const cells = (row) => Array.from(row.querySelectorAll("td"), (cell) => cell.textContent);
+    return {
+        headers: Array.from(table.querySelectorAll("thead th"), (th) => th.innerText),
+        rows: Array.from(table.querySelectorAll(bodyRows), cells),
+        footer: Array.from(table.querySelectorAll(footerRows), cells),
+    };
+}
+"""
+
+
+async def extract_table(
+    page: Union[Page, Frame], selector: str, body_rows: str = 'tbody tr', footer_rows: str = 'tfoot tr'
+) -> Optional[TableSnapshot]:
+    """Read the headers, body and footer of a table in one browser round trip.
+
+    ``body_rows`` and ``footer_rows`` are selectors relative to the table. Returns None when the
+    table is not in the DOM; the caller is expected to have waited for it already.
+    """
+    snapshot: Optional[TableSnapshot] = await page.evaluate(_SNAPSHOT_TABLE_JS, [selector, body_rows, footer_rows])
+    return snapshot
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import zlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import redis.asyncio as aioredis
+from cryptography.fernet import Fernet, InvalidToken
+
+from src.config.config import (
+    RESULT_CACHE_ENABLED,
+    RESULT_CACHE_SECRET,
+    RESULT_CACHE_TTL_AFC_SECONDS,
+    RESULT_CACHE_TTL_CMF_SECONDS,
+    RESULT_CACHE_TTL_SII_SECONDS,
+)
+from src.config.logger import get_logger
+from src.models.clave_unica import ClaveUnica
+from src.queue.redis_client import get_async_redis
+from src.utils.crypto import credential_digest, derive_fernet_key
+from src.utils.exceptions import ScraperError
+from src.utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+# How long a scrape result stays fresh, per source (0 disables caching it)
+RESULT_TTLS: Dict[str, int] = {
+    'cmf': RESULT_CACHE_TTL_CMF_SECONDS,
+    'afc': RESULT_CACHE_TTL_AFC_SECONDS,
+    'sii': RESULT_CACHE_TTL_SII_SECONDS,
+}
+
+
+def result_variant(scraper_type: str, sources: Optional[List[str]] = None, years: Optional[List[int]] = None) -> str:
+    """Identify what a scrape returns: its scraper type plus the sources and years it covers."""
+    variant = scraper_type
+    if sources:
+        variant += ':' + ','.join(sorted(set(sources)))
+    if years:
+        variant += ':' + ','.join(str(year) for year in sorted(set(years)))
+    return variant
+
+
+def result_ttl(scraper_type: str, sources: Optional[List[str]] = None) -> int:
+    """Return the TTL of a scrape result; a combined result lasts as long as its shortest-lived source."""
+    types = (sources or list(RESULT_TTLS)) if scraper_type == 'all' else [scraper_type]
+    return min(RESULT_TTLS.get(source, 0) for source in types)
+
+
+class ResultCache:
+    """Caches scrape results per user and variant in Redis, and coalesces identical scrapes in flight.
+
+    Entries are zlib-compressed JSON encrypted with Fernet; like the session cache, keys and encryption
+    keys are derived from the server secret and the user's credentials, so a result is only served to a
+    caller who knows the password it was scraped with. A second identical scrape started while the first
+    is still running awaits the first one's result instead of running again (single flight, per process).
+    """
+
+    def __init__(self, secret: str, redis_client: Optional[aioredis.Redis] = None, prefix: str = 'result:'):
+        if not secret:
+            raise ValueError('RESULT_CACHE_SECRET must be set to use the result cache.')
+        self.secret = secret
+        self.redis_client = redis_client or get_async_redis()
+        self.prefix = prefix
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+        self._hits = metrics.counter('results.cache_hits')
+        self._misses = metrics.counter('results.cache_misses')
+        self._coalesced = metrics.counter('results.coalesced')
+        self._stored_bytes = metrics.histogram('results.cached_bytes')
+        metrics.gauge('results.in_flight', lambda: len(self._in_flight))
+
+    def _key(self, clave_unica: ClaveUnica, variant: str) -> str:
+        return self.prefix + credential_digest(self.secret, variant, clave_unica.rut, clave_unica._password)
+
+    def _fernet(self, clave_unica: ClaveUnica, variant: str) -> Fernet:
+        return Fernet(derive_fernet_key(self.secret, 'result', variant, clave_unica.rut, clave_unica._password))
+
+    async def get_or_run(
+        self,
+        clave_unica: ClaveUnica,
+        run: Callable[[], Awaitable[Any]],
+        scraper_type: str,
+        sources: Optional[List[str]] = None,
+        years: Optional[List[int]] = None,
+    ) -> Any:
+        """Return the cached result of a scrape, else join an identical scrape in flight, else ``run`` it.
+
+        A fresh result is cached unless it is partial (a combined scrape with failed sources).
+        """
+        variant = result_variant(scraper_type, sources, years)
+        ttl = result_ttl(scraper_type, sources)
+        key = self._key(clave_unica, variant)
+        if ttl > 0:
+            cached = await self._load(key, clave_unica, variant)
+            if cached is not None:
+                self._hits.inc()
+                return cached
+            self._misses.inc()
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self._coalesced.inc()
+            logger.info(f'Joining the {variant} scrape already in flight for the same user.')
+            return await asyncio.shield(in_flight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            data = await run()
+        except BaseException as e:
+            # Waiters get the same error; a cancelled run must not cancel them too
+            error = e if isinstance(e, Exception) else ScraperError(f'The {variant} scrape was cancelled.')
+            future.set_exception(error)
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+        future.set_result(data)
+
+        if ttl > 0 and not (isinstance(data, dict) and data.get('errors')):
+            await self._store(key, clave_unica, variant, data, ttl)
+        return data
+
+    async def _load(self, key: str, clave_unica: ClaveUnica, variant: str) -> Optional[Any]:
+        try:
+            token = await self.redis_client.get(key)
+            if token is None:
+                return None
+            return json.loads(zlib.decompress(self._fernet(clave_unica, variant).decrypt(token)))
+        except InvalidToken:
+            logger.warning(f'Discarding unreadable cached {variant} result.')
+            await self._discard(key)
+        except Exception as e:
+            logger.warning(f'Could not load cached {variant} result: {e}')
+        return None
+
+    async def _discard(self, key: str):
+        try:
+            await self.redis_client.delete(key)
+        except Exception as e:
+            logger.warning(f'Could not discard cached result: {e}')
+
+    async def _store(self, key: str, clave_unica: ClaveUnica, variant: str, data: Any, ttl: int):
+        try:
+            compressed = zlib.compress(json.dumps(data, default=str).encode('utf-8'))
+            token = self._fernet(clave_unica, variant).encrypt(compressed)
+            await self.redis_client.setex(key, ttl, token)
+            self._stored_bytes.observe(len(token))
+        except Exception as e:
+            logger.warning(f'Could not cache {variant} result: {e}')
+
+
+def create_result_cache() -> Optional[ResultCache]:
+    """Build the result cache configured by RESULT_CACHE_ENABLED, or None if disabled."""
+    if not RESULT_CACHE_ENABLED:
+        return None
+    logger.info(f'Result cache enabled (TTL per source: {RESULT_TTLS}).')
+    return ResultCache(RESULT_CACHE_SECRET)
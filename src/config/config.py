@@ -4,9 +4,105 @@ from dotenv import load_dotenv
 
 load_dotenv()
 HEADLESS = False
-NETWORK_IDLE_TIMEOUT = 30000
+# Upstream portals. Overridable to point the scrapers at the local mock upstreams (loadtest/)
+CLAVE_UNICA_HOST = os.getenv("CLAVE_UNICA_HOST", "claveunica.gob.cl")
+CMF_BASE_URL = os.getenv("CMF_BASE_URL", "https://conocetudeuda.cmfchile.cl")
+AFC_BASE_URL = os.getenv("AFC_BASE_URL", "https://webafiliados.afc.cl")
+SII_AUTH_BASE_URL = os.getenv("SII_AUTH_BASE_URL", "https://zeusr.sii.cl")
+SII_HOME_BASE_URL = os.getenv("SII_HOME_BASE_URL", "https://misiir.sii.cl")
+SII_BASE_URL = os.getenv("SII_BASE_URL", "https://zeus.sii.cl")
+# AFC cotizaciones years fetched at the same time, each in its own page of the logged-in context
+AFC_YEAR_CONCURRENCY = int(os.getenv("AFC_YEAR_CONCURRENCY", "3"))
+# After login, fetch AFC pages and replay their search postbacks over HTTP instead of rendering them
+AFC_HTTP_POSTBACK = os.getenv("AFC_HTTP_POSTBACK", "true").lower() == "true"
+# Captcha backends tried in order: capsolver (image challenge in the page) | token (CapSolver token API) |
+# audio (audio challenge in the page) | stub (only for the mock upstreams), e.g. "capsolver,token,audio"
+CAPTCHA_SOLVER = os.getenv("CAPTCHA_SOLVER", "capsolver")
+CAPTCHA_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("CAPTCHA_ATTEMPT_TIMEOUT_SECONDS", "90"))
+# Start the next backend alongside one running past this quantile of its solve times (0 disables hedging)
+CAPTCHA_HEDGE_QUANTILE = float(os.getenv("CAPTCHA_HEDGE_QUANTILE", "0"))
+CAPTCHA_HEDGE_MIN_SAMPLES = int(os.getenv("CAPTCHA_HEDGE_MIN_SAMPLES", "20"))
+CAPTCHA_HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("CAPTCHA_HEDGE_DEFAULT_DELAY_SECONDS", "30"))
+
+# Default per-step readiness budgets (ms); each scraper step declares its own condition
+PAGE_READY_TIMEOUT = int(os.getenv("PAGE_READY_TIMEOUT", "30000"))
+LOGIN_RESULT_TIMEOUT = int(os.getenv("LOGIN_RESULT_TIMEOUT", "30000"))
 
 RATE_LIMIT_TIMES_SCRAPE = int(os.getenv("RATE_LIMIT_TIMES_SCRAPE", "1"))
 RATE_LIMIT_SECONDS_SCRAPE = int(os.getenv("RATE_LIMIT_SECONDS_SCRAPE", "60"))
 RATE_LIMIT_TIMES_HEALTH = int(os.getenv("RATE_LIMIT_TIMES_HEALTH", "6"))
 RATE_LIMIT_SECONDS_HEALTH = int(os.getenv("RATE_LIMIT_SECONDS_HEALTH", "60"))
+
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "1"))
+BROWSER_MAX_TASKS = int(os.getenv("BROWSER_MAX_TASKS", "50"))
+BROWSER_MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", "1500"))
+BROWSER_RSS_CHECK_SECONDS = float(os.getenv("BROWSER_RSS_CHECK_SECONDS", "10"))
+
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "1"))
+WORKER_SHUTDOWN_GRACE_SECONDS = int(os.getenv("WORKER_SHUTDOWN_GRACE_SECONDS", "30"))
+
+# Shared Redis connection pool per process (one for sync clients, one for asyncio clients)
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_POOL_TIMEOUT_SECONDS = float(os.getenv("REDIS_POOL_TIMEOUT_SECONDS", "5"))  # Wait for a free connection
+
+QUEUE_BLOCK_TIMEOUT_SECONDS = int(os.getenv("QUEUE_BLOCK_TIMEOUT_SECONDS", "5"))
+QUEUE_VISIBILITY_TIMEOUT_SECONDS = int(os.getenv("QUEUE_VISIBILITY_TIMEOUT_SECONDS", "900"))
+# How often a worker extends the lease of each task it is running (keep well below the visibility timeout)
+QUEUE_LEASE_RENEW_SECONDS = float(os.getenv("QUEUE_LEASE_RENEW_SECONDS", "60"))
+QUEUE_REAPER_INTERVAL_SECONDS = int(os.getenv("QUEUE_REAPER_INTERVAL_SECONDS", "30"))
+QUEUE_PROMOTER_INTERVAL_SECONDS = float(os.getenv("QUEUE_PROMOTER_INTERVAL_SECONDS", "1"))
+# Scraper types whose lanes this worker takes tasks from, comma-separated (empty: every lane)
+WORKER_LANES = os.getenv("WORKER_LANES", "")
+
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", "8"))
+WEBHOOK_OUTBOX_SIZE = int(os.getenv("WEBHOOK_OUTBOX_SIZE", "1000"))
+WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "10"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+WEBHOOK_MAX_CONNECTIONS_PER_HOST = int(os.getenv("WEBHOOK_MAX_CONNECTIONS_PER_HOST", "4"))
+WEBHOOK_DRAIN_SECONDS = float(os.getenv("WEBHOOK_DRAIN_SECONDS", "10"))
+
+WORKER_METRICS_INTERVAL_SECONDS = int(os.getenv("WORKER_METRICS_INTERVAL_SECONDS", "60"))
+
+SESSION_CACHE_BACKEND = os.getenv("SESSION_CACHE_BACKEND", "")
+SESSION_CACHE_SECRET = os.getenv("SESSION_CACHE_SECRET", "")
+SESSION_CACHE_TTL_SECONDS = int(os.getenv("SESSION_CACHE_TTL_SECONDS", "600"))
+SESSION_CACHE_DIR = os.getenv("SESSION_CACHE_DIR", ".session_cache")
+SESSION_CHECK_TIMEOUT = int(os.getenv("SESSION_CHECK_TIMEOUT", "10000"))
+SSO_CHECK_TIMEOUT = int(os.getenv("SSO_CHECK_TIMEOUT", "5000"))
+
+# Result cache (opt-in): whole scrape results per user, compressed and encrypted in Redis
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "false").lower() == "true"
+RESULT_CACHE_SECRET = os.getenv("RESULT_CACHE_SECRET", "")
+RESULT_CACHE_TTL_CMF_SECONDS = int(os.getenv("RESULT_CACHE_TTL_CMF_SECONDS", "900"))
+RESULT_CACHE_TTL_AFC_SECONDS = int(os.getenv("RESULT_CACHE_TTL_AFC_SECONDS", "3600"))
+RESULT_CACHE_TTL_SII_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SII_SECONDS", "3600"))
+
+REQUEST_FILTER_ENABLED = os.getenv("REQUEST_FILTER_ENABLED", "true").lower() == "true"
+
+# BeautifulSoup tree builder: auto (lxml when installed) | lxml | html.parser
+HTML_PARSER_BACKEND = os.getenv("HTML_PARSER_BACKEND", "auto")
+# Where CPU-bound HTML parsing runs: thread | process | inline (on the event loop)
+PARSE_EXECUTOR = os.getenv("PARSE_EXECUTOR", "thread")
+PARSE_EXECUTOR_WORKERS = int(os.getenv("PARSE_EXECUTOR_WORKERS", "2"))
+
+# Pre-solved reCAPTCHA tokens for AFC, fetched from CapSolver ahead of the AFC tasks waiting in the queue
+CAPTCHA_TOKEN_POOL_SIZE = int(os.getenv("CAPTCHA_TOKEN_POOL_SIZE", "0"))  # Max tokens held or being solved; 0 disables
+CAPTCHA_TOKEN_TTL_SECONDS = float(os.getenv("CAPTCHA_TOKEN_TTL_SECONDS", "100"))  # Tokens last 120 s upstream
+CAPTCHA_TOKEN_LOOKAHEAD = int(os.getenv("CAPTCHA_TOKEN_LOOKAHEAD", "20"))  # Queue entries inspected for AFC tasks
+CAPTCHA_TOKEN_REFILL_INTERVAL_SECONDS = float(os.getenv("CAPTCHA_TOKEN_REFILL_INTERVAL_SECONDS", "2"))
+AFC_RECAPTCHA_SITE_KEY = os.getenv("AFC_RECAPTCHA_SITE_KEY", "")
+CAPSOLVER_API_URL = os.getenv("CAPSOLVER_API_URL", "https://api.capsolver.com")
+
+# Synchronous API endpoints: browsers owned by the API process and admission control
+API_BROWSER_POOL_SIZE = int(os.getenv("API_BROWSER_POOL_SIZE", "1"))  # 0 disables the sync endpoints (503)
+API_SYNC_CONCURRENCY = int(os.getenv("API_SYNC_CONCURRENCY", "2"))  # Sync scrapes running at once
+API_SYNC_QUEUE_SIZE = int(os.getenv("API_SYNC_QUEUE_SIZE", "8"))  # Sync scrapes waiting for a slot
+API_SYNC_QUEUE_TIMEOUT_SECONDS = float(os.getenv("API_SYNC_QUEUE_TIMEOUT_SECONDS", "30"))
+API_RETRY_AFTER_SECONDS = int(os.getenv("API_RETRY_AFTER_SECONDS", "30"))  # Until recent durations are known
+# Items accepted by one POST /async/scrape/batch
+API_BATCH_MAX_ITEMS = int(os.getenv("API_BATCH_MAX_ITEMS", "500"))
+# Rate limit of POST /async/scrape/batch: calls per window, plus a budget of items per window over every call
+RATE_LIMIT_TIMES_BATCH = int(os.getenv("RATE_LIMIT_TIMES_BATCH", "1"))
+RATE_LIMIT_SECONDS_BATCH = int(os.getenv("RATE_LIMIT_SECONDS_BATCH", "60"))
+RATE_LIMIT_ITEMS_BATCH = int(os.getenv("RATE_LIMIT_ITEMS_BATCH", "2000"))
+RATE_LIMIT_ITEMS_SECONDS_BATCH = int(os.getenv("RATE_LIMIT_ITEMS_SECONDS_BATCH", "3600"))
@@ -3,7 +3,7 @@ __AUTHOR__ = "Luis Francisco Barra Sandoval"
 __EMAIL__ = "contacto@luisbarra.cl"
 __VERSION__ = "1.0.0"
 
-from typing import Dict, List, TypedDict
+from typing import Dict, List, Optional, TypedDict
 
 
 class AFCEmpresaEntry(TypedDict):
@@ -32,3 +32,12 @@ class AFCScraperResult(TypedDict):
     contributions_data: Dict[str, List[AFCCotizacionEntry]]
     timestamp: str
     currency: str
+
+class AFCCotizacionesPage(TypedDict):
+    """A cotizaciones search page fetched over HTTP, with the form state needed to post it back."""
+
+    period: Optional[str]
+    period_field: Optional[str]
+    entries: Optional[List[AFCCotizacionEntry]]
+    form_action: str
+    form_fields: Dict[str, str]
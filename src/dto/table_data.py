@@ -0,0 +1,9 @@
+from typing import List, TypedDict
+
+
+class TableSnapshot(TypedDict):
+    """Represents the text of an HTML table read from the page in a single call."""
+
+    headers: List[str]
+    rows: List[List[str]]
+    footer: List[List[str]]
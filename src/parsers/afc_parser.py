@@ -0,0 +1,152 @@
+from typing import Any, Dict, List, Optional
+
+from bs4 import Tag
+
+from src.config.logger import get_logger
+from src.dto.afc_data import AFCCotizacionEntry, AFCCotizacionesPage, AFCEmpresaEntry
+from src.parsers.html_backend import make_soup
+from src.utils.utils import parse_money
+
+logger = get_logger(__name__)
+
+EMPRESAS_TABLE_ID = 'contentPlaceHolder_gvEmpresas'
+COTIZACIONES_TABLE_ID = 'contentPlaceHolder_dgBusqueda'
+PERIOD_SELECT_ID = 'contentPlaceHolder_ddlPeriodo'
+
+
+def parse_empresas_table(table_html: str, backend: str = '') -> List[AFCEmpresaEntry]:
+    """Build the companies list from the inner HTML of ``table#contentPlaceHolder_gvEmpresas``."""
+    soup = make_soup(f'<table id="{EMPRESAS_TABLE_ID}">{table_html}</table>', backend)
+    return _empresas_from_table(soup.find('table', id=EMPRESAS_TABLE_ID))
+
+
+def parse_empresas_page(page_html: str, backend: str = '') -> Optional[List[AFCEmpresaEntry]]:
+    """Build the companies list from a whole Empresas.aspx page; None if the table is missing (e.g. a login page)."""
+    table = make_soup(page_html, backend).find('table', id=EMPRESAS_TABLE_ID)
+    if not isinstance(table, Tag):
+        return None
+    return _empresas_from_table(table)
+
+
+def _empresas_from_table(table: Any) -> List[AFCEmpresaEntry]:
+    companies_data: List[AFCEmpresaEntry] = []
+    if isinstance(table, Tag):
+        headers = [th.get_text(strip=True) for th in table.find_all('th')]
+        rows = []
+        for tr in table.find_all('tr'):  # Skip header row
+            if not isinstance(tr, Tag):
+                continue
+            cols = [td.get_text(strip=True) for td in tr.find_all('td')]
+            if cols:  # Only process rows with columns
+                row_data = {}
+                for i, header in enumerate(headers):
+                    if i < len(cols):
+                        row_data[header] = cols[i]
+                rows.append(row_data)
+
+        # Map generic dict to AFCEmpresaEntry
+        for row in rows:
+            companies_data.append(
+                AFCEmpresaEntry(
+                    employer_rut=row.get('RUT Empleador', ''),
+                    employer_name=row.get('Razón Social', ''),
+                    start_date=row.get('Fecha Inicio', ''),
+                    end_date=row.get('Fecha Término', ''),
+                    status=row.get('Estado', ''),
+                )
+            )
+    else:
+        logger.warning('Table not found or is not a valid HTML table element. ')
+
+    return companies_data
+
+
+def parse_cotizaciones_table(table_html: str, year: str, backend: str = '') -> List[AFCCotizacionEntry]:
+    """Build the contributions of ``year`` from the inner HTML of ``table#contentPlaceHolder_dgBusqueda``."""
+    soup = make_soup(f'<table id="{COTIZACIONES_TABLE_ID}">{table_html}</table>', backend)
+    return _cotizaciones_from_table(soup.find('table', id=COTIZACIONES_TABLE_ID), year)
+
+
+def parse_cotizaciones_page(page_html: str, year: str, backend: str = '') -> AFCCotizacionesPage:
+    """Read a whole CrtPagadas.aspx page: the period it shows, its entries if that is ``year``, and its postback form.
+
+    Lets the scraper replay the WebForms search postback over HTTP instead of in the browser.
+    """
+    soup = make_soup(page_html, backend)
+    page = AFCCotizacionesPage(period=None, period_field=None, entries=None, form_action='', form_fields={})
+    period_select = soup.find('select', id=PERIOD_SELECT_ID)
+    if isinstance(period_select, Tag):
+        page['period'] = _selected_value(period_select)
+        page['period_field'] = str(period_select.get('name', '')) or None
+        form = period_select.find_parent('form')
+        if isinstance(form, Tag):
+            page['form_action'] = str(form.get('action', ''))
+            page['form_fields'] = webforms_fields(form)
+
+    table = soup.find('table', id=COTIZACIONES_TABLE_ID)
+    if isinstance(table, Tag) and page['period'] == year:
+        page['entries'] = _cotizaciones_from_table(table, year)
+    return page
+
+
+def webforms_fields(form: Tag) -> Dict[str, str]:
+    """Collect the fields a browser would submit with ``form``: hidden state (__VIEWSTATE...), inputs, selections."""
+    fields: Dict[str, str] = {}
+    for field in form.find_all(['input', 'select', 'textarea']):
+        name = field.get('name')
+        if not isinstance(name, str) or not name or field.has_attr('disabled'):
+            continue
+        if field.name == 'select':
+            value = _selected_value(field)
+            if value is not None:
+                fields[name] = value
+        elif field.name == 'textarea':
+            fields[name] = field.get_text()
+        else:
+            input_type = str(field.get('type', 'text')).lower()
+            if input_type in ('submit', 'button', 'image', 'reset', 'file'):
+                continue
+            if input_type in ('checkbox', 'radio') and not field.has_attr('checked'):
+                continue
+            fields[name] = str(field.get('value', 'on' if input_type in ('checkbox', 'radio') else ''))
+    return fields
+
+
+def _selected_value(select: Tag) -> Optional[str]:
+    """Value of the selected option, or of the first one like a browser does."""
+    option = select.find('option', selected=True) or select.find('option')
+    if not isinstance(option, Tag):
+        return None
+    return str(option.get('value', option.get_text(strip=True)))
+
+
+def _cotizaciones_from_table(table: Any, year: str) -> List[AFCCotizacionEntry]:
+    cotizaciones_data: List[AFCCotizacionEntry] = []
+    if isinstance(table, Tag):
+        headers = [th.get_text(strip=True) for th in table.find_all('th')]
+        rows = []
+        for tr in table.find_all('tr'):
+            if not isinstance(tr, Tag):
+                continue
+            cols = [td.get_text(strip=True) for td in tr.find_all('td')]
+            if cols and len(cols) == len(headers):
+                row_data = {}
+                for i, header in enumerate(headers):
+                    row_data[header] = cols[i]
+                rows.append(row_data)
+
+        # The last row holds the totals
+        for row in rows[:-1]:
+            cotizaciones_data.append(
+                AFCCotizacionEntry(
+                    period=row.get('Período', '').strip(),
+                    employer_rut=row.get('RUT Empleador', ''),
+                    employer_name=row.get('Razón Social', ''),
+                    taxable_income=parse_money(row.get('Renta Imponible', '0')),
+                    contributed_amount=parse_money(row.get('Monto Cotizado', '0')),
+                    payment_date=row.get('Fecha de Pago', ''),
+                )
+            )
+    else:
+        logger.warning(f'Cotizaciones table for year {year} not found or is not a valid HTML table element. ')
+    return cotizaciones_data
@@ -0,0 +1,167 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from src.config.logger import get_logger
+from src.dto.cmf_data import (
+    CMFLineOfCreditResult,
+    CMFScraperResult,
+    DebtEntry,
+    DebtTotals,
+    HasCreditLinesResult,
+    LineOfCreditEntry,
+    LineOfCreditTotals,
+)
+from src.dto.table_data import TableSnapshot
+from src.utils.exceptions import ScraperDataExtractionError
+from src.utils.utils import parse_money
+
+logger = get_logger(__name__)
+
+# Constants for CMF table headers
+INSTITUTION_HEADER = 'Institución financiera'
+CREDIT_TYPE_HEADER = 'Tipo de crédito'
+TOTAL_CREDIT_HEADER = 'Total del crédito'
+CURRENT_HEADER = 'Vigente'
+LATE_30_59_HEADER = '30 a 59 días'
+LATE_60_89_HEADER = '60 a 89 días'
+LATE_90_PLUS_HEADER = '90 o más días'
+
+DEBT_HEADER_MAP = {
+    INSTITUTION_HEADER: 'institution',
+    CREDIT_TYPE_HEADER: 'credit_type',
+    TOTAL_CREDIT_HEADER: 'total_credit',
+    CURRENT_HEADER: 'current',
+    LATE_30_59_HEADER: 'late_30_59',
+    LATE_60_89_HEADER: 'late_60_89',
+    LATE_90_PLUS_HEADER: 'late_90_plus',
+}
+
+
+def clean_header(text: str) -> str:
+    """Clean up header text (remove newlines, extra spaces, and 'de atraso' from specific columns)."""
+    cleaned_text = text.replace('\n', ' ').strip()
+    if 'días de atraso' in cleaned_text:
+        cleaned_text = cleaned_text.replace('de atraso', '').strip()
+    return cleaned_text
+
+
+def parse_debt_table(table: TableSnapshot) -> CMFScraperResult:
+    """Build the CMF debt result from a snapshot of ``#tabla_deuda_directa``."""
+    # Build index map based on actual headers
+    index_map: Dict[str, int] = {}
+    for i, header in enumerate(table['headers']):
+        header_name = clean_header(header)
+        if header_name in DEBT_HEADER_MAP:
+            index_map[DEBT_HEADER_MAP[header_name]] = i
+
+    # Validate that all expected headers are found
+    missing_keys = set(DEBT_HEADER_MAP.values()) - set(index_map.keys())
+    if missing_keys:
+        logger.error(f'Missing expected headers in CMF debt table: {missing_keys}')
+        raise ScraperDataExtractionError(f'Missing expected headers in CMF debt table: {missing_keys}')
+
+    results: List[DebtEntry] = []
+    for i, cells in enumerate(table['rows']):
+        # Ensure we have enough cells before trying to access them by index
+        if len(cells) < max(index_map.values()) + 1:
+            logger.warning(f'Row {i} has fewer cells than expected. Skipping.')
+            continue
+
+        try:
+            results.append(
+                DebtEntry(
+                    {
+                        'institution': cells[index_map['institution']].strip(),
+                        'credit_type': cells[index_map['credit_type']].strip(),
+                        'total_credit': parse_money(cells[index_map['total_credit']]),
+                        'current': parse_money(cells[index_map['current']]),
+                        'late_30_59': parse_money(cells[index_map['late_30_59']]),
+                        'late_60_89': parse_money(cells[index_map['late_60_89']]),
+                        'late_90_plus': parse_money(cells[index_map['late_90_plus']]),
+                    }
+                )
+            )
+        except ValueError as e:
+            logger.error(f'Error parsing money in row {i}: {e}. Row data: {cells}')
+            raise ScraperDataExtractionError(f'Error parsing money in row {i}') from e
+
+    total_cells = table['footer'][0] if table['footer'] else []
+
+    def get_parsed_total(field_key: str) -> int:
+        index = index_map.get(field_key)
+        if index is None or len(total_cells) <= index:
+            logger.error(f"Missing total cell for '{field_key}' at expected index {index}.")
+            raise ScraperDataExtractionError(f'Missing total cell for {field_key}')
+        try:
+            return parse_money(total_cells[index])
+        except ValueError as e:
+            logger.error(f"Could not parse '{field_key}' from cell at index {index}. Value: '{total_cells[index]}'.")
+            raise ScraperDataExtractionError(f'Error parsing total for {field_key}') from e
+
+    totals: DebtTotals = {
+        'total_credit': get_parsed_total('total_credit'),
+        'current': get_parsed_total('current'),
+        'late_30_59': get_parsed_total('late_30_59'),
+        'late_60_89': get_parsed_total('late_60_89'),
+        'late_90_plus': get_parsed_total('late_90_plus'),
+    }
+
+    return CMFScraperResult(
+        {'data': results, 'totals': totals, 'timestamp': datetime.now().isoformat(), 'currency': 'CLP'}
+    )
+
+
+def parse_line_of_credit_table(table: TableSnapshot) -> CMFLineOfCreditResult:
+    """Build the CMF line of credit result from a snapshot of ``#tabla_lineas_credito``."""
+    results: List[LineOfCreditEntry] = []
+    for i, cells in enumerate(table['rows']):
+        if len(cells) != 3:
+            logger.warning(f'Unexpected number of columns in row {i}: {len(cells)}. Skipping.')
+            continue
+
+        try:
+            results.append(
+                {
+                    'institution': cells[0].strip(),
+                    'direct': parse_money(cells[1]),
+                    'indirect': parse_money(cells[2]),
+                }
+            )
+        except ValueError as e:
+            logger.error(f'Error parsing money in line of credit row {i}: {e}. Row data: {cells}')
+            raise ScraperDataExtractionError(f'Error parsing money in line of credit row {i}') from e
+
+    footer_cells = table['footer'][0] if table['footer'] else []
+    if len(footer_cells) != 3:
+        logger.error(f'Unexpected number of total columns: {len(footer_cells)}')
+        raise ScraperDataExtractionError('Unexpected structure in totals row of line of credit table.')
+
+    try:
+        totals: LineOfCreditTotals = {
+            'direct': parse_money(footer_cells[1]),
+            'indirect': parse_money(footer_cells[2]),
+        }
+    except ValueError as e:
+        logger.error(f'Error parsing totals in line of credit table: {e}. Data: {footer_cells}')
+        raise ScraperDataExtractionError('Error parsing line of credit totals') from e
+
+    return {'data': results, 'totals': totals, 'timestamp': datetime.now().isoformat(), 'currency': 'CLP'}
+
+
+def credit_lines_availability(table: Optional[TableSnapshot]) -> HasCreditLinesResult:
+    """Whether the line of credit table (None when the page shows none) has direct or indirect credit."""
+    if table is None:
+        return {'direct': False, 'indirect': False}
+
+    direct_total = 0
+    indirect_total = 0
+    for i, cells in enumerate(table['rows']):
+        if len(cells) != 3:
+            continue
+        try:
+            direct_total += parse_money(cells[1])
+            indirect_total += parse_money(cells[2])
+        except ValueError as e:
+            logger.warning(f'Error parsing row {i} in credit line table: {e}')
+
+    return {'direct': direct_total > 0, 'indirect': indirect_total > 0}
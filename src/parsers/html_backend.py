@@ -0,0 +1,44 @@
+import importlib.util
+from typing import Tuple
+
+from bs4 import BeautifulSoup
+
+from src.config.config import HTML_PARSER_BACKEND
+from src.config.logger import get_logger
+
+logger = get_logger(__name__)
+
+# BeautifulSoup tree builders the parsers are checked against, fastest first
+SUPPORTED_BACKENDS: Tuple[str, ...] = ('lxml', 'html.parser')
+FALLBACK_BACKEND = 'html.parser'
+
+
+def backend_available(backend: str) -> bool:
+    """Whether the tree builder can be used in this environment."""
+    if backend == FALLBACK_BACKEND:
+        return True
+    return importlib.util.find_spec(backend) is not None
+
+
+def resolve_backend(requested: str) -> str:
+    """Pick the tree builder for ``requested`` ('auto', 'lxml' or 'html.parser').
+
+    'auto' takes the fastest one installed. An unknown or missing backend falls back to html.parser.
+    """
+    if requested == 'auto':
+        return next(backend for backend in SUPPORTED_BACKENDS if backend_available(backend))
+    if requested not in SUPPORTED_BACKENDS:
+        logger.warning(f"Unknown HTML parser backend '{requested}'. Using {FALLBACK_BACKEND}.")
+        return FALLBACK_BACKEND
+    if not backend_available(requested):
+        logger.warning(f"HTML parser backend '{requested}' is not installed. Using {FALLBACK_BACKEND}.")
+        return FALLBACK_BACKEND
+    return requested
+
+
+ACTIVE_BACKEND = resolve_backend(HTML_PARSER_BACKEND)
+
+
+def make_soup(markup: str, backend: str = '') -> BeautifulSoup:
+    """Parse ``markup`` with the configured backend (or an explicit one, e.g. for benchmarks)."""
+    return BeautifulSoup(markup, backend or ACTIVE_BACKEND)
@@ -0,0 +1,91 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple, TypeVar
+
+from src.config.config import PARSE_EXECUTOR, PARSE_EXECUTOR_WORKERS
+from src.config.logger import get_logger
+from src.utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+T = TypeVar('T')
+
+EXECUTOR_KINDS = ('thread', 'process', 'inline')
+
+
+def _timed_call(func: Callable[..., T], *args: Any) -> Tuple[T, float, float]:
+    """Run ``func`` and return its result with wall-clock start and end times (comparable across processes)."""
+    started = time.time()
+    result = func(*args)
+    return result, started, time.time()
+
+
+class ParseExecutor:
+    """Runs CPU-bound parsing off the event loop and returns the DTOs.
+
+    ``kind`` is 'thread', 'process' (functions and arguments must be picklable, i.e. module-level
+    parsers fed with strings) or 'inline' (no offloading). Records how long each call waited for a
+    free worker and how long it ran.
+    """
+
+    def __init__(self, kind: str = 'thread', max_workers: int = 2):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown parse executor '{kind}'. Expected one of: {', '.join(EXECUTOR_KINDS)}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.in_flight = 0
+        self._executor: Optional[Executor] = None
+        if kind == 'thread':
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='parse')
+        elif kind == 'process':
+            # spawn: forking a process that runs Playwright's driver threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')
+            )
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        """Run ``func(*args)`` in the pool and await its result."""
+        name = getattr(func, '__name__', 'parse')
+        submitted = time.time()
+        self.in_flight += 1
+        try:
+            if self._executor is None:
+                result, started, finished = _timed_call(func, *args)
+            else:
+                loop = asyncio.get_running_loop()
+                result, started, finished = await loop.run_in_executor(self._executor, _timed_call, func, *args)
+        finally:
+            self.in_flight -= 1
+        metrics.histogram('parse.queue_wait_seconds').observe(max(0.0, started - submitted))
+        metrics.histogram('parse.exec_seconds').observe(finished - started)
+        metrics.histogram(f'parse.{name}_seconds').observe(finished - started)
+        return result
+
+    def shutdown(self):
+        """Stop the pool, waiting for the running calls."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+_parse_executor: Optional[ParseExecutor] = None
+
+
+def get_parse_executor() -> ParseExecutor:
+    """Return the process-wide parse executor, creating it from the configuration on first use."""
+    global _parse_executor
+    if _parse_executor is None:
+        _parse_executor = ParseExecutor(PARSE_EXECUTOR, PARSE_EXECUTOR_WORKERS)
+        metrics.gauge('parse.in_flight', lambda: _parse_executor.in_flight if _parse_executor else 0)
+        logger.info(f'Parse executor: {PARSE_EXECUTOR} with {PARSE_EXECUTOR_WORKERS} worker(s).')
+    return _parse_executor
+
+
+def shutdown_parse_executor():
+    """Shut down the process-wide parse executor, if it was started."""
+    global _parse_executor
+    if _parse_executor is not None:
+        _parse_executor.shutdown()
+        _parse_executor = None
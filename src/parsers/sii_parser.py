@@ -0,0 +1,283 @@
+import datetime
+from typing import Any, Dict, List
+
+from bs4 import BeautifulSoup, Tag
+
+from src.config.logger import get_logger
+from src.dto.sii_data import (
+    SiiAcreditarRentaResult,
+    SiiContributorData,
+    SiiEconomicActivity,
+    SiiHeaderData,
+    SiiHonoraryTicketData,
+    SiiHonoraryTicketEntry,
+    SiiLastStampedDocument,
+    SiiPropertyData,
+    SiiPropertyEntry,
+    SiiTaxDeclarationData,
+    SiiTaxDeclarationEntry,
+)
+from src.parsers.html_backend import make_soup
+from src.utils.utils import parse_money
+
+logger = get_logger(__name__)
+
+TAX_DECLARATION_ROWS_SELECTOR = 'div#marca_RENTA table#tbl_renta > tbody > tr'
+TAX_DECLARATION_LABEL_SELECTOR = 'td.td_tbl_background span.textof'
+
+
+def parse_acreditar_renta(html: str, backend: str = '') -> SiiAcreditarRentaResult:
+    """Build the whole 'Acreditar Renta' result from the HTML of the Carpeta Tributaria ``cte`` frame.
+
+    ``backend`` overrides the configured HTML parser backend.
+    """
+    soup = make_soup(html, backend)
+    return SiiAcreditarRentaResult(
+        header_data=parse_header_data(soup),
+        contributor_data=parse_contributor_data(soup, backend),
+        property_data=parse_property_data(soup, backend),
+        honorary_ticket_data=parse_honorary_ticket_data(soup, backend),
+        tax_declaration_data=parse_tax_declaration_data(soup),
+        timestamp=datetime.datetime.now().isoformat(),
+        currency='CLP',
+    )
+
+
+def _input_value(soup: BeautifulSoup, **attrs: Any) -> str:
+    """Value of the first input matching ``attrs`` (entities already unescaped), or ''."""
+    tag = soup.find('input', attrs=attrs)
+    if isinstance(tag, Tag):
+        value = tag.get('value')
+        return value if isinstance(value, str) else ''
+    return ''
+
+
+def parse_header_data(soup: BeautifulSoup) -> SiiHeaderData:
+    """Extract header data from hidden input fields."""
+    return SiiHeaderData(
+        rut=_input_value(soup, id='rut'),
+        dv=_input_value(soup, id='dv'),
+        generation_date=_input_value(soup, id='fecha_emision'),
+        full_name=_input_value(soup, id='nombre_completo'),
+        email=_input_value(soup, id='mail'),
+        code=_input_value(soup, id='codigo'),
+    )
+
+
+def parse_contributor_data(page_soup: BeautifulSoup, backend: str = '') -> SiiContributorData:
+    """Extract contributor data from the hidden input field tbl_dbcontribuyente1."""
+    soup = make_soup(_input_value(page_soup, name='tbl_dbcontribuyente1'), backend)
+
+    start_date_activities_tag = soup.find(id='td_fecha_inicio')
+    start_date_activities = start_date_activities_tag.get_text(strip=True) if start_date_activities_tag else ''
+
+    economic_activities_raw_tag = soup.find(id='td_actividades')
+    economic_activities_text = (
+        economic_activities_raw_tag.get_text(separator='\n', strip=True).replace('\xa0', ' ')
+        if isinstance(economic_activities_raw_tag, Tag)
+        else ''
+    )
+    economic_activities: List[SiiEconomicActivity] = []
+    for line in economic_activities_text.splitlines():
+        line = line.strip()
+        if line:
+            parts = line.split(maxsplit=1)
+            if len(parts) > 1 and parts[0].isdigit():
+                economic_activities.append(SiiEconomicActivity(code=parts[0], description=parts[1].strip()))
+            else:
+                economic_activities.append(SiiEconomicActivity(code='', description=line))
+
+    tax_category_tag = soup.find(id='td_categoria')
+    tax_category = tax_category_tag.get_text(strip=True) if tax_category_tag else ''
+    address_tag = soup.find(id='td_domicilio')
+    address = address_tag.get_text(strip=True) if address_tag else ''
+    branches_tag = soup.find('td', string='Sucursales:')
+    branches = ''
+    if branches_tag:
+        next_sibling = branches_tag.find_next_sibling('td')
+        if next_sibling:
+            branches = next_sibling.get_text(strip=True)
+
+    last_stamped_documents: List[SiiLastStampedDocument] = []
+    doc_names_tag = soup.find(id='td_tim_nombre')
+    doc_names = doc_names_tag.get_text(separator='\n', strip=True) if isinstance(doc_names_tag, Tag) else ''
+    doc_dates_tag = soup.find(id='td_tim_fecha')
+    doc_dates = doc_dates_tag.get_text(separator='\n', strip=True) if isinstance(doc_dates_tag, Tag) else ''
+
+    for name, date in zip(doc_names.splitlines(), doc_dates.splitlines()):
+        name = name.strip()
+        date = date.strip()
+        if name:
+            last_stamped_documents.append(SiiLastStampedDocument(document_type=name, date=date))
+
+    tax_observations_tag = soup.find(id='td_observaciones')
+    tax_observations = tax_observations_tag.get_text(strip=True) if tax_observations_tag else ''
+
+    return SiiContributorData(
+        start_date_activities=start_date_activities,
+        economic_activities=economic_activities,
+        tax_category=tax_category,
+        address=address,
+        branches=branches if branches else None,
+        last_stamped_documents=last_stamped_documents,
+        tax_observations=tax_observations,
+    )
+
+
+def parse_property_data(page_soup: BeautifulSoup, backend: str = '') -> SiiPropertyData:
+    """Extract property data from the hidden input field tbl_propiedades1."""
+    soup = make_soup(_input_value(page_soup, name='tbl_propiedades1'), backend)
+
+    properties: List[SiiPropertyEntry] = []
+    # Find the table body that contains the property data, excluding the header and footer rows
+    table = soup.find('table')
+    if table and isinstance(table, Tag):
+        rows = table.find_all('tr')
+        # Skip header row and notes/summary rows
+        data_rows = [
+            row
+            for row in rows
+            if isinstance(row, Tag)
+            and isinstance(center_td := row.find('td', class_='centeralign'), Tag)
+            and '- No se registra información para este RUT -' not in center_td.get_text(strip=True)
+        ]
+
+        if not data_rows and '- No se registra información para este RUT -' in table.get_text():
+            # No properties found
+            pass
+        else:
+            # Assuming the first tr is header, and the last tr is notes
+            # Adjust slicing based on actual HTML structure if needed
+            for row in rows[2:-1]:  # Skip header and notes rows
+                if isinstance(row, Tag):
+                    cols = row.find_all('td')
+                    if len(cols) == 8:  # Ensure it's a data row
+                        try:
+                            properties.append(
+                                SiiPropertyEntry(
+                                    commune=cols[0].get_text(strip=True),
+                                    role=cols[1].get_text(strip=True),
+                                    address=cols[2].get_text(strip=True),
+                                    destination=cols[3].get_text(strip=True),
+                                    fiscal_appraisal=parse_money(cols[4].get_text(strip=True)),
+                                    outstanding_installments_due=parse_money(cols[5].get_text(strip=True)),
+                                    outstanding_installments_current=parse_money(cols[6].get_text(strip=True)),
+                                    condition=cols[7].get_text(strip=True),
+                                )
+                            )
+                        except ValueError as e:
+                            logger.warning(f'Error parsing property data: {e} in row {row.get_text()}')
+
+    notes: List[str] = []
+    notes_p = (
+        soup.find('td', class_='td_tbl_background').find(  # type: ignore
+            'p'
+        )
+        if soup.find('td', class_='td_tbl_background')
+        else None
+    )
+    if notes_p:
+        for content in notes_p.contents:  # type: ignore
+            if isinstance(content, str) and content.strip():
+                notes.append(content.strip())
+            elif content.name == 'br':  # type: ignore
+                pass  # Ignore <br> tags for now, or handle as new line if needed
+
+    return SiiPropertyData(properties=properties, notes=notes)
+
+
+def parse_honorary_ticket_data(page_soup: BeautifulSoup, backend: str = '') -> SiiHonoraryTicketData:
+    """Extract honorary ticket data from the hidden input field tbl_boletas1."""
+    soup = make_soup(_input_value(page_soup, name='tbl_boletas1'), backend)
+
+    tickets: List[SiiHonoraryTicketEntry] = []
+    table = soup.find('table')
+    if table and isinstance(table, Tag):
+        all_rows = table.find_all('tr')
+        rows = [row for row in all_rows if isinstance(row, Tag)]
+        for row in rows[2:-1]:  # Skip header and notes rows
+            if isinstance(row, Tag):
+                cols = row.find_all('td')
+                # Ensure it's a data row and not the totals row
+                if len(cols) == 4 and 'Totales:' not in row.get_text(strip=True):
+                    try:
+                        tickets.append(
+                            SiiHonoraryTicketEntry(
+                                period=cols[0].get_text(strip=True),
+                                gross_honorary=parse_money(cols[1].get_text(strip=True) or '0'),
+                                third_party_retention=parse_money(cols[2].get_text(strip=True) or '0'),
+                                contributor_ppm=parse_money(cols[3].get_text(strip=True) or '0'),
+                            )
+                        )
+                    except ValueError as e:
+                        logger.warning(f'Error parsing honorary ticket data: {e} in row {row.get_text()}')
+
+    note = ''
+    note_p = (
+        soup.find('td', colspan='4', class_='td_tbl_background').find(  # type: ignore
+            'p'
+        )
+        if soup.find('td', colspan='4', class_='td_tbl_background')
+        else None
+    )
+    if note_p:
+        note = note_p.get_text(strip=True)  # type: ignore
+
+    return SiiHonoraryTicketData(tickets=tickets, note=note)
+
+
+def _declaration_cell(code_cell: Tag, concept_cell: Tag, value_cell: Tag, details: Dict[str, Any]):
+    """Add one code/concept/value triplet of an F22 row to ``details``."""
+    code_tag = code_cell.find('b')
+    concept_tag = concept_cell.find('font')
+    if not isinstance(code_tag, Tag) or not isinstance(concept_tag, Tag):
+        return
+    code = ' '.join(code_tag.get_text(strip=True).split())
+    concept = ' '.join(concept_tag.get_text(separator=' ', strip=True).split())
+    value = ' '.join(value_cell.get_text(separator=' ', strip=True).split())
+    if not code.startswith('AÑO'):
+        details[code] = {'concept': concept, 'value': value}
+
+
+def parse_tax_declaration_data(soup: BeautifulSoup) -> SiiTaxDeclarationData:
+    """Extract tax declaration data (F22) from the page."""
+    declarations: List[SiiTaxDeclarationEntry] = []
+
+    # Find all sections for tax declarations (e.g., Año Tributario 2025, Año Tributario 2024)
+    # Rows with a tax year label; soupsieve only takes compound selectors inside :has()
+    sections = [
+        row for row in soup.select(TAX_DECLARATION_ROWS_SELECTOR) if row.select_one(TAX_DECLARATION_LABEL_SELECTOR)
+    ]
+    for i, section in enumerate(sections):
+        labels = section.select(TAX_DECLARATION_LABEL_SELECTOR)
+        # Normalized like Playwright's inner_text
+        tax_year_text = ' '.join(labels[0].get_text().split())
+        try:
+            tax_year = int(tax_year_text.split()[-1])
+        except (ValueError, IndexError):
+            logger.warning(f'Could not parse tax year from: {tax_year_text}')
+            continue
+
+        # The form number is usually next to the tax year, e.g., "1 / 3"
+        form_number = ' '.join(labels[1].get_text().split()) if len(labels) > 1 else ''
+
+        details: Dict[str, Any] = {}
+        # Assuming IDs are n_renta_1, n_renta_2, etc.
+        details_div = soup.find(id=f'n_renta_{i + 1}')
+
+        # Check for "- No se registra declaración para este período -"
+        if (
+            isinstance(details_div, Tag)
+            and '- No se registra declaración para este período -' not in details_div.get_text()
+        ):
+            # Rows with six cells hold two code/concept/value triplets
+            for row in details_div.find_all('tr'):
+                if isinstance(row, Tag):
+                    cells = [cell for cell in row.find_all('td') if isinstance(cell, Tag)]
+                    if len(cells) >= 6:
+                        _declaration_cell(cells[0], cells[1], cells[2], details)
+                        _declaration_cell(cells[3], cells[4], cells[5], details)
+
+        declarations.append(SiiTaxDeclarationEntry(tax_year=tax_year, form_number=form_number, details=details))
+
+    return SiiTaxDeclarationData(declarations=declarations)
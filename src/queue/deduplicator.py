@@ -1,35 +1,34 @@
 import hashlib
-import os
 
-import redis
+from src.queue.models import Task
 
 
-class Deduplicator:
-    """Handles deduplication of tasks using Redis to prevent processing the same task multiple times."""
+def dedup_key(prefix: str, username: str, webhook_url: str, scraper_type: str) -> str:
+    """Return the Redis key marking a task for this username, webhook URL and scraper type."""
+    # Create a hash based on relevant task parameters
+    data_string = f'{username}-{webhook_url}-{scraper_type}'
+    return str(prefix + hashlib.sha256(data_string.encode('utf-8')).hexdigest())
 
-    def __init__(self, prefix='dedup:', ttl=300): # ttl in seconds (5 minutes)
-        host = os.getenv('REDISHOST', 'localhost')
-        port = int(os.getenv('REDISPORT', 6379))
-        password = os.getenv('REDISPASSWORD', None)
-        db = int(os.getenv('REDIS_DB', 0)) # Keeping REDIS_DB as it's a common Redis client parameter
-        self.redis_client = redis.Redis(host=host, port=port, password=password, db=db)
+
+def task_dedup_key(prefix: str, task: Task) -> str:
+    """Return the dedup key of a task; combined tasks are told apart by their sources."""
+    scraper_type = task.scraper_type
+    if task.sources:
+        scraper_type += ':' + ','.join(sorted(task.sources))
+    return dedup_key(prefix, task.username, task.webhook_url, scraper_type)
+
+
+class AsyncDeduplicator:
+    """Builds the dedup keys of the API's tasks and holds how long a key keeps duplicates out.
+
+    Each key holds the id of the task that claimed it. Keys are claimed together with the enqueue, through
+    ``AsyncQueueManager.enqueue_unique``, so a separate check and mark cannot race.
+    """
+
+    def __init__(self, prefix='dedup:', ttl=300):  # ttl in seconds (5 minutes)
         self.prefix = prefix
         self.ttl = ttl
 
-    def _generate_key(self, username: str, webhook_url: str) -> str:
-        # TODO: generate hash with path /cmf /afc etc
-        # Create a hash based on relevant task parameters
-        data_string = f"{username}-{webhook_url}"
-        return str(self.prefix + hashlib.sha256(data_string.encode('utf-8')).hexdigest())
-
-    def is_duplicate(self, username: str, webhook_url: str) -> bool:
-        """Check if a task with the given username and webhook URL is a duplicate."""
-        key = self._generate_key(username, webhook_url)
-        if self.redis_client.exists(key):
-            return True
-        return False
-
-    def mark_as_processed(self, username: str, webhook_url: str):
-        """Mark a task as processed to prevent future duplicates."""
-        key = self._generate_key(username, webhook_url)
-        self.redis_client.setex(key, self.ttl, "1") # Store a dummy value, expire after ttl
+    def key_for(self, task: Task) -> str:
+        """Return the dedup key of a task."""
+        return task_dedup_key(self.prefix, task)
@@ -0,0 +1,82 @@
+import os
+from typing import Dict, List, Optional, Sequence
+
+# Scraper types with a lane of their own, and the priorities every lane is split into (most urgent first)
+LANE_TYPES = ('cmf', 'sii', 'afc', 'all')
+PRIORITIES = ('high', 'normal')
+DEFAULT_PRIORITY = 'normal'
+
+# Dequeues each scraper type gets per round while every lane is backlogged: CMF needs no captcha and drains fastest
+DEFAULT_LANE_WEIGHTS: Dict[str, int] = {
+    'cmf': 3,
+    'sii': 1,
+    'afc': 1,
+    'all': 1,
+}
+
+
+def lane_name(scraper_type: str, priority: str = DEFAULT_PRIORITY) -> str:
+    """Return the lane of a scraper type and priority, e.g. 'afc' or 'afc:high'."""
+    return scraper_type if priority == DEFAULT_PRIORITY else f'{scraper_type}:{priority}'
+
+
+def get_lane_weight(scraper_type: str) -> int:
+    """Return the weight of a scraper type's lanes.
+
+    Defaults can be overridden with QUEUE_LANE_WEIGHT_<TYPE> (e.g. QUEUE_LANE_WEIGHT_AFC=2).
+    """
+    default = DEFAULT_LANE_WEIGHTS.get(scraper_type, 1)
+    return max(1, int(os.getenv(f'QUEUE_LANE_WEIGHT_{scraper_type.upper()}', default)))
+
+
+def lane_tiers(scraper_types: Optional[Sequence[str]] = None) -> List[List[str]]:
+    """Lanes of the given scraper types (every type by default), grouped by priority, most urgent first."""
+    types = list(scraper_types or LANE_TYPES)
+    unknown = set(types) - set(LANE_TYPES)
+    if unknown:
+        raise ValueError(f'Unknown queue lanes: {", ".join(sorted(unknown))}')
+    return [[lane_name(scraper_type, priority) for scraper_type in types] for priority in PRIORITIES]
+
+
+class LaneScheduler:
+    """Decides in which order a worker tries its lanes: strict priority between tiers, deficit round-robin within.
+
+    Within a tier, the lane whose turn it is may hand out as many tasks in a row as its weight before the
+    turn passes on, and a lane found empty loses its turn and what was left of its quantum. While every
+    lane is backlogged each one gets dequeues in proportion to its weight, so a backlog of slow tasks
+    does not hold back the fast lanes.
+    """
+
+    def __init__(self, tiers: List[List[str]], weights: Dict[str, int]):
+        self.tiers = [tier for tier in tiers if tier]
+        self.weights = weights
+        self._turn = [0] * len(self.tiers)
+        self._deficit = {lane: 0 for tier in self.tiers for lane in tier}
+
+    def order(self) -> List[str]:
+        """Every lane, in the order to try them for the next task."""
+        order: List[str] = []
+        for tier, turn in zip(self.tiers, self._turn):
+            order.extend(tier[turn:] + tier[:turn])
+        return order
+
+    def served(self, lane: str):
+        """Charge ``lane`` for the task it handed out; the lanes tried before it were empty."""
+        for index, tier in enumerate(self.tiers):
+            turn = self._turn[index]
+            rotation = tier[turn:] + tier[:turn]
+            skipped = rotation[: rotation.index(lane)] if lane in tier else rotation
+            for empty in skipped:
+                self._deficit[empty] = 0
+            if lane in tier:
+                if self._deficit[lane] == 0:
+                    self._deficit[lane] = self.weights.get(lane, 1)
+                self._deficit[lane] -= 1
+                position = tier.index(lane)
+                self._turn[index] = position if self._deficit[lane] else (position + 1) % len(tier)
+                return
+
+    def idle(self):
+        """Every lane was found empty: forget the deficits."""
+        for lane in self._deficit:
+            self._deficit[lane] = 0
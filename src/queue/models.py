@@ -1,6 +1,6 @@
-from typing import Any
+from typing import Any, List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
 
 class Task(BaseModel):
@@ -10,7 +10,19 @@ class Task(BaseModel):
     username: str
     password: str
     webhook_url: str
-    scraper_type: str = Field(..., description="Type of scraper to use (e.g., 'cmf', 'afc')")
+    scraper_type: str = Field(..., description="Type of scraper to use (e.g., 'cmf', 'afc', 'all')")
+    sources: Optional[List[str]] = Field(default=None, description="Sources scraped by the 'all' scraper type")
+    years: Optional[List[int]] = Field(
+        default=None, description="AFC cotizaciones years (the scraper's default if empty)"
+    )
     data: Any = None
-    retries: int = Field(0, description="Number of times this task has been retried")
-    max_retries: int = Field(3, description="Maximum number of retries for this task")
+    retries: int = Field(default=0, description='Number of times this task has been retried')
+    max_retries: int = Field(default=3, description='Maximum number of retries for this task')
+    priority: str = Field(
+        default='normal', description="Queue priority within the lane of its scraper type ('high', 'normal')"
+    )
+    enqueued_at: Optional[float] = Field(default=None, description='Unix time of the first submission, set on enqueue')
+
+    # Set by QueueManager.dequeue_blocking: the exact payload held in the processing list and the list itself
+    _receipt: Optional[str] = PrivateAttr(default=None)
+    _processing_list: Optional[str] = PrivateAttr(default=None)
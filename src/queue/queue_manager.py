@@ -1,47 +1,478 @@
-import os
-from typing import Optional
+import json
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import redis
+import redis.asyncio as aioredis
 
+from src.config.config import QUEUE_VISIBILITY_TIMEOUT_SECONDS, WORKER_LANES
+from src.queue.lanes import LANE_TYPES, PRIORITIES, LaneScheduler, get_lane_weight, lane_name, lane_tiers
 from src.queue.models import Task
+from src.queue.redis_client import get_async_redis, get_redis
+from src.utils.metrics import metrics
 
+# Time from submission to dequeue can reach minutes while a slow lane is backlogged
+QUEUE_WAIT_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
 
-class QueueManager:
-    """Manages the task queue and dead-letter queue using Redis."""
+# Move a payload from a processing list back to its lane (KEYS[3]) and ring the lane's doorbell (KEYS[4]),
+# unless it was acked in the meantime
+REQUEUE_SCRIPT = """
+if redis.call('LREM', KEYS[1], 1, ARGV[1]) > 0 then
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    redis.call('RPUSH', KEYS[3], ARGV[1])
+    redis.call('RPUSH', KEYS[4], 1)
+    return 1
+end
+return 0
+"""
 
-    def __init__(self, queue_name='cmf_tasks', dlq_name='cmf_dlq'):
-        host = os.getenv('REDISHOST', 'localhost')
-        port = int(os.getenv('REDISPORT', 6379))
-        password = os.getenv('REDISPASSWORD', None)
-        # Keeping REDIS_DB as it's a common Redis client parameter
-        db = int(os.getenv('REDIS_DB', 0))
-        self.redis_client = redis.Redis(
-            host=host, port=port, password=password, db=db)
+# Push the lease (KEYS[2]) of a payload to ARGV[2], if it is still in this worker's processing list (KEYS[1]):
+# after the reaper requeued it, the same payload may be leased to another worker
+EXTEND_LEASE_SCRIPT = """
+if redis.call('LPOS', KEYS[1], ARGV[1]) then
+    return redis.call('ZADD', KEYS[2], 'XX', 'CH', ARGV[2], ARGV[1])
+end
+return 0
+"""
+
+# Move a retry that is due from the scheduled set to its lane (KEYS[2]) and ring the lane's doorbell (KEYS[3]),
+# unless another promoter moved it first
+PROMOTE_SCRIPT = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) > 0 then
+    redis.call('RPUSH', KEYS[2], ARGV[1])
+    redis.call('RPUSH', KEYS[3], 1)
+    return 1
+end
+return 0
+"""
+
+# Enqueue ARGV[3] into its lane (KEYS[2]) and ring the lane's doorbell (KEYS[3]) unless the dedup key is set;
+# mark it with the task id (ARGV[1]) for ARGV[2] seconds.
+# Returns the id of the task already holding the key, or false once enqueued
+ENQUEUE_UNIQUE_SCRIPT = """
+local existing = redis.call('GET', KEYS[1])
+if existing then
+    return existing
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+redis.call('RPUSH', KEYS[2], ARGV[3])
+redis.call('RPUSH', KEYS[3], 1)
+return false
+"""
+
+# Move the head of the first non-empty lane to the processing list (KEYS[1]) and lease it until ARGV[1]
+# (KEYS[2]). The lanes follow as (lane, doorbell) pairs from KEYS[3], in scheduling order, and the
+# doorbell entry of the task is consumed too. ARGV[2] is the index in KEYS of a doorbell whose entry
+# the caller already consumed to wake up (0 if none); when the task comes from another lane, that entry
+# is given back so the worker subscribed to its lane still wakes up for it.
+# Returns {lane, payload}, or false when every lane is empty
+TAKE_SCRIPT = """
+local woken = tonumber(ARGV[2])
+for i = 3, #KEYS, 2 do
+    local payload = redis.call('LMOVE', KEYS[i], KEYS[1], 'LEFT', 'RIGHT')
+    if payload then
+        redis.call('ZADD', KEYS[2], ARGV[1], payload)
+        if i + 1 ~= woken then
+            redis.call('LPOP', KEYS[i + 1])
+            if woken > 0 then
+                redis.call('RPUSH', KEYS[woken], 1)
+            end
+        end
+        return {KEYS[i], payload}
+    end
+end
+return false
+"""
+
+
+def _decode(value) -> str:
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+class _QueueKeys:
+    """Redis keys of a task queue: one lane (list) per scraper type and priority, plus the main list.
+
+    The main list holds tasks of unknown types and tasks enqueued before lanes existed; workers
+    subscribed to every lane drain it last.
+    """
+
+    def __init__(self, queue_name: str, dlq_name: str):
         self.queue_name = queue_name
         self.dlq_name = dlq_name
+        self.workers_key = f'{queue_name}:workers'
+        self.leases_key = f'{queue_name}:leases'
+        self.scheduled_key = f'{queue_name}:scheduled'
+
+    def lane_key(self, lane: str) -> str:
+        """Return the list holding a lane."""
+        return f'{self.queue_name}:lane:{lane}'
+
+    def doorbell_key(self, list_key: str) -> str:
+        """Return the doorbell of a lane (or of the main list), which gets one entry per task pushed to it."""
+        return f'{list_key}:doorbell'
+
+    def task_lane_key(self, task: Task) -> str:
+        """Return the list a task is queued in."""
+        if task.scraper_type in LANE_TYPES and task.priority in PRIORITIES:
+            return self.lane_key(lane_name(task.scraper_type, task.priority))
+        return self.queue_name
+
+    def all_lane_keys(self) -> Dict[str, str]:
+        """Return every lane and its list, including the main list as 'main'."""
+        keys = {lane: self.lane_key(lane) for tier in lane_tiers() for lane in tier}
+        keys['main'] = self.queue_name
+        return keys
+
+
+def _lane_stats(lanes: List[str], depths: List[Any], heads: List[Any], now: float) -> Dict[str, Dict[str, Any]]:
+    stats = {}
+    for lane, depth, head in zip(lanes, depths, heads):
+        enqueued_at = json.loads(_decode(head)).get('enqueued_at') if head else None
+        stats[lane] = {'depth': int(depth), 'oldest_age_seconds': round(now - enqueued_at, 3) if enqueued_at else None}
+    return stats
+
+
+class QueueManager(_QueueKeys):
+    """Manages the task queue and dead-letter queue using Redis.
+
+    Tasks are queued in lanes, one per scraper type and priority, so slow captcha-bound tasks do not
+    block fast ones behind them. Each worker subscribes to some lanes (``lanes``, by scraper type) and
+    a ``LaneScheduler`` picks the order it tries them in: high priority first, then deficit
+    round-robin by lane weight. Producers ring the lane's doorbell list for every task they push, and
+    idle workers block on the doorbells of their lanes instead of polling the lanes.
+
+    Reliable consumers use ``dequeue_blocking``, which atomically moves each task to a per-worker
+    processing list and leases it for ``visibility_timeout`` seconds. The task must then be
+    acknowledged with ``ack``, handed back with ``nack`` or moved to the DLQ with ``enqueue_dlq``.
+    Tasks whose lease expired (e.g. the worker crashed) are put back on the queue by ``reap_expired``;
+    a worker running a long task keeps its lease with ``extend_lease``.
+
+    Failed tasks are parked with ``schedule_retry`` in a sorted set keyed by due time instead of
+    sleeping in the worker; ``promote_due`` moves them back to their lane once they are due.
+
+    This is the synchronous client used by the worker; the API enqueues through ``AsyncQueueManager``.
+    """
+
+    def __init__(
+        self,
+        queue_name='cmf_tasks',
+        dlq_name='cmf_dlq',
+        visibility_timeout: int = QUEUE_VISIBILITY_TIMEOUT_SECONDS,
+        redis_client: Optional[redis.Redis] = None,
+        lanes: Optional[Sequence[str]] = None,
+    ):
+        super().__init__(queue_name, dlq_name)
+        self.redis_client = redis_client or get_redis()
+        self.visibility_timeout = visibility_timeout
+        if lanes is None:
+            lanes = [lane.strip() for lane in WORKER_LANES.split(',') if lane.strip()]
+        self.lanes = list(lanes) or list(LANE_TYPES)
+        tiers = lane_tiers(self.lanes)
+        self.scheduler = LaneScheduler(
+            tiers, {lane: get_lane_weight(lane.split(':')[0]) for tier in tiers for lane in tier}
+        )
+        # Workers on every lane also drain the main list
+        self._drains_main = set(self.lanes) == set(LANE_TYPES)
+        self._requeue = self.redis_client.register_script(REQUEUE_SCRIPT)
+        self._extend_lease = self.redis_client.register_script(EXTEND_LEASE_SCRIPT)
+        self._promote = self.redis_client.register_script(PROMOTE_SCRIPT)
+        self._take = self.redis_client.register_script(TAKE_SCRIPT)
+
+    def _subscribed_keys(self, lane_types: Optional[Sequence[str]] = None) -> List[str]:
+        """Return the lists this worker takes tasks from (only the lanes of ``lane_types`` if given), in order."""
+        keys = [
+            self.lane_key(lane)
+            for lane in self.scheduler.order()
+            if lane_types is None or lane.split(':')[0] in lane_types
+        ]
+        return keys + [self.queue_name] if self._drains_main else keys
 
     def enqueue(self, task: Task):
-        """Enqueues a task into the main queue."""
-        self.redis_client.rpush(self.queue_name, task.json())
+        """Enqueues a task into its lane."""
+        if task.enqueued_at is None:
+            task.enqueued_at = time.time()
+        lane_key = self.task_lane_key(task)
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.rpush(lane_key, task.json())
+        pipe.rpush(self.doorbell_key(lane_key), 1)
+        pipe.execute()
 
     def dequeue(self) -> Optional[Task]:
-        """Dequeues a task from the main queue."""
-        task_json = self.redis_client.lpop(self.queue_name)
-        if task_json:
-            if isinstance(task_json, bytes):
-                task_json = task_json.decode('utf-8')
-            if isinstance(task_json, str):
-                return Task.model_validate_json(task_json)
+        """Dequeues a task from the subscribed lanes, without a lease."""
+        for key in self._subscribed_keys():
+            task_json = self.redis_client.lpop(key)
+            if task_json:
+                self.redis_client.lpop(self.doorbell_key(key))
+                return Task.model_validate_json(_decode(task_json))
         return None
 
+    def processing_list(self, worker_id: str) -> str:
+        """Return the name of the processing list owned by a worker."""
+        return f'{self.queue_name}:processing:{worker_id}'
+
+    def register_worker(self, worker_id: str):
+        """Make a worker's processing list visible to the reaper."""
+        self.redis_client.sadd(self.workers_key, self.processing_list(worker_id))
+
+    def unregister_worker(self, worker_id: str):
+        """Forget a worker's processing list once it holds no more tasks."""
+        processing = self.processing_list(worker_id)
+        if self.redis_client.llen(processing) == 0:
+            self.redis_client.srem(self.workers_key, processing)
+
+    def dequeue_blocking(self, worker_id: str, timeout: float) -> Optional[Task]:
+        """Wait up to ``timeout`` seconds for a task and move it to the worker's processing list.
+
+        The lanes are tried in scheduling order. When all of them are empty the worker blocks on the
+        doorbells of its lanes, which get one entry per task pushed to the lane, and tries again once
+        one of them rings. Doorbells of lanes the worker does not take from are never consumed.
+        """
+        task = self._take_next(worker_id)
+        if task is None:
+            doorbells = [self.doorbell_key(key) for key in self._subscribed_keys()]
+            rung = self.redis_client.blpop(doorbells, timeout=timeout)
+            if rung:
+                task = self._take_next(worker_id, woken_by=_decode(rung[0]))
+        return task
+
+    def _take_next(self, worker_id: str, woken_by: Optional[str] = None) -> Optional[Task]:
+        """Take the next task with TAKE_SCRIPT; ``woken_by`` is the doorbell whose entry was already consumed."""
+        processing = self.processing_list(worker_id)
+        keys = [processing, self.leases_key]
+        for key in self._subscribed_keys():
+            keys.extend((key, self.doorbell_key(key)))
+        # Lua indexes KEYS from 1
+        woken = keys.index(woken_by) + 1 if woken_by in keys else 0
+        taken = self._take(keys=keys, args=[time.time() + self.visibility_timeout, woken])
+        if not taken:
+            self.scheduler.idle()
+            return None
+        lane_key, payload = (_decode(value) for value in taken)
+        lane = lane_key.rsplit(':lane:', 1)[1] if ':lane:' in lane_key else 'main'
+        if lane == 'main':
+            self.scheduler.idle()
+        else:
+            self.scheduler.served(lane)
+        task = Task.model_validate_json(payload)
+        if task.enqueued_at:
+            metrics.histogram(f'queue.{lane}.wait_seconds', QUEUE_WAIT_BUCKETS).observe(time.time() - task.enqueued_at)
+        task._receipt = payload
+        task._processing_list = processing
+        return task
+
+    def _release(self, pipe: Any, task: Task) -> bool:
+        """Queue on ``pipe`` the removal of a task from its processing list and the leases.
+
+        Returns False if the task was not taken with ``dequeue_blocking`` (or was already released).
+        """
+        if task._receipt is None or task._processing_list is None:
+            return False
+        pipe.lrem(task._processing_list, 1, task._receipt)
+        pipe.zrem(self.leases_key, task._receipt)
+        task._receipt = None
+        return True
+
+    def extend_lease(self, task: Task) -> bool:
+        """Push the lease of a task taken with ``dequeue_blocking`` ``visibility_timeout`` seconds ahead.
+
+        Returns False if the task holds no lease any more (acked, or requeued by the reaper).
+        """
+        if task._receipt is None or task._processing_list is None:
+            return False
+        deadline = time.time() + self.visibility_timeout
+        return bool(self._extend_lease(keys=[task._processing_list, self.leases_key], args=[task._receipt, deadline]))
+
+    def ack(self, task: Task):
+        """Acknowledge a task taken with ``dequeue_blocking``, removing it from the processing list."""
+        pipe = self.redis_client.pipeline(transaction=True)
+        if self._release(pipe, task):
+            pipe.execute()
+
+    def nack(self, task: Task):
+        """Release a task taken with ``dequeue_blocking`` and put its current state back in its lane."""
+        pipe = self.redis_client.pipeline(transaction=True)
+        if not self._release(pipe, task):
+            self.enqueue(task)
+            return
+        lane_key = self.task_lane_key(task)
+        pipe.rpush(lane_key, task.json())
+        pipe.rpush(self.doorbell_key(lane_key), 1)
+        pipe.execute()
+
+    def schedule_retry(self, task: Task, delay: float):
+        """Release a task's lease and park its current state until ``delay`` seconds from now."""
+        pipe = self.redis_client.pipeline(transaction=True)
+        self._release(pipe, task)
+        pipe.zadd(self.scheduled_key, {task.json(): time.time() + delay})
+        pipe.execute()
+
+    def promote_due(self, limit: int = 100) -> int:
+        """Move scheduled retries that are due back to their lanes. Returns how many were moved."""
+        due = self.redis_client.zrangebyscore(self.scheduled_key, '-inf', time.time(), start=0, num=limit)
+        if not due:
+            return 0
+        pipe = self.redis_client.pipeline(transaction=False)
+        for payload in due:
+            payload = _decode(payload)
+            lane_key = self.task_lane_key(Task.model_validate_json(payload))
+            self._promote(keys=[self.scheduled_key, lane_key, self.doorbell_key(lane_key)], args=[payload], client=pipe)
+        return sum(int(moved) for moved in pipe.execute())
+
+    def get_scheduled_size(self) -> int:
+        """Return the number of retries waiting in the scheduled set."""
+        return int(self.redis_client.zcard(self.scheduled_key))  # type: ignore
+
+    def reap_expired(self) -> int:
+        """Requeue tasks whose lease expired. Returns the number of requeued tasks."""
+        now = time.time()
+        requeued = 0
+        for processing in self.redis_client.smembers(self.workers_key):
+            processing = _decode(processing)
+            payloads = [_decode(payload) for payload in self.redis_client.lrange(processing, 0, -1)]
+            if not payloads:
+                continue
+            pipe = self.redis_client.pipeline(transaction=False)
+            for payload in payloads:
+                pipe.zscore(self.leases_key, payload)
+            deadlines = pipe.execute()
+            for payload, deadline in zip(payloads, deadlines):
+                if deadline is None:
+                    # Moved but not leased yet, or the worker died in between: start the clock now
+                    self.redis_client.zadd(self.leases_key, {payload: now + self.visibility_timeout}, nx=True)
+                elif deadline < now:
+                    lane_key = self.task_lane_key(Task.model_validate_json(payload))
+                    requeued += int(
+                        self._requeue(
+                            keys=[processing, self.leases_key, lane_key, self.doorbell_key(lane_key)], args=[payload]
+                        )
+                    )
+        return requeued
+
     def enqueue_dlq(self, task: Task):
-        """Enqueues a task into the dead-letter queue."""
-        self.redis_client.rpush(self.dlq_name, task.json())
+        """Enqueues a task into the dead-letter queue, releasing its lease if it has one."""
+        pipe = self.redis_client.pipeline(transaction=True)
+        self._release(pipe, task)
+        pipe.rpush(self.dlq_name, task.json())
+        pipe.execute()
+
+    def peek(self, count: int, lane_types: Optional[Sequence[str]] = None) -> List[Task]:
+        """Return up to ``count`` tasks from the heads of the subscribed lanes without dequeuing them.
+
+        With ``lane_types``, only the lanes of those scraper types (and the main list) are looked at, so a
+        backlog in the other lanes does not hide their tasks.
+        """
+        tasks: List[Task] = []
+        for key in self._subscribed_keys(lane_types):
+            if len(tasks) >= count:
+                break
+            tasks.extend(
+                Task.model_validate_json(_decode(payload))
+                for payload in self.redis_client.lrange(key, 0, count - len(tasks) - 1)
+            )
+        return tasks
+
+    def lane_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return the depth and the age of the oldest task of every lane."""
+        keys = self.all_lane_keys()
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key in keys.values():
+            pipe.llen(key)
+        for key in keys.values():
+            pipe.lindex(key, 0)
+        replies = pipe.execute()
+        return _lane_stats(list(keys), replies[: len(keys)], replies[len(keys) :], time.time())
 
     def is_empty(self) -> bool:
-        """Check if the main queue is empty."""
-        return bool(self.redis_client.llen(self.queue_name) == 0)
+        """Check if every lane is empty."""
+        return self.get_queue_size() == 0
 
     def get_queue_size(self) -> int:
-        """Return the current size of the main queue."""
-        return int(self.redis_client.llen(self.queue_name))  # type: ignore
+        """Return the number of tasks queued in every lane."""
+        return sum(lane['depth'] for lane in self.lane_stats().values())
+
+
+class AsyncQueueManager(_QueueKeys):
+    """Producer side of the task queue for asyncio code (the API), over the process's shared async Redis pool.
+
+    Uses the same keys as ``QueueManager``, so tasks enqueued here are consumed by the workers.
+    """
+
+    def __init__(self, queue_name='cmf_tasks', dlq_name='cmf_dlq', redis_client: Optional[aioredis.Redis] = None):
+        super().__init__(queue_name, dlq_name)
+        self.redis_client = redis_client or get_async_redis()
+        self._enqueue_unique = self.redis_client.register_script(ENQUEUE_UNIQUE_SCRIPT)
+
+    async def enqueue(self, task: Task):
+        """Enqueues a task into its lane."""
+        if task.enqueued_at is None:
+            task.enqueued_at = time.time()
+        lane_key = self.task_lane_key(task)
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.rpush(lane_key, task.json())
+        pipe.rpush(self.doorbell_key(lane_key), 1)
+        await pipe.execute()
+
+    def _unique_call(self, task: Task, dedup_key: str, ttl: int) -> Tuple[list, list]:
+        """Return the keys and args of ENQUEUE_UNIQUE_SCRIPT for ``task``."""
+        if task.enqueued_at is None:
+            task.enqueued_at = time.time()
+        lane_key = self.task_lane_key(task)
+        return [dedup_key, lane_key, self.doorbell_key(lane_key)], [task.task_id, ttl, task.json()]
+
+    async def enqueue_unique(self, task: Task, dedup_key: str, ttl: int) -> Optional[str]:
+        """Enqueue a task unless ``dedup_key`` was claimed within the last ``ttl`` seconds, in one atomic call.
+
+        Returns None once the task is enqueued, or the id of the task that already claimed the key.
+        """
+        keys, args = self._unique_call(task, dedup_key, ttl)
+        existing = await self._enqueue_unique(keys=keys, args=args)
+        return _decode(existing) if existing else None
+
+    async def enqueue_unique_many(self, entries: List[Tuple[Task, str]], ttl: int) -> List[Optional[str]]:
+        """``enqueue_unique`` for a batch of (task, dedup key) pairs, in one pipelined MULTI/EXEC transaction.
+
+        Returns, per entry, None if it was enqueued or the id of the task already holding its key
+        (possibly an earlier entry of the same batch).
+        """
+        if not entries:
+            return []
+        pipe = self.redis_client.pipeline(transaction=True)
+        for task, dedup_key in entries:
+            keys, args = self._unique_call(task, dedup_key, ttl)
+            await self._enqueue_unique(keys=keys, args=args, client=pipe)
+        return [_decode(existing) if existing else None for existing in await pipe.execute()]
+
+    async def peek(self, count: int) -> List[Task]:
+        """Return up to ``count`` tasks from the heads of the lanes, most urgent lanes first."""
+        tasks: List[Task] = []
+        for key in self.all_lane_keys().values():
+            if len(tasks) >= count:
+                break
+            tasks.extend(
+                Task.model_validate_json(_decode(payload))
+                for payload in await self.redis_client.lrange(key, 0, count - len(tasks) - 1)
+            )
+        return tasks
+
+    async def lane_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return the depth and the age of the oldest task of every lane."""
+        keys = self.all_lane_keys()
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key in keys.values():
+            pipe.llen(key)
+        for key in keys.values():
+            pipe.lindex(key, 0)
+        replies = await pipe.execute()
+        return _lane_stats(list(keys), replies[: len(keys)], replies[len(keys) :], time.time())
+
+    async def is_empty(self) -> bool:
+        """Check if every lane is empty."""
+        return await self.get_queue_size() == 0
+
+    async def get_queue_size(self) -> int:
+        """Return the number of tasks queued in every lane."""
+        return sum(lane['depth'] for lane in (await self.lane_stats()).values())
+
+    async def get_scheduled_size(self) -> int:
+        """Return the number of retries waiting in the scheduled set."""
+        return int(await self.redis_client.zcard(self.scheduled_key))
@@ -0,0 +1,57 @@
+import os
+from typing import Any, Dict, Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from src.config.config import REDIS_MAX_CONNECTIONS, REDIS_POOL_TIMEOUT_SECONDS
+
+_sync_client: Optional[redis.Redis] = None
+_async_client: Optional[aioredis.Redis] = None
+
+
+def redis_connection_kwargs() -> Dict[str, Any]:
+    """Return the connection settings from REDISHOST, REDISPORT, REDISPASSWORD and REDIS_DB.
+
+    Responses are decoded to str.
+    """
+    return {
+        'host': os.getenv('REDISHOST', 'localhost'),
+        'port': int(os.getenv('REDISPORT', 6379)),
+        'password': os.getenv('REDISPASSWORD', None) or None,
+        # Keeping REDIS_DB as it's a common Redis client parameter
+        'db': int(os.getenv('REDIS_DB', 0)),
+        'decode_responses': True,
+    }
+
+
+def get_redis() -> redis.Redis:
+    """Return the synchronous client shared by the process (worker, CLI), over one bounded connection pool."""
+    global _sync_client
+    if _sync_client is None:
+        pool = redis.BlockingConnectionPool(
+            max_connections=REDIS_MAX_CONNECTIONS, timeout=REDIS_POOL_TIMEOUT_SECONDS, **redis_connection_kwargs()
+        )
+        _sync_client = redis.Redis(connection_pool=pool)
+    return _sync_client
+
+
+def get_async_redis() -> aioredis.Redis:
+    """Return the asyncio client shared by the process (API handlers, rate limiter, session cache).
+
+    Connections come from one bounded pool; when every connection is busy, callers wait up to
+    REDIS_POOL_TIMEOUT_SECONDS for one instead of opening more.
+    """
+    global _async_client
+    if _async_client is None:
+        pool = aioredis.BlockingConnectionPool(
+            max_connections=REDIS_MAX_CONNECTIONS, timeout=REDIS_POOL_TIMEOUT_SECONDS, **redis_connection_kwargs()
+        )
+        _async_client = aioredis.Redis(connection_pool=pool)
+    return _async_client
+
+
+async def close_async_redis():
+    """Close the connections of the shared asyncio client. It reconnects if used again."""
+    if _async_client is not None:
+        await _async_client.connection_pool.disconnect()
@@ -0,0 +1,43 @@
+import os
+import random
+from typing import Dict
+
+from pydantic import BaseModel, Field
+
+
+class RetryPolicy(BaseModel):
+    """Exponential backoff with a cap and jitter for retrying failed tasks."""
+
+    base_delay: float = Field(default=2.0, description='Delay in seconds before the first retry')
+    max_delay: float = Field(default=60.0, description='Upper bound for the delay in seconds')
+    jitter: float = Field(
+        default=0.5, ge=0.0, le=1.0, description='Fraction of the delay that is randomized (0 disables jitter)'
+    )
+
+    def delay_for(self, retries: int) -> float:
+        """Return the delay in seconds before retry number ``retries`` (1-based)."""
+        delay = min(self.max_delay, self.base_delay * 2.0 ** max(retries - 1, 0))
+        return delay * (1 - self.jitter * random.random())
+
+
+# Captcha-bound scrapers (AFC) back off longer than plain logins (CMF)
+DEFAULT_RETRY_POLICIES: Dict[str, RetryPolicy] = {
+    'cmf': RetryPolicy(base_delay=2.0, max_delay=60.0),
+    'afc': RetryPolicy(base_delay=10.0, max_delay=300.0),
+    'sii': RetryPolicy(base_delay=5.0, max_delay=120.0),
+}
+
+
+def get_retry_policy(scraper_type: str) -> RetryPolicy:
+    """Return the retry policy for a scraper type.
+
+    Defaults can be overridden with RETRY_<TYPE>_BASE_SECONDS, RETRY_<TYPE>_MAX_SECONDS and
+    RETRY_<TYPE>_JITTER (e.g. RETRY_AFC_MAX_SECONDS=600).
+    """
+    default = DEFAULT_RETRY_POLICIES.get(scraper_type, RetryPolicy())
+    prefix = f'RETRY_{scraper_type.upper()}'
+    return RetryPolicy(
+        base_delay=float(os.getenv(f'{prefix}_BASE_SECONDS', default.base_delay)),
+        max_delay=float(os.getenv(f'{prefix}_MAX_SECONDS', default.max_delay)),
+        jitter=float(os.getenv(f'{prefix}_JITTER', default.jitter)),
+    )
@@ -1,47 +1,101 @@
 from src.scrapers.base_scraper import BaseScraper
-from src.scrapers.captcha_solver import RecaptchaSolver
+from src.scrapers.captcha_solver import CaptchaSolver
 
 __AUTHOR__ = "Luis Francisco Barra Sandoval"
 __EMAIL__ = "contacto@luisbarra.cl"
 __VERSION__ = "1.0.0"
 
+import asyncio
 import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional, Union
+from urllib.parse import urljoin
 
-from bs4 import BeautifulSoup, Tag
-from playwright.async_api import BrowserContext, Page
+from playwright.async_api import BrowserContext, Error, Page
 
+from src.browser.readiness import NavigationReady, SelectorReady, UrlReady, wait_until
+from src.config.config import AFC_BASE_URL, AFC_HTTP_POSTBACK, AFC_YEAR_CONCURRENCY, PAGE_READY_TIMEOUT
 from src.config.logger import get_logger, log_execution_func
 from src.dto.afc_data import AFCCotizacionEntry, AFCEmpresaEntry, AFCScraperResult
 from src.models.clave_unica import ClaveUnica
+from src.parsers.afc_parser import (
+    parse_cotizaciones_page,
+    parse_cotizaciones_table,
+    parse_empresas_page,
+    parse_empresas_table,
+)
+from src.parsers.parse_executor import get_parse_executor
 from src.scrapers.login_scraper import LoginScraper
-from src.utils.utils import parse_money
+from src.session.session_cache import SessionCache
+from src.utils.metrics import metrics
 
 logger = get_logger(__name__)
 
+LOGIN_URL = f"{AFC_BASE_URL}/WUI.AAP.OVIRTUAL/Default.aspx"
+EMPRESAS_URL = f"{AFC_BASE_URL}/WUI.AAP.OVIRTUAL/WebAfiliados/Datos/Empresas.aspx"
+COTIZACIONES_URL = f"{AFC_BASE_URL}/WUI.AAP.OVIRTUAL/WebAfiliados/Certificados/CrtPagadas.aspx"
+EMPRESAS_TABLE_SELECTOR = "table#contentPlaceHolder_gvEmpresas"
+COTIZACIONES_TABLE_SELECTOR = "table#contentPlaceHolder_dgBusqueda"
+PERIOD_SELECTOR = "select#contentPlaceHolder_ddlPeriodo"
+SEARCH_EVENT_TARGET = "ctl00$contentPlaceHolder_btnBuscar"
+
+# btnCU leaves the landing page, either to the ClaveÚnica form or (with a live SSO session) back into AFC
+CLAVE_UNICA_REDIRECT_READY = UrlReady(lambda url: "/Default.aspx" not in url, timeout=PAGE_READY_TIMEOUT)
+EMPRESAS_READY = SelectorReady(EMPRESAS_TABLE_SELECTOR, timeout=PAGE_READY_TIMEOUT)
+COTIZACIONES_READY = SelectorReady(COTIZACIONES_TABLE_SELECTOR, timeout=PAGE_READY_TIMEOUT)
+# The search postback reloads the page on the same URL; the old table stays in the DOM until it commits
+POSTBACK_READY = NavigationReady(timeout=PAGE_READY_TIMEOUT)
+
+
+def default_years() -> List[int]:
+    """Years scraped when the caller does not ask for specific ones: the current year and two earlier ones."""
+    current_year = datetime.datetime.now().year
+    return [current_year, current_year - 2, current_year - 3]
+
 
 class AFCScraper(BaseScraper):
     """Scraper for AFC financial data."""
 
+    session_site = "afc"
+
     def __init__(self, context: BrowserContext, login_scraper: LoginScraper, clave_unica: ClaveUnica,
-                 captcha_solver: RecaptchaSolver):
+                 captcha_solver: CaptchaSolver, session_cache: Optional[SessionCache] = None,
+                 years: Optional[List[int]] = None):
         self.context = context
         self.login_scraper = login_scraper
         self.clave_unica = clave_unica
         self.captcha_solver = captcha_solver
+        self.session_cache = session_cache
+        self.years = years
 
     @log_execution_func
     async def run(self) -> AFCScraperResult:
         """Scrapes AFC data from the given page."""
         page = await self.context.new_page()
-        await page.goto(
-            "https://webafiliados.afc.cl/WUI.AAP.OVIRTUAL/Default.aspx"
+        # A cached session also skips the reCAPTCHA
+        if not await self.restore_session(page, EMPRESAS_URL, EMPRESAS_TABLE_SELECTOR):
+            await self.login(page)
+            await self.store_session()
+
+        companies_data = await self.scrape_empresas(page)
+
+        contributions_data = await self.scrape_cotizaciones(self.years or default_years())
+
+        return AFCScraperResult(
+            companies_data=companies_data,
+            contributions_data=contributions_data,
+            timestamp=datetime.datetime.now().isoformat(),
+            currency="CLP"
         )
 
+    @log_execution_func
+    async def login(self, page: Page):
+        """Solves the reCAPTCHA and logs in through ClaveÚnica."""
+        await page.goto(LOGIN_URL)
+
         await self.captcha_solver.solve(page)
 
-        await page.locator("input#btnCU").click()
-        await page.wait_for_load_state('networkidle')
+        await wait_until(page, "afc.clave_unica_redirect", CLAVE_UNICA_REDIRECT_READY,
+                         action=page.locator("input#btnCU").click)
 
         login_success = await self.login_scraper.do_login(page, self.clave_unica)
 
@@ -51,181 +105,128 @@ class AFCScraper(BaseScraper):
             )
             raise ValueError("ClaveÚnica login failed during AFC scraping.")
 
-        companies_data = await self.scrape_empresas(page)
-
-        current_year = datetime.datetime.now().year
-        years_to_scrape = [str(current_year - 2), str(current_year - 3)]
-        contributions_data = await self.scrape_cotizaciones(page, years_to_scrape)
-
-        return AFCScraperResult(
-            companies_data=companies_data,
-            contributions_data=contributions_data,
-            timestamp=datetime.datetime.now().isoformat(),
-            currency="CLP"
-        )
-
     @log_execution_func
     async def scrape_empresas(self, page: Page) -> List[AFCEmpresaEntry]:
-        """Scrapes AFC empresas data."""
-        await page.goto(
-            "https://webafiliados.afc.cl/WUI.AAP.OVIRTUAL/WebAfiliados/Datos/Empresas.aspx"
-        )
-        await page.wait_for_load_state('networkidle')
-        await page.wait_for_selector(
-            "table#contentPlaceHolder_gvEmpresas", timeout=10000
-        )
+        """Scrapes AFC empresas data, over HTTP when AFC_HTTP_POSTBACK is enabled and in the page otherwise."""
+        if AFC_HTTP_POSTBACK:
+            page_html = await self._fetch(EMPRESAS_URL)
+            companies = await get_parse_executor().run(parse_empresas_page, page_html) if page_html else None
+            if companies is not None:
+                return companies
+            self._http_fallback("empresas")
+
+        await page.goto(EMPRESAS_URL, wait_until="commit")
+        await wait_until(page, "afc.empresas", EMPRESAS_READY)
 
-        companies_data: List[AFCEmpresaEntry] = []
         table_element = await page.locator(
-            "table#contentPlaceHolder_gvEmpresas"
+            EMPRESAS_TABLE_SELECTOR
         ).element_handle()
 
-        if table_element:
-            table_html = await table_element.inner_html()
-            soup = BeautifulSoup(
-                f'<table id="contentPlaceHolder_gvEmpresas">{table_html}</table>',
-                "html.parser"
-            )
-            table = soup.find("table", id="contentPlaceHolder_gvEmpresas")
-
-            if isinstance(table, Tag):
-                headers = [
-                    th.get_text(strip=True) for th in table.find_all("th")
-                ]
-                rows = []
-                for tr in table.find_all("tr"):  # Skip header row
-                    if not isinstance(tr, Tag):
-                        continue
-                    cols = [
-                        td.get_text(strip=True) for td in tr.find_all("td")
-                    ]
-                    if cols:  # Only process rows with columns
-                        row_data = {}
-                        for i, header in enumerate(headers):
-                            if i < len(cols):
-                                row_data[header] = cols[i]
-                        rows.append(row_data)
-
-                # Map generic dict to AFCEmpresaEntry
-                for row in rows:
-                    companies_data.append(AFCEmpresaEntry(
-                        employer_rut=row.get("RUT Empleador", ""),
-                        employer_name=row.get("Razón Social", ""),
-                        start_date=row.get("Fecha Inicio", ""),
-                        end_date=row.get("Fecha Término", ""),
-                        status=row.get("Estado", "")
-                    ))
-            else:
-                logger.warning(
-                    "Table not found or is not a valid HTML table element. "
-                )
-        else:
+        if not table_element:
             logger.warning(
                 "Table element not found by Playwright."
             )
-
-        return companies_data
+            return []
+        return await get_parse_executor().run(parse_empresas_table, await table_element.inner_html())
 
     @log_execution_func
-    async def scrape_cotizaciones(self, page: Page, years_to_scrape: list[str]) -> Dict[str, List[AFCCotizacionEntry]]:
-        """Scrapes AFC cotizaciones data for specified years."""
-        all_cotizaciones_data: Dict[str, List[AFCCotizacionEntry]] = {}
-
-        current_year = datetime.datetime.now().year
-        initial_url = f"https://webafiliados.afc.cl/WUI.AAP.OVIRTUAL/WebAfiliados/Certificados/CrtPagadas.aspx?periodo={current_year}"
-        await page.goto(initial_url)
-        await page.wait_for_load_state('networkidle')
-
-        # Extract data for the initially displayed period (current year and previous year)
-        initial_cotizaciones_data = await self._extract_cotizaciones_table(page, str(current_year))
-        all_cotizaciones_data[str(current_year)] = initial_cotizaciones_data
-
-        # Check if previous year's data is already included in the initial load
-        # This assumes the initial load for current_year also includes current_year-1
-        if str(current_year - 1) in years_to_scrape and str(current_year - 1) not in all_cotizaciones_data:
-            # If not explicitly extracted, assume it's part of the initial load
-            # and add it to the results if it's one of the requested years.
-            # This part might need refinement based on actual data structure.
-            pass  # Data for current_year-1 is expected to be in initial_cotizaciones_data
-
-        # Iterate through the remaining years to scrape
-        for year_to_scrape in years_to_scrape:
-            if year_to_scrape == str(current_year):
-                continue
-
-            # If the previous year is already covered by the initial load, skip it here
-            if year_to_scrape == str(current_year - 1) and str(current_year - 1) in all_cotizaciones_data:
-                continue
-
-            logger.info(f"Scraping cotizaciones for year: {year_to_scrape}")
-            await page.select_option("select#contentPlaceHolder_ddlPeriodo", value=year_to_scrape)
-
-            # Trigger the postback directly
-            logger.info("Triggering postback for cotizaciones search...")
-            await page.evaluate("__doPostBack('ctl00$contentPlaceHolder_btnBuscar','')")
-            await page.wait_for_selector(
-                "table#contentPlaceHolder_dgBusqueda", timeout=30000
-            )
-
-            cotizaciones_data_for_year = await self._extract_cotizaciones_table(page, year_to_scrape)
-            all_cotizaciones_data[year_to_scrape] = cotizaciones_data_for_year
-
-        return all_cotizaciones_data
+    async def scrape_cotizaciones(self, years_to_scrape: List[int]) -> Dict[str, List[AFCCotizacionEntry]]:
+        """Scrapes AFC cotizaciones data for the given years concurrently.
+
+        Each year is fetched over HTTP (AFC_HTTP_POSTBACK) or else in its own page of the logged-in context.
+        At most AFC_YEAR_CONCURRENCY years are in flight, so the total time follows the slowest year.
+        """
+        semaphore = asyncio.Semaphore(max(1, AFC_YEAR_CONCURRENCY))
+
+        async def scrape_year(year: int) -> List[AFCCotizacionEntry]:
+            async with semaphore:
+                if AFC_HTTP_POSTBACK:
+                    entries = await self._fetch_cotizaciones_year(year)
+                    if entries is not None:
+                        return entries
+                    self._http_fallback(f"cotizaciones {year}")
+                page = await self.context.new_page()
+                try:
+                    return await self._scrape_cotizaciones_year(page, year)
+                finally:
+                    await page.close()
+
+        results = await asyncio.gather(*(scrape_year(year) for year in years_to_scrape))
+        return {str(year): entries for year, entries in zip(years_to_scrape, results)}
+
+    async def _fetch_cotizaciones_year(self, year: int) -> Optional[List[AFCCotizacionEntry]]:
+        """Get the cotizaciones of ``year`` without rendering: load the search page and replay its postback over HTTP.
+
+        The WebForms state (__VIEWSTATE, __EVENTVALIDATION, ...) of the loaded page is posted back as is, with the
+        period and the search event. Returns None when AFC answers with anything else than the expected page.
+        """
+        url = f"{COTIZACIONES_URL}?periodo={year}"
+        page_html = await self._fetch(url)
+        if page_html is None:
+            return None
+        search_page = await get_parse_executor().run(parse_cotizaciones_page, page_html, str(year))
+        if search_page["entries"] is not None:
+            return search_page["entries"]
+        if not search_page["period_field"] or not search_page["form_fields"]:
+            return None
+
+        logger.info(f"Replaying the cotizaciones search postback for year: {year}")
+        form: Dict[str, Union[str, float, bool]] = {
+            **search_page["form_fields"], search_page["period_field"]: str(year),
+            "__EVENTTARGET": SEARCH_EVENT_TARGET, "__EVENTARGUMENT": "",
+        }
+        page_html = await self._fetch(urljoin(url, search_page["form_action"]), form)
+        if page_html is None:
+            return None
+        search_page = await get_parse_executor().run(parse_cotizaciones_page, page_html, str(year))
+        return search_page["entries"]
+
+    async def _fetch(self, url: str, form: Optional[Dict[str, Union[str, float, bool]]] = None) -> Optional[str]:
+        """GET ``url`` (or POST ``form`` to it) with the cookies of the context; None unless AFC serves the page."""
+        try:
+            if form is None:
+                response = await self.context.request.get(url, timeout=PAGE_READY_TIMEOUT)
+            else:
+                response = await self.context.request.post(url, form=form, timeout=PAGE_READY_TIMEOUT)
+        except Error as e:
+            logger.warning(f"AFC request to {url} failed: {e}")
+            return None
+        # An expired session is redirected to the landing page
+        if not response.ok or "/Default.aspx" in response.url:
+            logger.warning(f"AFC request to {url} answered HTTP {response.status} at {response.url}")
+            return None
+        return await response.text()
+
+    def _http_fallback(self, what: str):
+        metrics.counter("afc.http_fallbacks").inc()
+        logger.info(f"Falling back to page navigation for AFC {what}.")
+
+    async def _scrape_cotizaciones_year(self, page: Page, year: int) -> List[AFCCotizacionEntry]:
+        """Open the cotizaciones search on ``year``, searching again when the page lands on another period."""
+        await page.goto(f"{COTIZACIONES_URL}?periodo={year}", wait_until="commit")
+        await wait_until(page, "afc.cotizaciones", COTIZACIONES_READY)
+
+        if await page.input_value(PERIOD_SELECTOR) != str(year):
+            logger.info(f"Searching cotizaciones for year: {year}")
+            await page.select_option(PERIOD_SELECTOR, value=str(year))
+            await wait_until(page, "afc.cotizaciones_postback", POSTBACK_READY,
+                             action=lambda: page.evaluate(f"__doPostBack('{SEARCH_EVENT_TARGET}','')"))
+
+        entries: List[AFCCotizacionEntry] = await self._extract_cotizaciones_table(page, str(year))
+        return entries
 
     @log_execution_func
     async def _extract_cotizaciones_table(self, page: Page, year: str) -> List[AFCCotizacionEntry]:
         """Extract data from the cotizaciones table."""
-        await page.wait_for_selector(
-            "table#contentPlaceHolder_dgBusqueda", timeout=30000
-        )
+        await wait_until(page, "afc.cotizaciones", COTIZACIONES_READY)
 
-        cotizaciones_data: List[AFCCotizacionEntry] = []
         table_element = await page.locator(
-            "table#contentPlaceHolder_dgBusqueda"
+            COTIZACIONES_TABLE_SELECTOR
         ).element_handle()
 
-        if table_element:
-            table_html = await table_element.inner_html()
-            soup = BeautifulSoup(
-                f'<table id="contentPlaceHolder_dgBusqueda">{table_html}</table>',
-                "html.parser"
-            )
-            table = soup.find("table", id="contentPlaceHolder_dgBusqueda")
-
-            if isinstance(table, Tag):
-                headers = [
-                    th.get_text(strip=True) for th in table.find_all("th")
-                ]
-                rows = []
-                for tr in table.find_all("tr"):
-                    if not isinstance(tr, Tag):
-                        continue
-                    cols = [
-                        td.get_text(strip=True) for td in tr.find_all("td")
-                    ]
-                    if cols and len(cols) == len(headers):
-                        row_data = {}
-                        for i, header in enumerate(headers):
-                            row_data[header] = cols[i]
-                        rows.append(row_data)
-
-                for row in rows[:-1]:
-                    cotizaciones_data.append(AFCCotizacionEntry(
-                        period=row.get("Período", "").strip(),
-                        employer_rut=row.get("RUT Empleador", ""),
-                        employer_name=row.get("Razón Social", ""),
-                        taxable_income=parse_money(
-                            row.get("Renta Imponible", "0")),
-                        contributed_amount=parse_money(
-                            row.get("Monto Cotizado", "0")),
-                        payment_date=row.get("Fecha de Pago", "")
-                    ))
-            else:
-                logger.warning(
-                    f"Cotizaciones table for year {year} not found or is not a valid HTML table element. "
-                )
-        else:
+        if not table_element:
             logger.warning(
                 f"Cotizaciones table element for year {year} not found by Playwright."
             )
-        return cotizaciones_data
+            return []
+        return await get_parse_executor().run(parse_cotizaciones_table, await table_element.inner_html(), year)
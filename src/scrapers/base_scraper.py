@@ -4,13 +4,61 @@ __EMAIL__ = "contacto@luisbarra.cl"
 __VERSION__ = "1.0.0"
 
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, Optional
+
+from playwright.async_api import BrowserContext, Page, TimeoutError
+
+from src.browser.readiness import SelectorReady, wait_until
+from src.config.config import SESSION_CHECK_TIMEOUT
+from src.config.logger import get_logger
+from src.models.clave_unica import ClaveUnica
+from src.session.session_cache import SessionCache
+
+logger = get_logger(__name__)
 
 
 class BaseScraper(ABC):
     """Abstract base class for all scrapers."""
 
+    # Set by the concrete scrapers
+    context: BrowserContext
+    clave_unica: ClaveUnica
+    session_cache: Optional[SessionCache] = None
+    session_site: str = ""
+
     @abstractmethod
     async def run(self) -> Any:
         """Runs the scraper and returns the extracted data."""
         pass
+
+    async def restore_session(self, page: Page, url: str, ready_selector: str) -> bool:
+        """Load the cached session into the context and check that it is still signed in.
+
+        Navigates to ``url`` and waits for ``ready_selector``, which only appears when authenticated.
+        Returns False (and drops the cached entry) when there is no usable session.
+        """
+        if self.session_cache is None:
+            return False
+        state = await self.session_cache.load(self.clave_unica, self.session_site)
+        if not state:
+            return False
+
+        await self.context.add_cookies(state.get("cookies", []))
+        try:
+            await page.goto(url, wait_until="commit")
+            await wait_until(page, f"{self.session_site}.session_check",
+                             SelectorReady(ready_selector, timeout=SESSION_CHECK_TIMEOUT))
+        except TimeoutError:
+            # Stale cookies are left in place (the context may be shared), the login overwrites them
+            logger.info(f"Cached {self.session_site} session expired upstream. Falling back to full login.")
+            await self.session_cache.invalidate(self.clave_unica, self.session_site)
+            return False
+        logger.info(f"Reusing cached {self.session_site} session.")
+        return True
+
+    async def store_session(self):
+        """Cache the storage state of the context after a successful login."""
+        if self.session_cache is None:
+            return
+        state = await self.context.storage_state()
+        await self.session_cache.save(self.clave_unica, self.session_site, dict(state))
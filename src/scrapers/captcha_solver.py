@@ -1,33 +1,251 @@
+__AUTHOR__ = 'Luis Francisco Barra Sandoval'
+__EMAIL__ = 'contacto@luisbarra.cl'
+__VERSION__ = '1.0.0'
 
-__AUTHOR__ = "Luis Francisco Barra Sandoval"
-__EMAIL__ = "contacto@luisbarra.cl"
-__VERSION__ = "1.0.0"
-
+import asyncio
 import os
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Sequence
 
 from playwright.async_api import Page
 from playwright_recaptcha import recaptchav2
 
+from src.config.config import (
+    AFC_RECAPTCHA_SITE_KEY,
+    CAPTCHA_ATTEMPT_TIMEOUT_SECONDS,
+    CAPTCHA_HEDGE_DEFAULT_DELAY_SECONDS,
+    CAPTCHA_HEDGE_MIN_SAMPLES,
+    CAPTCHA_HEDGE_QUANTILE,
+    CAPTCHA_SOLVER,
+)
 from src.config.logger import get_logger
+from src.scrapers.captcha_token_pool import CapSolverTokenClient, RecaptchaTokenPool
+from src.utils.exceptions import CaptchaSolveError
+from src.utils.metrics import metrics
 
 logger = get_logger(__name__)
 
-class RecaptchaSolver:
-    """A class to handle reCAPTCHA solving using CapSolver."""
 
-    def __init__(self):
-        self.capsolver_api_key = os.getenv("CAPSOLVER_API_KEY")
-        if not self.capsolver_api_key:
-            logger.error(
-                "CAPSOLVER_API_KEY environment variable is not set. "
-                "It is required for reCAPTCHA solving."
-            )
-            raise ValueError(
-                "CAPSOLVER_API_KEY environment variable is not set. "
-                "It is required for reCAPTCHA solving."
-            )
+class CaptchaSolver(ABC):
+    """Abstract base class for captcha solvers."""
+
+    # Backend name used in logs and metrics
+    name: str = 'captcha'
+    # Whether the backend works the reCAPTCHA widget in the page. Two such backends must not run on one page at once
+    in_page: bool = True
+
+    @abstractmethod
+    async def solve(self, page: Page):
+        """Solves the captcha on the given page."""
+        pass
+
+
+async def inject_recaptcha_token(page: Page, token: str):
+    """Write a solved token into the page's g-recaptcha-response field(s)."""
+    await page.evaluate(
+        '(token) => document.querySelectorAll(\'[name="g-recaptcha-response"]\')'
+        '.forEach((field) => { field.value = token; })',
+        token,
+    )
+
+
+def _capsolver_api_key() -> str:
+    api_key = os.getenv('CAPSOLVER_API_KEY')
+    if not api_key:
+        logger.error('CAPSOLVER_API_KEY environment variable is not set. It is required for reCAPTCHA solving.')
+        raise ValueError('CAPSOLVER_API_KEY environment variable is not set. It is required for reCAPTCHA solving.')
+    return api_key
+
+
+class RecaptchaSolver(CaptchaSolver):
+    """A class to handle reCAPTCHA solving using CapSolver (image challenge, in the page)."""
+
+    name = 'capsolver'
 
     async def solve(self, page: Page):
         """Solves the reCAPTCHA on the given page."""
-        solver = recaptchav2.AsyncSolver(page, capsolver_api_key=self.capsolver_api_key)
+        # Read on use, so processes that never solve a captcha (e.g. CMF only) need no API key
+        solver = recaptchav2.AsyncSolver(page, capsolver_api_key=_capsolver_api_key())
         await solver.solve_recaptcha(wait=True, image_challenge=True)
+
+
+class AudioRecaptchaSolver(CaptchaSolver):
+    """Solves the reCAPTCHA audio challenge in the page with speech recognition. Needs no API key."""
+
+    name = 'audio'
+
+    async def solve(self, page: Page):
+        """Solves the reCAPTCHA on the given page."""
+        solver = recaptchav2.AsyncSolver(page)
+        await solver.solve_recaptcha(wait=True)
+
+
+class TokenRecaptchaSolver(CaptchaSolver):
+    """Gets a token from the CapSolver task API and injects it, without touching the reCAPTCHA widget.
+
+    Since it does not interact with the page until the token is ready, it is the safe hedge for an in-page backend.
+    """
+
+    name = 'token'
+    in_page = False
+
+    def __init__(self):
+        self.client: Optional[CapSolverTokenClient] = None
+
+    async def solve(self, page: Page):
+        """Solves the reCAPTCHA for the page's URL and site key."""
+        if self.client is None:
+            self.client = CapSolverTokenClient(_capsolver_api_key(), website_url='', website_key=AFC_RECAPTCHA_SITE_KEY)
+        website_key = await page.get_attribute('[data-sitekey]', 'data-sitekey') or AFC_RECAPTCHA_SITE_KEY
+        token = await self.client.solve(website_url=page.url, website_key=website_key)
+        await inject_recaptcha_token(page, token)
+
+
+class StubCaptchaSolver(CaptchaSolver):
+    """Fills the stub reCAPTCHA of the local mock upstreams. Never use it against the real portals."""
+
+    name = 'stub'
+    in_page = False
+    STUB_TOKEN = 'stub-recaptcha-token'
+
+    async def solve(self, page: Page):
+        """Write the stub token into the page's g-recaptcha-response field."""
+        await inject_recaptcha_token(page, self.STUB_TOKEN)
+
+
+class ResilientCaptchaSolver(CaptchaSolver):
+    """Runs a chain of backends with a timeout per attempt, falling back to the next one on failure.
+
+    A ready token from ``token_pool`` is used first. With hedging (``hedge_quantile`` > 0), the next backend
+    is started alongside a backend that is still running past the ``hedge_quantile`` of its recent solve
+    times; the first one to succeed wins and the other is cancelled. Only backends that leave the widget
+    alone (``in_page`` False, e.g. the token backend) are started as a hedge: an in-page backend only runs
+    once the previous one has failed or timed out and been cancelled, so two never drive the same widget.
+    Solve times are recorded per backend as ``captcha.<backend>.solve_seconds`` and overall as
+    ``captcha.solve_seconds``.
+    """
+
+    name = 'resilient'
+
+    def __init__(
+        self,
+        backends: Sequence[CaptchaSolver],
+        token_pool: Optional[RecaptchaTokenPool] = None,
+        attempt_timeout: float = CAPTCHA_ATTEMPT_TIMEOUT_SECONDS,
+        hedge_quantile: float = CAPTCHA_HEDGE_QUANTILE,
+        hedge_min_samples: int = CAPTCHA_HEDGE_MIN_SAMPLES,
+        hedge_default_delay: float = CAPTCHA_HEDGE_DEFAULT_DELAY_SECONDS,
+    ):
+        if not backends:
+            raise ValueError('At least one captcha backend is required.')
+        self.backends = list(backends)
+        self.token_pool = token_pool
+        self.attempt_timeout = attempt_timeout
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_default_delay = hedge_default_delay
+        self._solve_seconds = metrics.histogram('captcha.solve_seconds')
+        self._hedges = metrics.counter('captcha.hedges_started')
+        self._hedge_wins = metrics.counter('captcha.hedge_wins')
+
+    async def solve(self, page: Page):
+        """Solves the captcha on the given page, raising CaptchaSolveError once every backend failed."""
+        started = time.monotonic()
+        token = self.token_pool.take() if self.token_pool else None
+        if token:
+            await inject_recaptcha_token(page, token)
+            return
+
+        errors: List[str] = []
+        index = 0
+        while index < len(self.backends):
+            primary = self.backends[index]
+            hedge = self.backends[index + 1] if self.hedge_quantile > 0 and index + 1 < len(self.backends) else None
+            if hedge is not None and hedge.in_page:
+                hedge = None
+            attempted = await self._race(page, primary, hedge, errors)
+            if attempted is None:
+                self._solve_seconds.observe(time.monotonic() - started)
+                return
+            index += attempted
+        raise CaptchaSolveError(f'Every captcha backend failed: {"; ".join(errors)}')
+
+    async def _race(
+        self, page: Page, primary: CaptchaSolver, hedge: Optional[CaptchaSolver], errors: List[str]
+    ) -> Optional[int]:
+        """Run ``primary``, hedged by ``hedge`` if it runs late. None on success, else the backends tried."""
+        running = {asyncio.create_task(self._attempt(page, primary)): primary}
+        delay = self._hedge_delay(primary) if hedge else None
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(running, timeout=delay)
+                if not done and hedge is not None:
+                    logger.info(f'Captcha backend {primary.name} is past {delay:.1f}s. Hedging with {hedge.name}.')
+                    self._hedges.inc()
+                    running[asyncio.create_task(self._attempt(page, hedge))] = hedge
+            pending = set(running)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    error = finished.exception()
+                    if error is None:
+                        if running[finished] is hedge:
+                            self._hedge_wins.inc()
+                        return None
+                    errors.append(f'{running[finished].name}: {error or type(error).__name__}')
+            return len(running)
+        finally:
+            for attempt in running:
+                attempt.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+    async def _attempt(self, page: Page, backend: CaptchaSolver):
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(backend.solve(page), timeout=self.attempt_timeout)
+        except asyncio.TimeoutError:
+            metrics.counter(f'captcha.{backend.name}.timeouts').inc()
+            logger.warning(f'Captcha backend {backend.name} timed out after {self.attempt_timeout}s.')
+            raise
+        except Exception as e:
+            metrics.counter(f'captcha.{backend.name}.failures').inc()
+            logger.warning(f'Captcha backend {backend.name} failed: {e}')
+            raise
+        metrics.histogram(f'captcha.{backend.name}.solve_seconds').observe(time.monotonic() - started)
+
+    def _hedge_delay(self, backend: CaptchaSolver) -> Optional[float]:
+        """How long ``backend`` may run before the hedge starts: the configured quantile of its solve times."""
+        history = metrics.histogram(f'captcha.{backend.name}.solve_seconds')
+        if history.count < self.hedge_min_samples:
+            return self.hedge_default_delay
+        return history.quantile(self.hedge_quantile)
+
+
+BACKENDS: Dict[str, Callable[[], CaptchaSolver]] = {
+    'capsolver': RecaptchaSolver,
+    'token': TokenRecaptchaSolver,
+    'audio': AudioRecaptchaSolver,
+    'stub': StubCaptchaSolver,
+}
+
+
+def create_captcha_solver(token_pool: Optional[RecaptchaTokenPool] = None) -> CaptchaSolver:
+    """Build the solver chain listed in CAPTCHA_SOLVER (e.g. 'capsolver,token,audio'), using ``token_pool`` first."""
+    backends: List[CaptchaSolver] = []
+    for name in (name.strip() for name in CAPTCHA_SOLVER.split(',') if name.strip()):
+        if name not in BACKENDS:
+            raise ValueError(f'Unknown captcha backend: {name}')
+        backends.append(BACKENDS[name]())
+    return ResilientCaptchaSolver(backends, token_pool)
+
+
+_captcha_solver: Optional[CaptchaSolver] = None
+
+
+def get_captcha_solver() -> CaptchaSolver:
+    """Return the solver shared by every scraper of the process, built on first use."""
+    global _captcha_solver
+    if _captcha_solver is None:
+        _captcha_solver = create_captcha_solver()
+    return _captcha_solver
@@ -0,0 +1,193 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional, Set, Tuple
+
+import httpx
+
+from src.config.config import (
+    AFC_RECAPTCHA_SITE_KEY,
+    CAPSOLVER_API_URL,
+    CAPTCHA_TOKEN_POOL_SIZE,
+    CAPTCHA_TOKEN_REFILL_INTERVAL_SECONDS,
+    CAPTCHA_TOKEN_TTL_SECONDS,
+)
+from src.config.logger import get_logger
+from src.utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+# Number of upcoming tasks that will need a token
+Demand = Callable[[], Awaitable[int]]
+
+
+class CapSolverTokenClient:
+    """Solves reCAPTCHA v2 tokens for a site through the CapSolver task API, without a browser page."""
+
+    def __init__(
+        self,
+        api_key: str,
+        website_url: str,
+        website_key: str,
+        api_url: str = CAPSOLVER_API_URL,
+        poll_interval: float = 2.0,
+        timeout: float = 120.0,
+    ):
+        self.api_key = api_key
+        self.website_url = website_url
+        self.website_key = website_key
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.client = httpx.AsyncClient(base_url=api_url, timeout=httpx.Timeout(30.0))
+
+    async def solve(self, website_url: str = '', website_key: str = '') -> str:
+        """Create a solving task (for the client's site unless given) and poll it until CapSolver returns the token."""
+        created = await self._call(
+            '/createTask',
+            {
+                'task': {
+                    'type': 'ReCaptchaV2TaskProxyLess',
+                    'websiteURL': website_url or self.website_url,
+                    'websiteKey': website_key or self.website_key,
+                }
+            },
+        )
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            result = await self._call('/getTaskResult', {'taskId': created['taskId']})
+            if result.get('status') == 'ready':
+                return str(result['solution']['gRecaptchaResponse'])
+        raise TimeoutError(f'CapSolver task {created["taskId"]} not ready after {self.timeout}s')
+
+    async def _call(self, path: str, body: dict) -> dict:
+        response = await self.client.post(path, json={'clientKey': self.api_key, **body})
+        response.raise_for_status()
+        data: dict = response.json()
+        if data.get('errorId'):
+            raise RuntimeError(f'CapSolver {path} failed: {data.get("errorCode")} {data.get("errorDescription")}')
+        return data
+
+    async def close(self):
+        """Close the HTTP client."""
+        await self.client.aclose()
+
+
+class RecaptchaTokenPool:
+    """Keeps pre-solved reCAPTCHA tokens ready for the tasks about to run.
+
+    Every ``refill_interval`` seconds the pool asks ``demand`` how many upcoming tasks need a token and
+    starts solving until tokens held plus solves in flight cover it, up to ``max_size``. Tokens are handed
+    out oldest first and dropped once older than ``ttl`` seconds (counted as waste), so with no demand
+    nothing is solved and nothing is paid for.
+    """
+
+    def __init__(
+        self,
+        client: CapSolverTokenClient,
+        demand: Demand,
+        max_size: int = CAPTCHA_TOKEN_POOL_SIZE,
+        ttl: float = CAPTCHA_TOKEN_TTL_SECONDS,
+        refill_interval: float = CAPTCHA_TOKEN_REFILL_INTERVAL_SECONDS,
+    ):
+        self.client = client
+        self.demand = demand
+        self.max_size = max_size
+        self.ttl = ttl
+        self.refill_interval = refill_interval
+        # (token, solved at), oldest first
+        self._tokens: Deque[Tuple[str, float]] = deque()
+        self._solving: Set[asyncio.Task] = set()
+        self._refiller: Optional[asyncio.Task] = None
+
+        self._hits = metrics.counter('captcha.pool_hits')
+        self._misses = metrics.counter('captcha.pool_misses')
+        self._solved = metrics.counter('captcha.tokens_solved')
+        self._expired = metrics.counter('captcha.tokens_expired')
+        self._errors = metrics.counter('captcha.solve_errors')
+        self._solve_seconds = metrics.histogram('captcha.prefetch_solve_seconds')
+        self._token_age = metrics.histogram('captcha.token_age_seconds')
+        metrics.gauge('captcha.pool_size', lambda: len(self._tokens))
+        metrics.gauge('captcha.pool_hit_rate', lambda: _ratio(self._hits.value, self._hits.value + self._misses.value))
+        metrics.gauge('captcha.token_waste_rate', lambda: _ratio(self._expired.value, self._solved.value))
+
+    async def start(self):
+        """Start refilling in the background."""
+        self._refiller = asyncio.create_task(self._refill_loop())
+
+    def take(self) -> Optional[str]:
+        """Hand out the oldest token still valid, or None (a miss) if the pool has none."""
+        self._drop_expired()
+        if not self._tokens:
+            self._misses.inc()
+            return None
+        token, solved_at = self._tokens.popleft()
+        self._hits.inc()
+        self._token_age.observe(time.monotonic() - solved_at)
+        return token
+
+    async def close(self):
+        """Stop refilling, cancel the solves in flight and close the solver client."""
+        jobs = [*self._solving, *([self._refiller] if self._refiller else [])]
+        for job in jobs:
+            job.cancel()
+        await asyncio.gather(*jobs, return_exceptions=True)
+        self._tokens.clear()
+        await self.client.close()
+
+    async def _refill_loop(self):
+        while True:
+            try:
+                await self.refill()
+            except Exception as e:
+                logger.error(f'reCAPTCHA token pool refill failed: {e}')
+            await asyncio.sleep(self.refill_interval)
+
+    async def refill(self):
+        """Start the solves needed to cover the current demand."""
+        self._drop_expired()
+        wanted = min(self.max_size, await self.demand())
+        for _ in range(wanted - len(self._tokens) - len(self._solving)):
+            solving = asyncio.create_task(self._solve_one())
+            self._solving.add(solving)
+            solving.add_done_callback(self._solving.discard)
+
+    async def _solve_one(self):
+        started = time.monotonic()
+        try:
+            token = await self.client.solve()
+        except Exception as e:
+            self._errors.inc()
+            logger.warning(f'Prefetching a reCAPTCHA token failed: {e}')
+            return
+        self._solved.inc()
+        self._solve_seconds.observe(time.monotonic() - started)
+        self._tokens.append((token, time.monotonic()))
+
+    def _drop_expired(self):
+        now = time.monotonic()
+        while self._tokens and now - self._tokens[0][1] > self.ttl:
+            self._tokens.popleft()
+            self._expired.inc()
+
+
+def _ratio(part: int, total: int) -> Optional[float]:
+    return part / total if total else None
+
+
+def create_token_pool(website_url: str, demand: Demand) -> Optional[RecaptchaTokenPool]:
+    """Build the token pool for ``website_url`` configured by CAPTCHA_TOKEN_POOL_SIZE, or None if disabled."""
+    api_key = os.getenv('CAPSOLVER_API_KEY')
+    if CAPTCHA_TOKEN_POOL_SIZE <= 0:
+        return None
+    if not api_key or not AFC_RECAPTCHA_SITE_KEY:
+        logger.warning(
+            'CAPTCHA_TOKEN_POOL_SIZE is set but CAPSOLVER_API_KEY or AFC_RECAPTCHA_SITE_KEY is missing. '
+            'reCAPTCHA tokens will be solved inline.'
+        )
+        return None
+    logger.info(
+        f'reCAPTCHA token pool enabled (up to {CAPTCHA_TOKEN_POOL_SIZE} tokens, TTL {CAPTCHA_TOKEN_TTL_SECONDS}s).'
+    )
+    return RecaptchaTokenPool(CapSolverTokenClient(api_key, website_url, AFC_RECAPTCHA_SITE_KEY), demand)
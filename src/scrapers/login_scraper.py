@@ -3,6 +3,8 @@ __AUTHOR__ = "Luis Francisco Barra Sandoval"
 __EMAIL__ = "contacto@luisbarra.cl"
 __VERSION__ = "1.0.0"
 
+import asyncio
+
 from playwright.async_api import Page
 
 from src.models.clave_unica import ClaveUnica
@@ -18,3 +20,29 @@ class LoginScraper:
     async def do_login(self, page: Page, credentials: ClaveUnica) -> bool:
         """Performs the login operation using the configured strategy."""
         return await self.strategy.do_login(page, credentials)
+
+
+class SharedLoginScraper(LoginScraper):
+    """A login context shared by several scrapers running in the same BrowserContext.
+
+    Logins are serialized: the first scraper performs the full login, the others reload their login
+    page so the identity provider can sign them in with the SSO session, and only log in again when
+    the portal does not allow it.
+    """
+
+    def __init__(self, strategy: LoginStrategy):
+        super().__init__(strategy)
+        self._lock = asyncio.Lock()
+        self._authenticated = False
+
+    async def do_login(self, page: Page, credentials: ClaveUnica) -> bool:
+        """Perform the login operation unless the SSO session of an earlier login can be reused."""
+        async with self._lock:
+            if self._authenticated:
+                # The form may have been rendered before the first login completed
+                await page.reload()
+                if not await self.strategy.needs_login(page):
+                    return True
+            login_success = await self.strategy.do_login(page, credentials)
+            self._authenticated = self._authenticated or login_success
+            return login_success
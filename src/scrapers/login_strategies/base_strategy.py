@@ -17,3 +17,7 @@ class LoginStrategy(ABC):
     async def do_login(self, page: Page, credentials: ClaveUnica) -> bool:
         """Performs the login operation."""
         pass
+
+    async def needs_login(self, page: Page) -> bool:
+        """Whether the login form is shown, i.e. an existing SSO session did not sign the user in already."""
+        return True
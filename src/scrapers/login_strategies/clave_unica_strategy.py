@@ -3,9 +3,10 @@ __AUTHOR__ = "Luis Francisco Barra Sandoval"
 __EMAIL__ = "contacto@luisbarra.cl"
 __VERSION__ = "1.0.0"
 
-from playwright.async_api import Page
+from playwright.async_api import Page, TimeoutError
 
-from src.config.config import NETWORK_IDLE_TIMEOUT
+from src.browser.readiness import AnyReady, SelectorReady, UrlReady, url_host_is_not, wait_until
+from src.config.config import CLAVE_UNICA_HOST, LOGIN_RESULT_TIMEOUT, SSO_CHECK_TIMEOUT
 from src.config.logger import get_logger, log_execution_func
 from src.models.clave_unica import ClaveUnica
 from src.scrapers.login_strategies.base_strategy import LoginStrategy
@@ -13,10 +14,32 @@ from src.utils.exceptions import InvalidCredentialsError, UserAlreadyBlockedErro
 
 logger = get_logger(__name__)
 
+RUN_TEXTBOX_SELECTOR = 'role=textbox[name="Ingresa tu RUN"]'
+LOGIN_ERROR_TEXTS = (
+    "Datos de acceso no válidos",
+    "El usuario será bloqueado al siguiente intento fallido",
+    "Usuario no encontrado",
+    "Usuario Bloqueado",
+)
+
+# Submitting either redirects out of ClaveÚnica or renders one of the error messages
+LOGIN_RESULT_READY = AnyReady(
+    UrlReady(url_host_is_not(CLAVE_UNICA_HOST), timeout=LOGIN_RESULT_TIMEOUT),
+    *(SelectorReady(f"text={text}", timeout=LOGIN_RESULT_TIMEOUT) for text in LOGIN_ERROR_TEXTS),
+)
+
 
 class ClaveUnicaLoginStrategy(LoginStrategy):
     """Login strategy for Clave Unica authentication."""
 
+    async def needs_login(self, page: Page) -> bool:
+        """Whether the ClaveÚnica form is shown instead of an SSO redirect back to the portal."""
+        try:
+            await wait_until(page, "claveunica.form", SelectorReady(RUN_TEXTBOX_SELECTOR, timeout=SSO_CHECK_TIMEOUT))
+            return True
+        except TimeoutError:
+            return False
+
     @log_execution_func
     async def do_login(self, page: Page, credentials: ClaveUnica) -> bool:
         """Performs the login operation using Clave Unica credentials."""
@@ -27,11 +50,11 @@ class ClaveUnicaLoginStrategy(LoginStrategy):
             await page.get_by_role("textbox", name="Ingresa tu ClaveÚnica").fill(credentials._password)
             await page.keyboard.press("Enter")
 
-            await page.get_by_role("button", name="INGRESA").click()
-            await page.wait_for_load_state('networkidle', timeout=NETWORK_IDLE_TIMEOUT)
+            await wait_until(page, "claveunica.submit", LOGIN_RESULT_READY,
+                             action=page.get_by_role("button", name="INGRESA").click)
 
             invalid_credentials_selector = page.locator(
-                "text=Datos de acceso no válidos")
+                f"text={LOGIN_ERROR_TEXTS[0]}")
             if await invalid_credentials_selector.is_visible():
                 logger.warning("Login failed: Invalid credentials provided.")
                 raise InvalidCredentialsError(
@@ -0,0 +1,47 @@
+import asyncio
+from datetime import datetime
+from typing import Any, Dict
+
+from src.config.logger import get_logger, log_execution_func
+from src.scrapers.base_scraper import BaseScraper
+from src.utils.exceptions import ScraperError
+
+logger = get_logger(__name__)
+
+
+class MultiScraper(BaseScraper):
+    """Runs several scrapers concurrently, each in its own page of one shared BrowserContext.
+
+    The scrapers are expected to share a ``SharedLoginScraper`` so that ClaveÚnica is only logged
+    into once. Sources that fail are reported in ``errors``; the run only fails when all of them do.
+    """
+
+    def __init__(self, scrapers: Dict[str, BaseScraper]):
+        if not scrapers:
+            raise ValueError('MultiScraper needs at least one scraper.')
+        self.scrapers = scrapers
+
+    @log_execution_func
+    async def run(self) -> Dict[str, Any]:
+        """Run every scraper and merge their results by source."""
+        results = await asyncio.gather(*(scraper.run() for scraper in self.scrapers.values()), return_exceptions=True)
+
+        data: Dict[str, Any] = {}
+        errors: Dict[str, str] = {}
+        for source, result in zip(self.scrapers, results):
+            if isinstance(result, BaseException):
+                if not isinstance(result, Exception):
+                    raise result
+                logger.error(f'Source {source} failed: {result}')
+                errors[source] = str(result)
+            else:
+                data[source] = result
+
+        if not data:
+            raise ScraperError(f'All sources failed: {errors}')
+
+        return {
+            'data': data,
+            'errors': errors,
+            'timestamp': datetime.now().isoformat(),
+        }
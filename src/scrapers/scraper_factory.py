@@ -0,0 +1,76 @@
+from typing import Dict, List, Optional
+
+from playwright.async_api import BrowserContext
+
+from src.models.clave_unica import ClaveUnica
+from src.scrapers.AFC_scraper import AFCScraper
+from src.scrapers.base_scraper import BaseScraper
+from src.scrapers.captcha_solver import CaptchaSolver, get_captcha_solver
+from src.scrapers.CMF_scraper import CMFScraper
+from src.scrapers.login_scraper import LoginScraper, SharedLoginScraper
+from src.scrapers.login_strategies.clave_unica_strategy import ClaveUnicaLoginStrategy
+from src.scrapers.multi_scraper import MultiScraper
+from src.scrapers.SII_scraper import SIIScraper
+from src.session.session_cache import SessionCache
+
+SOURCE_TYPES = ('cmf', 'afc', 'sii')
+MULTI_SCRAPER_TYPE = 'all'
+
+
+def scrapes_source(scraper_type: str, sources: Optional[List[str]], source: str) -> bool:
+    """Whether a task of ``scraper_type`` (with the 'all' type's ``sources``) scrapes ``source``."""
+    if scraper_type == MULTI_SCRAPER_TYPE:
+        return source in (sources or SOURCE_TYPES)
+    return scraper_type == source
+
+
+def build_scraper(
+    scraper_type: str,
+    context: BrowserContext,
+    clave_unica: ClaveUnica,
+    login_scraper: Optional[LoginScraper] = None,
+    session_cache: Optional[SessionCache] = None,
+    sources: Optional[List[str]] = None,
+    years: Optional[List[int]] = None,
+    captcha_solver: Optional[CaptchaSolver] = None,
+) -> BaseScraper:
+    """Build the scraper for a scraper type.
+
+    The 'all' type runs ``sources`` (every source by default) concurrently in the same context,
+    sharing a single ClaveÚnica login. ``years`` selects the AFC cotizaciones years. Scrapers share
+    ``captcha_solver`` (the process-wide solver by default, only resolved for the sources that solve captchas).
+    """
+    if scraper_type == MULTI_SCRAPER_TYPE:
+        shared_login = SharedLoginScraper(ClaveUnicaLoginStrategy())
+        scrapers: Dict[str, BaseScraper] = {}
+        for source in dict.fromkeys(sources or SOURCE_TYPES):
+            if source == MULTI_SCRAPER_TYPE:
+                raise ValueError("The 'all' scraper cannot include itself.")
+            scrapers[source] = build_scraper(
+                source, context, clave_unica, shared_login, session_cache, years=years, captcha_solver=captcha_solver
+            )
+        return MultiScraper(scrapers)
+
+    login_scraper = login_scraper or LoginScraper(ClaveUnicaLoginStrategy())
+    if scraper_type == 'cmf':
+        return CMFScraper(
+            context=context, login_scraper=login_scraper, clave_unica=clave_unica, session_cache=session_cache
+        )
+    if scraper_type == 'afc':
+        return AFCScraper(
+            context=context,
+            login_scraper=login_scraper,
+            clave_unica=clave_unica,
+            captcha_solver=captcha_solver or get_captcha_solver(),
+            session_cache=session_cache,
+            years=years,
+        )
+    if scraper_type == 'sii':
+        return SIIScraper(
+            context=context,
+            login_scraper=login_scraper,
+            clave_unica=clave_unica,
+            captcha_solver=captcha_solver or get_captcha_solver(),
+            session_cache=session_cache,
+        )
+    raise ValueError(f'Unknown scraper type: {scraper_type}')
@@ -0,0 +1,175 @@
+import asyncio
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from src.config.config import (
+    SESSION_CACHE_BACKEND,
+    SESSION_CACHE_DIR,
+    SESSION_CACHE_SECRET,
+    SESSION_CACHE_TTL_SECONDS,
+)
+from src.config.logger import get_logger
+from src.models.clave_unica import ClaveUnica
+from src.queue.redis_client import get_async_redis
+from src.utils.crypto import credential_digest, derive_fernet_key
+
+logger = get_logger(__name__)
+
+
+class SessionStore(ABC):
+    """Abstract storage for encrypted session blobs."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        """Return the blob stored under ``key``, or None."""
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: int):
+        """Store ``value`` under ``key`` for ``ttl`` seconds."""
+        pass
+
+    @abstractmethod
+    async def delete(self, key: str):
+        """Remove the blob stored under ``key``."""
+        pass
+
+
+class RedisSessionStore(SessionStore):
+    """Stores session blobs in Redis with a native expiry."""
+
+    def __init__(self, prefix: str = 'session:'):
+        # Fernet tokens are ASCII, so the shared pool's decoded responses round-trip
+        self.redis_client = get_async_redis()
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Return the blob stored under ``key``, or None."""
+        value = await self.redis_client.get(self.prefix + key)
+        return value.encode('utf-8') if isinstance(value, str) else value
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        """Store ``value`` under ``key`` for ``ttl`` seconds."""
+        await self.redis_client.setex(self.prefix + key, ttl, value)
+
+    async def delete(self, key: str):
+        """Remove the blob stored under ``key``."""
+        await self.redis_client.delete(self.prefix + key)
+
+
+class DiskSessionStore(SessionStore):
+    """Stores session blobs as files in a local directory; expiry is checked on read."""
+
+    def __init__(self, directory: str = SESSION_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.session')
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Return the blob stored under ``key``, or None if missing or expired."""
+        return await asyncio.to_thread(self._read, key)
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        """Store ``value`` under ``key`` for ``ttl`` seconds."""
+        await asyncio.to_thread(self._write, key, value, ttl)
+
+    async def delete(self, key: str):
+        """Remove the blob stored under ``key``."""
+        try:
+            await asyncio.to_thread(os.remove, self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires_at, _, value = f.read().partition(b'\n')
+        except FileNotFoundError:
+            return None
+        if float(expires_at) < time.time():
+            os.remove(self._path(key))
+            return None
+        return value
+
+    def _write(self, key: str, value: bytes, ttl: int):
+        tmp_path = self._path(key) + '.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(f'{time.time() + ttl}\n'.encode('utf-8') + value)
+        os.replace(tmp_path, self._path(key))
+
+
+class SessionCache:
+    """Caches authenticated browser sessions (Playwright ``storage_state``) per user and site.
+
+    Entries are keyed and encrypted with keys derived from the server secret and the user's
+    credentials, so a session can only be found and decrypted by a caller who knows the password it
+    was created with. The TTL must stay shorter than the upstream session lifetime.
+    """
+
+    def __init__(self, store: SessionStore, secret: str, ttl: int = SESSION_CACHE_TTL_SECONDS):
+        if not secret:
+            raise ValueError('SESSION_CACHE_SECRET must be set to use the session cache.')
+        self.store = store
+        self.secret = secret
+        self.ttl = ttl
+
+    def _key(self, clave_unica: ClaveUnica, site: str) -> str:
+        return credential_digest(self.secret, site, clave_unica.rut, clave_unica._password)
+
+    def _fernet(self, clave_unica: ClaveUnica, site: str) -> Fernet:
+        return Fernet(derive_fernet_key(self.secret, site, clave_unica.rut, clave_unica._password))
+
+    async def load(self, clave_unica: ClaveUnica, site: str) -> Optional[Dict[str, Any]]:
+        """Return the cached storage state for a user on a site, or None."""
+        try:
+            token = await self.store.get(self._key(clave_unica, site))
+            if token is None:
+                return None
+            state: Dict[str, Any] = json.loads(self._fernet(clave_unica, site).decrypt(token, ttl=self.ttl))
+        except InvalidToken:
+            logger.warning(f'Discarding unreadable or expired cached session for {site}.')
+            await self.invalidate(clave_unica, site)
+            return None
+        except Exception as e:
+            logger.warning(f'Could not load cached session for {site}: {e}')
+            return None
+        return state
+
+    async def save(self, clave_unica: ClaveUnica, site: str, storage_state: Dict[str, Any]):
+        """Encrypt and store the storage state of a freshly authenticated context."""
+        try:
+            token = self._fernet(clave_unica, site).encrypt(json.dumps(storage_state).encode('utf-8'))
+            await self.store.set(self._key(clave_unica, site), token, self.ttl)
+        except Exception as e:
+            logger.warning(f'Could not cache session for {site}: {e}')
+
+    async def invalidate(self, clave_unica: ClaveUnica, site: str):
+        """Drop the cached session for a user on a site."""
+        try:
+            await self.store.delete(self._key(clave_unica, site))
+        except Exception as e:
+            logger.warning(f'Could not invalidate cached session for {site}: {e}')
+
+
+def create_session_cache() -> Optional[SessionCache]:
+    """Build the session cache configured by SESSION_CACHE_BACKEND ('redis' or 'disk'), or None if disabled."""
+    backend = SESSION_CACHE_BACKEND.lower()
+    if not backend:
+        return None
+    store: SessionStore
+    if backend == 'redis':
+        store = RedisSessionStore()
+    elif backend == 'disk':
+        store = DiskSessionStore()
+    else:
+        raise ValueError(f'Unknown SESSION_CACHE_BACKEND: {SESSION_CACHE_BACKEND}')
+    logger.info(f'Session cache enabled ({backend}, TTL {SESSION_CACHE_TTL_SECONDS}s).')
+    return SessionCache(store, SESSION_CACHE_SECRET)
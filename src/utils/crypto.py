@@ -0,0 +1,21 @@
+import base64
+import hashlib
+import hmac
+
+
+def credential_digest(secret: str, *parts: str) -> str:
+    """Return a keyed, non-reversible digest of credentials, usable as a storage key.
+
+    The password should be one of the parts so that an entry can only be found by someone
+    who knows the credentials it was created with.
+    """
+    message = '\x00'.join(parts).encode('utf-8')
+    return hmac.new(secret.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+
+def derive_fernet_key(secret: str, *parts: str) -> bytes:
+    """Derive a Fernet key bound to the given credentials from a server-side secret."""
+    digest = hmac.new(
+        secret.encode('utf-8'), b'fernet\x00' + '\x00'.join(parts).encode('utf-8'), hashlib.sha256
+    ).digest()
+    return base64.urlsafe_b64encode(digest)
@@ -13,6 +13,11 @@ class ScraperDataExtractionError(ScraperError):
 
     pass
 
+class CaptchaSolveError(ScraperError):
+    """Exception raised when no captcha backend could solve the captcha."""
+
+    pass
+
 class SelectorNotFoundError(ScraperDataExtractionError):
     """Exception raised when a required selector is not found on the page."""
 
@@ -0,0 +1,122 @@
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Sequence
+
+DEFAULT_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Counter:
+    """A monotonically increasing counter."""
+
+    def __init__(self) -> None:
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        """Increase the counter by ``amount``."""
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> int:
+        """Current value of the counter."""
+        return self._value
+
+
+class Histogram:
+    """A cumulative bucket histogram that also keeps a window of recent samples for quantiles."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS, window: int = 1024):
+        self.buckets = tuple(sorted(buckets))
+        self._bucket_counts = [0] * len(self.buckets)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._recent: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Record a sample."""
+        with self._lock:
+            self._count += 1
+            self._sum += value
+            self._max = max(self._max, value)
+            self._recent.append(value)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._bucket_counts[i] += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Return the ``q`` quantile (0..1) of the recent samples, or None without samples."""
+        with self._lock:
+            samples = sorted(self._recent)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(q * len(samples)))
+        return samples[index]
+
+    @property
+    def count(self) -> int:
+        """Number of recorded samples."""
+        return self._count
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the histogram as a plain dict."""
+        with self._lock:
+            buckets = {str(bound): count for bound, count in zip(self.buckets, self._bucket_counts)}
+            buckets['+Inf'] = self._count
+            count, total, maximum = self._count, self._sum, self._max
+        return {
+            'count': count,
+            'sum': round(total, 4),
+            'max': round(maximum, 4),
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': buckets,
+        }
+
+
+class MetricsRegistry:
+    """Process-wide registry of named counters, histograms and gauges."""
+
+    def __init__(self) -> None:
+        self._counters: Dict[str, Counter] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._gauges: Dict[str, Callable[[], Any]] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str) -> Counter:
+        """Return the counter registered under ``name``, creating it if needed."""
+        with self._lock:
+            return self._counters.setdefault(name, Counter())
+
+    def histogram(self, name: str, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        """Return the histogram registered under ``name``, creating it if needed."""
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram(buckets)
+            return self._histograms[name]
+
+    def gauge(self, name: str, read: Callable[[], Any]):
+        """Register a callable read every time a snapshot is taken."""
+        with self._lock:
+            self._gauges[name] = read
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return every metric as a plain, JSON-serializable dict."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = dict(self._histograms)
+            gauges = dict(self._gauges)
+        snapshot: Dict[str, Any] = {name: counter.value for name, counter in counters.items()}
+        snapshot.update({name: histogram.snapshot() for name, histogram in histograms.items()})
+        for name, read in gauges.items():
+            try:
+                snapshot[name] = read()
+            except Exception as e:
+                snapshot[name] = f'error: {e}'
+        return snapshot
+
+
+metrics = MetricsRegistry()
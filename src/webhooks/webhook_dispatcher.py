@@ -0,0 +1,144 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from src.config.config import (
+    WEBHOOK_CONCURRENCY,
+    WEBHOOK_DRAIN_SECONDS,
+    WEBHOOK_MAX_ATTEMPTS,
+    WEBHOOK_MAX_CONNECTIONS_PER_HOST,
+    WEBHOOK_OUTBOX_SIZE,
+    WEBHOOK_TIMEOUT_SECONDS,
+)
+from src.config.logger import get_logger
+from src.queue.retry_policy import RetryPolicy
+from src.utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+# (url, payload, attempt number)
+Delivery = Tuple[str, Dict[str, Any], int]
+
+
+class WebhookDispatcher:
+    """Delivers webhook notifications in the background through a shared, pooled HTTP client.
+
+    Notifications are put in a bounded in-memory outbox and sent by ``concurrency`` sender coroutines,
+    with at most ``max_connections_per_host`` requests in flight per receiver. Failed deliveries
+    (network errors, timeouts, 429 and 5xx responses) are retried with backoff up to ``max_attempts``.
+    The outbox is drained on ``close``; notifications still queued when the process dies are lost.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = WEBHOOK_CONCURRENCY,
+        outbox_size: int = WEBHOOK_OUTBOX_SIZE,
+        timeout: float = WEBHOOK_TIMEOUT_SECONDS,
+        max_attempts: int = WEBHOOK_MAX_ATTEMPTS,
+        max_connections_per_host: int = WEBHOOK_MAX_CONNECTIONS_PER_HOST,
+        retry_policy: Optional[RetryPolicy] = None,
+    ):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.max_connections_per_host = max_connections_per_host
+        self.retry_policy = retry_policy or RetryPolicy(base_delay=1.0, max_delay=30.0)
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+        self._outbox: asyncio.Queue[Delivery] = asyncio.Queue(maxsize=outbox_size)
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self._senders: Set[asyncio.Task] = set()
+        self._retries: Set[asyncio.Task] = set()
+
+        self._delivered = metrics.counter('webhook.delivered')
+        self._failed = metrics.counter('webhook.failed')
+        self._retried = metrics.counter('webhook.retried')
+        self._latency = metrics.histogram('webhook.latency_seconds')
+        metrics.gauge('webhook.outbox_depth', self._outbox.qsize)
+
+    async def start(self):
+        """Start the sender coroutines."""
+        for _ in range(self.concurrency):
+            self._senders.add(asyncio.create_task(self._sender()))
+
+    async def submit(self, url: str, payload: Dict[str, Any]):
+        """Queue a notification for delivery, waiting for room if the outbox is full."""
+        await self._outbox.put((url, payload, 1))
+
+    async def close(self, drain_timeout: float = WEBHOOK_DRAIN_SECONDS):
+        """Wait up to ``drain_timeout`` seconds for queued notifications, then stop the senders."""
+        try:
+            await asyncio.wait_for(self._outbox.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f'{self._outbox.qsize()} webhook notification(s) still queued at shutdown were dropped.')
+        if self._retries:
+            logger.warning(f'{len(self._retries)} webhook retry(ies) pending at shutdown were dropped.')
+        for task in self._senders | self._retries:
+            task.cancel()
+        await asyncio.gather(*self._senders, *self._retries, return_exceptions=True)
+        await self.client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return delivery counters, latency and outbox depth."""
+        return {
+            'outbox_depth': self._outbox.qsize(),
+            'pending_retries': len(self._retries),
+            'delivered': self._delivered.value,
+            'failed': self._failed.value,
+            'retried': self._retried.value,
+            'latency_seconds': self._latency.snapshot(),
+        }
+
+    async def _sender(self):
+        while True:
+            url, payload, attempt = await self._outbox.get()
+            try:
+                await self._deliver(url, payload, attempt)
+            except Exception as e:
+                logger.error(f'Unexpected error delivering webhook to {url}: {e}', exc_info=True)
+            finally:
+                self._outbox.task_done()
+
+    async def _deliver(self, url: str, payload: Dict[str, Any], attempt: int):
+        host = urlsplit(url).netloc
+        slot = self._host_slots.setdefault(host, asyncio.Semaphore(self.max_connections_per_host))
+        error: Optional[str] = None
+        started = time.perf_counter()
+        try:
+            async with slot:
+                response = await self.client.post(url, json=payload)
+            if response.status_code == 429 or response.status_code >= 500:
+                error = f'HTTP {response.status_code}'
+            elif response.status_code >= 400:
+                # Client errors will not fix themselves, do not retry
+                self._failed.inc()
+                logger.error(f'Webhook {url} rejected notification with HTTP {response.status_code}.')
+                return
+        except httpx.HTTPError as e:
+            error = f'{type(e).__name__}: {e}'
+        finally:
+            self._latency.observe(time.perf_counter() - started)
+
+        if error is None:
+            self._delivered.inc()
+            return
+
+        if attempt >= self.max_attempts:
+            self._failed.inc()
+            logger.error(f'Webhook delivery to {url} failed after {attempt} attempts: {error}')
+            return
+
+        delay = self.retry_policy.delay_for(attempt)
+        self._retried.inc()
+        logger.warning(f'Webhook delivery to {url} failed ({error}). Retrying in {delay:.1f}s.')
+        retry = asyncio.create_task(self._retry_later(url, payload, attempt + 1, delay))
+        self._retries.add(retry)
+        retry.add_done_callback(self._retries.discard)
+
+    async def _retry_later(self, url: str, payload: Dict[str, Any], attempt: int, delay: float):
+        await asyncio.sleep(delay)
+        await self._outbox.put((url, payload, attempt))
@@ -1,101 +1,290 @@
 import asyncio
 import logging
+import os
+import signal
+import socket
+from typing import Optional, Set
 
-import requests
 from playwright.async_api import async_playwright
 
+from src.browser.browser_pool import BrowserPool
+from src.browser.readiness import start_wait_report
+from src.browser.request_filter import RequestFilter
+from src.cache.result_cache import ResultCache, create_result_cache
 from src.models.clave_unica import ClaveUnica
+from src.parsers.parse_executor import shutdown_parse_executor
 from src.queue.queue_manager import QueueManager
-from src.scrapers.AFC_scraper import AFCScraper
-from src.scrapers.base_scraper import BaseScraper
-from src.scrapers.captcha_solver import RecaptchaSolver
-from src.scrapers.CMF_scraper import CMFScraper
-from src.scrapers.SII_scraper import SIIScraper
+from src.queue.redis_client import close_async_redis
+from src.queue.retry_policy import get_retry_policy
+from src.scrapers.AFC_scraper import LOGIN_URL as AFC_LOGIN_URL
+from src.scrapers.captcha_solver import CaptchaSolver, create_captcha_solver
+from src.scrapers.captcha_token_pool import create_token_pool
+from src.scrapers.scraper_factory import MULTI_SCRAPER_TYPE, build_scraper, scrapes_source
+from src.session.session_cache import SessionCache, create_session_cache
 from src.config.config import (
+    CAPTCHA_TOKEN_LOOKAHEAD,
     RATE_LIMIT_SECONDS_HEALTH,
     RATE_LIMIT_SECONDS_SCRAPE,
     RATE_LIMIT_TIMES_HEALTH,
     RATE_LIMIT_TIMES_SCRAPE,
+    QUEUE_BLOCK_TIMEOUT_SECONDS,
+    QUEUE_LEASE_RENEW_SECONDS,
+    QUEUE_PROMOTER_INTERVAL_SECONDS,
+    QUEUE_REAPER_INTERVAL_SECONDS,
+    REQUEST_FILTER_ENABLED,
+    WORKER_CONCURRENCY,
+    WORKER_METRICS_INTERVAL_SECONDS,
+    WORKER_SHUTDOWN_GRACE_SECONDS,
 )
-from src.scrapers.login_scraper import LoginScraper
-from src.scrapers.login_strategies.clave_unica_strategy import ClaveUnicaLoginStrategy
+from src.utils.metrics import metrics
+from src.webhooks.webhook_dispatcher import WebhookDispatcher
 
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
 
-async def process_task(task, queue_manager: QueueManager):
-    """Processes a single task from the queue."""
+async def process_task(task, queue_manager: QueueManager, browser_pool: BrowserPool,
+                       webhook_dispatcher: WebhookDispatcher, session_cache: Optional[SessionCache] = None,
+                       captcha_solver: Optional[CaptchaSolver] = None, result_cache: Optional[ResultCache] = None):
+    """Processes a single task from the queue.
+
+    With a result cache, a fresh cached result (or the run of an identical task in flight) is sent instead
+    of scraping again. Queue calls run in a thread so they do not stall the other tasks in flight.
+    """
     logging.info(
         f"Processing task: {task.task_id} (Attempt: {task.retries + 1}/{task.max_retries})")
+    # Collects the readiness waits of every scraper step run for this task
+    wait_report = start_wait_report()
     try:
         clave_unica = ClaveUnica(
             rut=task.username,
             password=task.password
         )
 
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context()
-            login_scraper = LoginScraper(ClaveUnicaLoginStrategy())
-            scraper: BaseScraper
-            data = None
-            if task.scraper_type == 'cmf':
-                scraper = CMFScraper(
-                    context=context, login_scraper=login_scraper, clave_unica=clave_unica)
-                data = await scraper.run()
-            elif task.scraper_type == 'afc':
-                scraper = AFCScraper(
-                    context=context, login_scraper=login_scraper,
-                    clave_unica=clave_unica, captcha_solver=RecaptchaSolver()
-                )
-                data = await scraper.run()
-            elif task.scraper_type == 'sii':
-                scraper = SIIScraper(
-                    context=context, login_scraper=login_scraper,
-                    clave_unica=clave_unica, captcha_solver=RecaptchaSolver()
-                )
-                data = await scraper.run()
-            else:
-                raise ValueError(f"Unknown scraper type: {task.scraper_type}")
-
-            await browser.close()
-
-            result = {"status": "success",
-                      "task_id": task.task_id, "data": data}
-            logging.info(
-                f"Task {task.task_id} completed. Sending to webhook: {task.webhook_url}")
-            requests.post(task.webhook_url, json=result)
+        request_filter = RequestFilter()
+
+        async def scrape():
+            async with browser_pool.context() as context:
+                if REQUEST_FILTER_ENABLED:
+                    await request_filter.attach(context)
+                scraper = build_scraper(task.scraper_type, context, clave_unica,
+                                        session_cache=session_cache, sources=task.sources, years=task.years,
+                                        captcha_solver=captcha_solver)
+                return await scraper.run()
+
+        if result_cache is not None:
+            data = await result_cache.get_or_run(clave_unica, scrape, task.scraper_type,
+                                                 sources=task.sources, years=task.years)
+        else:
+            data = await scrape()
+
+        result = {"status": "success",
+                  "task_id": task.task_id, "data": data}
+        logging.info(
+            f"Task {task.task_id} completed. Network: {request_filter.stats()}. "
+            f"Readiness waits: {wait_report.summary()}. Sending to webhook: {task.webhook_url}")
+        await webhook_dispatcher.submit(task.webhook_url, result)
+        await asyncio.to_thread(queue_manager.ack, task)
     except Exception as e:
-        logging.error(f"Task {task.task_id} failed: {e}")
+        logging.error(f"Task {task.task_id} failed: {e}. Readiness waits: {wait_report.summary()}")
         task.retries += 1
         if task.retries < task.max_retries:
             logging.warning(
                 f"Retrying task {task.task_id}. Retries left: {task.max_retries - task.retries}")
-            # Exponential backoff: 2, 4, 8 seconds delay
-            retry_delay = 2 ** task.retries
-            await asyncio.sleep(retry_delay)
-            queue_manager.enqueue(task)  # Re-enqueue for retry
+            # Parked in the scheduled-retry set, the worker moves on to the next task right away
+            retry_delay = get_retry_policy(task.scraper_type).delay_for(task.retries)
+            await asyncio.to_thread(queue_manager.schedule_retry, task, retry_delay)
+            logging.info(f"Task {task.task_id} scheduled for retry in {retry_delay:.1f}s.")
         else:
             logging.error(
                 f"Task {task.task_id} failed after {task.max_retries} retries. Moving to DLQ.")
             error_result = {"status": "failed", "task_id": task.task_id, "detail": str(e),
                             "retries_attempted": task.retries}
             # Notify webhook of final failure
-            requests.post(task.webhook_url, json=error_result)
-            queue_manager.enqueue_dlq(task)  # Move to Dead Letter Queue
+            await webhook_dispatcher.submit(task.webhook_url, error_result)
+            await asyncio.to_thread(queue_manager.enqueue_dlq, task)  # Move to Dead Letter Queue
+
+
+async def renew_lease(task, queue_manager: QueueManager):
+    """Keep extending the lease of a running task so the reaper does not hand it to another worker."""
+    while True:
+        await asyncio.sleep(QUEUE_LEASE_RENEW_SECONDS)
+        try:
+            if not await asyncio.to_thread(queue_manager.extend_lease, task):
+                logging.warning(f"Task {task.task_id} lost its lease; it may be run again by another worker.")
+                return
+        except Exception as e:
+            logging.error(f"Could not extend the lease of task {task.task_id}: {e}")
+
+
+async def run_task(task, queue_manager: QueueManager, browser_pool: BrowserPool,
+                   webhook_dispatcher: WebhookDispatcher, session_cache: Optional[SessionCache],
+                   captcha_solver: Optional[CaptchaSolver] = None, result_cache: Optional[ResultCache] = None):
+    """Run a task, handing it back to the queue if the worker shuts down before it finishes.
+
+    The task's lease is renewed while it runs, so slow scrapes outlasting the visibility timeout are not
+    requeued and run twice.
+    """
+    heartbeat = asyncio.create_task(renew_lease(task, queue_manager))
+    try:
+        await process_task(task, queue_manager, browser_pool, webhook_dispatcher, session_cache, captcha_solver,
+                           result_cache)
+    except asyncio.CancelledError:
+        logging.warning(f"Task {task.task_id} cancelled by shutdown. Re-enqueueing.")
+        # Shielded, so a second cancellation cannot drop the task before it is back in its lane
+        await asyncio.shield(asyncio.to_thread(queue_manager.nack, task))
+        raise
+    finally:
+        heartbeat.cancel()
+
+
+async def acquire_slot(slots: asyncio.Semaphore, stop_event: asyncio.Event) -> bool:
+    """Wait for a free execution slot. Returns False if shutdown was requested first."""
+    acquire = asyncio.create_task(slots.acquire())
+    stop = asyncio.create_task(stop_event.wait())
+    await asyncio.wait({acquire, stop}, return_when=asyncio.FIRST_COMPLETED)
+    stop.cancel()
+    if not acquire.done():
+        acquire.cancel()
+        return False
+    if stop_event.is_set():
+        slots.release()
+        return False
+    return True
+
+
+async def reap_expired_leases(queue_manager: QueueManager):
+    """Periodically requeue tasks whose visibility timeout expired (e.g. their worker crashed)."""
+    while True:
+        await asyncio.sleep(QUEUE_REAPER_INTERVAL_SECONDS)
+        try:
+            requeued = await asyncio.to_thread(queue_manager.reap_expired)
+            if requeued:
+                logging.warning(f"Requeued {requeued} task(s) with an expired visibility timeout.")
+        except Exception as e:
+            logging.error(f"Lease reaper failed: {e}")
+
+
+async def promote_scheduled_retries(queue_manager: QueueManager):
+    """Periodically move scheduled retries that are due back to the main queue."""
+    while True:
+        await asyncio.sleep(QUEUE_PROMOTER_INTERVAL_SECONDS)
+        try:
+            await asyncio.to_thread(queue_manager.promote_due)
+        except Exception as e:
+            logging.error(f"Retry promoter failed: {e}")
+
+
+async def report_metrics(browser_pool: BrowserPool, queue_manager: QueueManager):
+    """Periodically log the worker metrics and the depth and oldest task age of every queue lane."""
+    while True:
+        await asyncio.sleep(WORKER_METRICS_INTERVAL_SECONDS)
+        logging.info(f"Browser pool: {browser_pool.stats()}")
+        try:
+            logging.info(f"Queue lanes: {await asyncio.to_thread(queue_manager.lane_stats)}")
+        except Exception as e:
+            logging.error(f"Could not read the queue lanes: {e}")
+        logging.info(f"Metrics: {metrics.snapshot()}")
+
+
+def afc_token_demand(queue_manager: QueueManager):
+    """Count the queued tasks scraping AFC, which will need a reCAPTCHA token, up to CAPTCHA_TOKEN_LOOKAHEAD.
+
+    Only the afc and all lanes are looked at, so a backlog of CMF or SII tasks does not hide them.
+    """
+    async def demand() -> int:
+        upcoming = await asyncio.to_thread(queue_manager.peek, CAPTCHA_TOKEN_LOOKAHEAD, ('afc', MULTI_SCRAPER_TYPE))
+        return sum(1 for task in upcoming if scrapes_source(task.scraper_type, task.sources, 'afc'))
+    return demand
+
+
+async def shutdown(in_flight: Set[asyncio.Task]):
+    """Let in-flight tasks finish within the grace period, then cancel the rest."""
+    if not in_flight:
+        return
+    logging.info(
+        f"Waiting up to {WORKER_SHUTDOWN_GRACE_SECONDS}s for {len(in_flight)} in-flight task(s)...")
+    _, pending = await asyncio.wait(in_flight, timeout=WORKER_SHUTDOWN_GRACE_SECONDS)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
 
 
 async def main():
-    """Main function for the worker that continuously processes tasks from the queue."""
+    """Main function for the worker that continuously processes tasks from the queue.
+
+    Up to WORKER_CONCURRENCY tasks run at the same time; no task is dequeued until a slot is free.
+    """
     queue_manager = QueueManager()
-    logging.info("Worker started. Listening for tasks...")
-    while True:
-        task = queue_manager.dequeue()
-        if task:
-            await process_task(task, queue_manager)
-        # Wait for 1 second before checking the queue again
-        await asyncio.sleep(1)
+    session_cache = create_session_cache()
+    result_cache = create_result_cache()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    queue_manager.register_worker(worker_id)
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            # Signal handlers are not available on Windows event loops
+            pass
+
+    slots = asyncio.Semaphore(WORKER_CONCURRENCY)
+    in_flight: Set[asyncio.Task] = set()
+
+    def on_task_done(task: asyncio.Task):
+        in_flight.discard(task)
+        slots.release()
+
+    async with async_playwright() as p:
+        browser_pool = BrowserPool(p)
+        await browser_pool.start()
+        logging.info(
+            f"Worker {worker_id} started with concurrency {WORKER_CONCURRENCY}. "
+            f"Listening for tasks on lanes {queue_manager.scheduler.order()}... "
+            f"Browser pool: {browser_pool.stats()}")
+        webhook_dispatcher = WebhookDispatcher()
+        await webhook_dispatcher.start()
+        token_pool = create_token_pool(AFC_LOGIN_URL, afc_token_demand(queue_manager))
+        if token_pool:
+            await token_pool.start()
+        # One solver for every task, so hedging learns from the solve times of all of them
+        captcha_solver = create_captcha_solver(token_pool)
+        background = [
+            asyncio.create_task(reap_expired_leases(queue_manager)),
+            asyncio.create_task(promote_scheduled_retries(queue_manager)),
+            asyncio.create_task(report_metrics(browser_pool, queue_manager)),
+        ]
+        try:
+            while await acquire_slot(slots, stop_event):
+                # Blocks in a thread so running tasks keep the event loop
+                task = await asyncio.to_thread(
+                    queue_manager.dequeue_blocking, worker_id, QUEUE_BLOCK_TIMEOUT_SECONDS)
+                if not task:
+                    slots.release()
+                    continue
+                if stop_event.is_set():
+                    await asyncio.to_thread(queue_manager.nack, task)
+                    slots.release()
+                    break
+                running = asyncio.create_task(
+                    run_task(task, queue_manager, browser_pool, webhook_dispatcher, session_cache,
+                             captcha_solver, result_cache))
+                in_flight.add(running)
+                running.add_done_callback(on_task_done)
+            logging.info("Shutdown requested. No more tasks will be dequeued.")
+        finally:
+            for job in background:
+                job.cancel()
+            await shutdown(in_flight)
+            await webhook_dispatcher.close()
+            if token_pool:
+                await token_pool.close()
+            await browser_pool.close()
+            shutdown_parse_executor()
+            queue_manager.unregister_worker(worker_id)
+            # The session cache's Redis connections
+            await close_async_redis()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,112 @@
+import json
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import fakeredis
+import pytest
+
+_results: List[Dict[str, Any]] = []
+
+
+def pytest_addoption(parser: pytest.Parser):
+    """Add the parser benchmark options."""
+    group = parser.getgroup('parser benchmarks')
+    group.addoption(
+        '--bench-iterations', type=int, default=5, help='Timed runs per parser benchmark (the median is reported).'
+    )
+    group.addoption('--bench-save', metavar='PATH', help='Write the parser benchmark results to a JSON file.')
+    group.addoption(
+        '--bench-compare',
+        metavar='PATH',
+        help='Fail benchmarks slower than the results saved in PATH by more than --bench-tolerance.',
+    )
+    group.addoption(
+        '--bench-tolerance',
+        type=float,
+        default=1.5,
+        help='Allowed slowdown factor against --bench-compare (default 1.5).',
+    )
+
+
+@pytest.fixture
+def redis_server() -> fakeredis.FakeServer:
+    """Start an in-memory Redis server with Lua scripting, shared by the sync and asyncio clients of a test."""
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def redis_client(redis_server: fakeredis.FakeServer) -> fakeredis.FakeRedis:
+    """Connect a synchronous client to ``redis_server``."""
+    return fakeredis.FakeRedis(server=redis_server, decode_responses=True)
+
+
+@pytest.fixture
+def async_redis_client(redis_server: fakeredis.FakeServer) -> fakeredis.FakeAsyncRedis:
+    """Connect an asyncio client to ``redis_server``."""
+    return fakeredis.FakeAsyncRedis(server=redis_server, decode_responses=True)
+
+
+@pytest.fixture(scope='session')
+def bench_baseline(pytestconfig: pytest.Config) -> Dict[str, Dict[str, Any]]:
+    """Load the benchmark results given with --bench-compare, by name."""
+    path = pytestconfig.getoption('--bench-compare')
+    if not path:
+        return {}
+    return {entry['name']: entry for entry in json.loads(Path(path).read_text())}
+
+
+@pytest.fixture
+def parser_benchmark(pytestconfig: pytest.Config, bench_baseline: Dict[str, Dict[str, Any]]):
+    """Time ``parse(payload)`` and measure its peak allocations; returns the parse result."""
+    iterations = pytestconfig.getoption('--bench-iterations')
+    tolerance = pytestconfig.getoption('--bench-tolerance')
+
+    def run(name: str, parse: Callable[[Any], Any], payload: Any) -> Any:
+        result = parse(payload)  # Warm-up (imports, selector compilation)
+
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            parse(payload)
+            timings.append(time.perf_counter() - started)
+
+        tracemalloc.start()
+        try:
+            parse(payload)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        entry = {
+            'name': name,
+            'median_ms': statistics.median(timings) * 1000,
+            'min_ms': min(timings) * 1000,
+            'peak_kib': peak / 1024,
+        }
+        _results.append(entry)
+
+        baseline = bench_baseline.get(name)
+        if baseline and entry['median_ms'] > baseline['median_ms'] * tolerance:
+            pytest.fail(f'{name} regressed: {entry["median_ms"]:.2f} ms vs {baseline["median_ms"]:.2f} ms baseline')
+        return result
+
+    return run
+
+
+def pytest_terminal_summary(terminalreporter, config: pytest.Config):
+    """Report the parser benchmark results and save them with --bench-save."""
+    if not _results:
+        return
+    terminalreporter.section('parser benchmarks')
+    terminalreporter.write_line(f'{"benchmark":40} {"median ms":>10} {"min ms":>10} {"peak KiB":>10}')
+    for entry in _results:
+        terminalreporter.write_line(
+            f'{entry["name"]:40} {entry["median_ms"]:10.2f} {entry["min_ms"]:10.2f} {entry["peak_kib"]:10.0f}'
+        )
+    path = config.getoption('--bench-save')
+    if path:
+        Path(path).write_text(json.dumps(_results, indent=2))
+        terminalreporter.write_line(f'Saved to {path}')
@@ -0,0 +1,46 @@
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from bs4 import BeautifulSoup
+
+from src.dto.table_data import TableSnapshot
+
+HTML_DIR = Path(__file__).parent / 'html'
+
+# Marked blocks, either as plain HTML or escaped inside a hidden input's value
+_ROW_BLOCK = re.compile(
+    r'<!-- fixture-row -->(.*?)<!-- /fixture-row -->|&lt;!-- fixture-row --&gt;(.*?)&lt;!-- /fixture-row --&gt;',
+    re.DOTALL,
+)
+
+
+@lru_cache(maxsize=None)
+def _read(name: str) -> str:
+    return (HTML_DIR / name).read_text(encoding='utf-8')
+
+
+def load_page(name: str, rows: int = 1) -> str:
+    """Return a saved page with every marked row block repeated ``rows`` times (``__N__`` is the row number)."""
+
+    def repeat(match: re.Match) -> str:
+        block = match.group(1) if match.group(1) is not None else match.group(2)
+        return ''.join(block.replace('__N__', str(n)) for n in range(1, rows + 1))
+
+    return _ROW_BLOCK.sub(repeat, _read(name))
+
+
+def snapshot_table(
+    html: str, selector: str, body_rows: str = 'tbody tr', footer_rows: str = 'tfoot tr'
+) -> Optional[TableSnapshot]:
+    """Offline equivalent of ``src.browser.table_extractor.extract_table`` for a saved page."""
+    table = BeautifulSoup(html, 'html.parser').select_one(selector)
+    if table is None:
+        return None
+    return {
+        # innerText renders <br> as a line break
+        'headers': [th.get_text('\n').strip() for th in table.select('thead th')],
+        'rows': [[td.get_text() for td in row.select('td')] for row in table.select(body_rows)],
+        'footer': [[td.get_text() for td in row.select('td')] for row in table.select(footer_rows)],
+    }
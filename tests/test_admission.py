@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from src.browser.admission import AdmissionController, AdmissionRejectedError
+
+
+async def test_requests_beyond_the_wait_queue_are_rejected_right_away():
+    """With every slot busy and the wait queue full, a request is rejected with the default Retry-After."""
+    admission = AdmissionController(
+        'test.full', max_concurrent=1, max_waiting=1, wait_timeout=1.0, default_retry_after=7
+    )
+    release = asyncio.Event()
+
+    async def hold():
+        """Hold a slot until released."""
+        async with admission.admit():
+            await release.wait()
+
+    running = asyncio.create_task(hold())
+    waiting = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    assert admission.stats()['in_flight'] == 1 and admission.stats()['waiting'] == 1
+
+    with pytest.raises(AdmissionRejectedError) as rejected:
+        async with admission.admit():
+            pass
+    assert rejected.value.retry_after == 7
+
+    release.set()
+    await asyncio.gather(running, waiting)
+    assert admission.stats()['in_flight'] == 0
+
+
+async def test_waiting_is_bounded_by_the_timeout():
+    """A request waiting longer than the timeout for a slot is rejected and leaves the wait queue."""
+    admission = AdmissionController('test.timeout', max_concurrent=1, max_waiting=4, wait_timeout=0.05)
+
+    async with admission.admit():
+        with pytest.raises(AdmissionRejectedError):
+            async with admission.admit():
+                pass
+    assert admission.stats()['waiting'] == 0
+
+    async with admission.admit():
+        pass
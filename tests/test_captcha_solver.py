@@ -0,0 +1,52 @@
+import asyncio
+
+from src.scrapers.captcha_solver import CaptchaSolver, ResilientCaptchaSolver, create_captcha_solver
+
+
+class FakeBackend(CaptchaSolver):
+    """A backend that takes ``seconds`` to solve and records which backends were running meanwhile."""
+
+    def __init__(self, name: str, seconds: float, in_page: bool, running: set, overlaps: list):
+        self.name = name
+        self.seconds = seconds
+        self.in_page = in_page
+        self.running = running
+        self.overlaps = overlaps
+
+    async def solve(self, page):
+        """Solve after ``seconds``, noting any backend already running."""
+        self.overlaps.extend(self.running)
+        self.running.add(self.name)
+        try:
+            await asyncio.sleep(self.seconds)
+        finally:
+            self.running.discard(self.name)
+
+
+def make_solver(hedge_in_page: bool):
+    """Build a chain whose slow in-page primary runs past the hedge delay and times out."""
+    running: set = set()
+    overlaps: list = []
+    backends = [
+        FakeBackend('slow', 1.0, True, running, overlaps),
+        FakeBackend('hedge', 0.01, hedge_in_page, running, overlaps),
+    ]
+    return ResilientCaptchaSolver(backends, attempt_timeout=0.1, hedge_quantile=0.9, hedge_default_delay=0.02), overlaps
+
+
+async def test_only_page_free_backends_hedge_an_in_page_backend():
+    """A page-free backend races the late primary, an in-page one waits until the primary is cancelled."""
+    solver, overlaps = make_solver(hedge_in_page=False)
+    await solver.solve(page=None)
+    assert overlaps == ['slow']
+
+    solver, overlaps = make_solver(hedge_in_page=True)
+    await solver.solve(page=None)
+    assert overlaps == []
+
+
+def test_solver_chain_builds_without_an_api_key(monkeypatch):
+    """The CapSolver key is only needed to solve, so CMF-only processes can build the chain."""
+    monkeypatch.delenv('CAPSOLVER_API_KEY', raising=False)
+    monkeypatch.setattr('src.scrapers.captcha_solver.CAPTCHA_SOLVER', 'capsolver,token,audio')
+    assert [backend.name for backend in create_captcha_solver().backends] == ['capsolver', 'token', 'audio']
@@ -0,0 +1,59 @@
+import asyncio
+from typing import cast
+
+from src.scrapers.captcha_token_pool import CapSolverTokenClient, RecaptchaTokenPool
+
+
+class FakeTokenClient:
+    """Stands in for the CapSolver client, handing out numbered tokens."""
+
+    def __init__(self):
+        self.solved = 0
+        self.closed = False
+
+    async def solve(self) -> str:
+        """Return the next token."""
+        self.solved += 1
+        return f'token-{self.solved}'
+
+    async def close(self):
+        """Record that the pool closed its client."""
+        self.closed = True
+
+
+def make_pool(demand: int, max_size: int = 3, ttl: float = 100.0):
+    """Build a pool over a fake client with a fixed demand."""
+    client = FakeTokenClient()
+
+    async def current_demand() -> int:
+        return demand
+
+    return RecaptchaTokenPool(
+        cast(CapSolverTokenClient, client), current_demand, max_size=max_size, ttl=ttl, refill_interval=0.01
+    ), client
+
+
+async def test_refill_follows_demand_up_to_the_pool_size():
+    """Refills solve as many tokens as the demand, capped by the pool size, and none when idle."""
+    pool, client = make_pool(demand=5, max_size=3)
+    await pool.refill()
+    await pool.refill()  # Solves in flight count towards the demand
+    await asyncio.sleep(0)
+    assert client.solved == 3
+    assert [pool.take() for _ in range(4)] == ['token-1', 'token-2', 'token-3', None]
+
+    idle, idle_client = make_pool(demand=0)
+    await idle.refill()
+    assert idle_client.solved == 0
+
+
+async def test_expired_tokens_are_dropped():
+    """Tokens older than the TTL are never handed out."""
+    pool, client = make_pool(demand=1, ttl=0.0)
+    await pool.refill()
+    await asyncio.sleep(0.01)
+    assert pool.take() is None
+    assert pool._expired.value >= 1
+
+    await pool.close()
+    assert client.closed
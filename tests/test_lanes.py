@@ -0,0 +1,37 @@
+import pytest
+
+from src.queue.lanes import LaneScheduler, lane_tiers
+
+
+def drain(scheduler: LaneScheduler, backlog: dict, count: int) -> list:
+    """Take ``count`` tasks the way the take script does: from the first non-empty lane in order."""
+    taken = []
+    for _ in range(count):
+        lane = next((lane for lane in scheduler.order() if backlog.get(lane)), None)
+        if lane is None:
+            scheduler.idle()
+            break
+        backlog[lane] -= 1
+        scheduler.served(lane)
+        taken.append(lane)
+    return taken
+
+
+def test_backlogged_lanes_share_dequeues_by_weight():
+    """While every lane is backlogged, each one hands out tasks in proportion to its weight."""
+    scheduler = LaneScheduler(lane_tiers(['cmf', 'afc']), {'cmf': 3, 'afc': 1, 'cmf:high': 1, 'afc:high': 1})
+    taken = drain(scheduler, {'cmf': 100, 'afc': 100}, 8)
+    assert taken == ['cmf', 'cmf', 'cmf', 'afc', 'cmf', 'cmf', 'cmf', 'afc']
+
+
+def test_high_priority_first_and_empty_lanes_are_skipped():
+    """High priority lanes are served first, and empty lanes lose their turn."""
+    scheduler = LaneScheduler(lane_tiers(['cmf', 'afc']), {'cmf': 2, 'afc': 2, 'cmf:high': 1, 'afc:high': 1})
+    taken = drain(scheduler, {'afc:high': 1, 'cmf': 1, 'afc': 5}, 5)
+    assert taken == ['afc:high', 'cmf', 'afc', 'afc', 'afc']
+
+
+def test_unknown_lanes_are_rejected():
+    """Subscribing to a scraper type without a lane is an error."""
+    with pytest.raises(ValueError):
+        lane_tiers(['cmf', 'pdf'])
@@ -0,0 +1,54 @@
+from typing import Any, Callable, Dict, Tuple
+
+import pytest
+
+from src.parsers.afc_parser import parse_cotizaciones_table, parse_empresas_table
+from src.parsers.cmf_parser import parse_debt_table, parse_line_of_credit_table
+from src.parsers.sii_parser import parse_acreditar_renta
+from tests.fixtures.corpus import load_page, snapshot_table
+
+ROW_COUNTS = (1, 50, 500)
+
+# Page -> (build the parser input for n rows, parser). CMF parses table snapshots, the others raw HTML.
+PAGES: Dict[str, Tuple[Callable[[int], Any], Callable[[Any], Any]]] = {
+    'cmf_debt': (
+        lambda rows: snapshot_table(
+            load_page('cmf_debt_table.html', rows),
+            '#tabla_deuda_directa',
+            'tbody#tabla_deuda_directa_data tr',
+            'tfoot tr.tr-totales',
+        ),
+        parse_debt_table,
+    ),
+    'cmf_credit_lines': (
+        lambda rows: snapshot_table(
+            load_page('cmf_credit_lines_table.html', rows), '#tabla_lineas_credito', footer_rows='tfoot tr.tr-totales'
+        ),
+        parse_line_of_credit_table,
+    ),
+    'afc_empresas': (lambda rows: load_page('afc_empresas_table.html', rows), parse_empresas_table),
+    'afc_cotizaciones': (
+        lambda rows: load_page('afc_cotizaciones_table.html', rows),
+        lambda html: parse_cotizaciones_table(html, '2023'),
+    ),
+    'sii_acreditar_renta': (lambda rows: load_page('sii_cte_frame.html', rows), parse_acreditar_renta),
+}
+
+
+def row_count(page: str, result: Any) -> int:
+    """Rows the parser produced, to check the scaled fixture was fully parsed."""
+    if page == 'sii_acreditar_renta':
+        return len(result['honorary_ticket_data']['tickets'])
+    if page.startswith('cmf'):
+        return len(result['data'])
+    return len(result)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('rows', ROW_COUNTS)
+@pytest.mark.parametrize('page', PAGES)
+def test_parse_benchmark(page: str, rows: int, parser_benchmark):
+    """Time each parser over the corpus pages at several table sizes."""
+    build, parse = PAGES[page]
+    result = parser_benchmark(f'{page}[{rows}]', parse, build(rows))
+    assert row_count(page, result) == rows
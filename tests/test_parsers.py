@@ -0,0 +1,132 @@
+from typing import Any, Mapping
+
+import pytest
+
+from src.parsers.afc_parser import (
+    parse_cotizaciones_page,
+    parse_cotizaciones_table,
+    parse_empresas_page,
+    parse_empresas_table,
+)
+from src.parsers.cmf_parser import credit_lines_availability, parse_debt_table, parse_line_of_credit_table
+from src.parsers.html_backend import SUPPORTED_BACKENDS, backend_available
+from src.parsers.sii_parser import parse_acreditar_renta
+from tests.fixtures.corpus import load_page, snapshot_table
+
+AVAILABLE_BACKENDS = [backend for backend in SUPPORTED_BACKENDS if backend_available(backend)]
+
+
+def without_timestamp(result: Mapping[str, Any]) -> dict:
+    """Drop the parse timestamp, which differs between runs."""
+    return {key: value for key, value in result.items() if key != 'timestamp'}
+
+
+def test_cmf_debt_table():
+    """The CMF debt table is parsed row by row, with its totals row."""
+    table = snapshot_table(
+        load_page('cmf_debt_table.html', 3),
+        '#tabla_deuda_directa',
+        'tbody#tabla_deuda_directa_data tr',
+        'tfoot tr.tr-totales',
+    )
+    result = parse_debt_table(table)
+    assert len(result['data']) == 3
+    assert result['data'][0] == {
+        'institution': 'BANCO EJEMPLO 1',
+        'credit_type': 'Consumo',
+        'total_credit': 1250000,
+        'current': 1180000,
+        'late_30_59': 70000,
+        'late_60_89': 0,
+        'late_90_plus': 0,
+    }
+    assert result['totals']['total_credit'] == 1250000
+
+
+def test_cmf_credit_lines_share_one_snapshot():
+    """Availability and the credit lines table are both read from one table snapshot."""
+    table = snapshot_table(
+        load_page('cmf_credit_lines_table.html', 2), '#tabla_lineas_credito', footer_rows='tfoot tr.tr-totales'
+    )
+    assert credit_lines_availability(table) == {'direct': True, 'indirect': False}
+    result = parse_line_of_credit_table(table)
+    assert [entry['institution'] for entry in result['data']] == ['BANCO EJEMPLO 1', 'BANCO EJEMPLO 2']
+    assert result['totals'] == {'direct': 500000, 'indirect': 0}
+    assert credit_lines_availability(None) == {'direct': False, 'indirect': False}
+
+
+def test_afc_tables():
+    """AFC employers and contributions are parsed, dropping the totals row."""
+    companies = parse_empresas_table(load_page('afc_empresas_table.html', 2))
+    assert companies[1] == {
+        'employer_rut': '76.000.2-0',
+        'employer_name': 'EMPRESA EJEMPLO 2 SPA',
+        'start_date': '01/03/2019',
+        'end_date': '31/12/2022',
+        'status': 'Vigente',
+    }
+
+    contributions = parse_cotizaciones_table(load_page('afc_cotizaciones_table.html', 2), '2023')
+    # The totals row is dropped
+    assert [entry['period'] for entry in contributions] == ['2023-1', '2023-2']
+    assert contributions[0]['taxable_income'] == 950000
+
+
+def test_afc_pages_keep_the_postback_state():
+    """An AFC page keeps the form fields needed to replay its postback over HTTP."""
+    table = load_page('afc_cotizaciones_table.html', 2)
+    page = f"""<form method="post" action="CrtPagadas.aspx?periodo=2024" id="aspnetForm">
+        <input type="hidden" name="__VIEWSTATE" value="state"><input type="hidden" name="__EVENTTARGET" value="">
+        <input type="submit" name="btn" value="Buscar"><input type="checkbox" name="unchecked">
+        <select name="ctl00$contentPlaceHolder$ddlPeriodo" id="contentPlaceHolder_ddlPeriodo">
+          <option value="2024">2024</option><option value="2023" selected>2023</option></select>
+        <table id="contentPlaceHolder_dgBusqueda">{table}</table></form>"""
+
+    search = parse_cotizaciones_page(page, '2023')
+    assert search['period'] == '2023'
+    assert [entry['period'] for entry in search['entries']] == ['2023-1', '2023-2']
+    assert search['form_action'] == 'CrtPagadas.aspx?periodo=2024'
+    assert search['form_fields'] == {
+        '__VIEWSTATE': 'state',
+        '__EVENTTARGET': '',
+        'ctl00$contentPlaceHolder$ddlPeriodo': '2023',
+    }
+    # Another period needs a postback first
+    assert parse_cotizaciones_page(page, '2024')['entries'] is None
+
+    companies_page = f'<table id="contentPlaceHolder_gvEmpresas">{load_page("afc_empresas_table.html", 3)}</table>'
+    assert len(parse_empresas_page(companies_page)) == 3
+    assert parse_empresas_page('<html><body>Ingresa con ClaveÚnica</body></html>') is None
+
+
+def test_sii_acreditar_renta():
+    """Every section of the SII Carpeta Tributaria frame is parsed."""
+    result = parse_acreditar_renta(load_page('sii_cte_frame.html', 2))
+    assert result['header_data']['rut'] == '11111111'
+    assert result['contributor_data']['economic_activities'][0] == {
+        'code': '620200',
+        'description': 'ACTIVIDADES DE CONSULTORIA DE INFORMATICA',
+    }
+    assert result['contributor_data']['branches'] == 'No registra'
+    assert len(result['property_data']['properties']) == 2
+    assert len(result['honorary_ticket_data']['tickets']) == 2
+    declarations = result['tax_declaration_data']['declarations']
+    assert [(d['tax_year'], d['form_number']) for d in declarations] == [(2025, '1 / 2'), (2024, '2 / 2')]
+    assert declarations[0]['details']['21'] == {'concept': 'Otro concepto de ejemplo 1', 'value': '$ 98.765'}
+    assert 'AÑO' not in declarations[0]['details']
+
+
+@pytest.mark.parametrize('backend', AVAILABLE_BACKENDS)
+def test_backends_produce_identical_dtos(backend: str):
+    """Every available BeautifulSoup backend yields the same DTOs."""
+    reference = SUPPORTED_BACKENDS[-1]
+    html = load_page('sii_cte_frame.html', 5)
+    assert without_timestamp(parse_acreditar_renta(html, backend)) == without_timestamp(
+        parse_acreditar_renta(html, reference)
+    )
+    for name, parse in (
+        ('afc_empresas_table.html', parse_empresas_table),
+        ('afc_cotizaciones_table.html', lambda html, b: parse_cotizaciones_table(html, '2023', b)),
+    ):
+        html = load_page(name, 5)
+        assert parse(html, backend) == parse(html, reference)
@@ -0,0 +1,184 @@
+import threading
+import time
+
+from src.queue.models import Task
+from src.queue.queue_manager import AsyncQueueManager, QueueManager
+
+
+def make_task(task_id: str = 't1', scraper_type: str = 'cmf') -> Task:
+    """Build a task for the given scraper type."""
+    return Task(
+        task_id=task_id,
+        username='11.111.111-1',
+        password='password',
+        webhook_url='http://example.com/hook',
+        scraper_type=scraper_type,
+    )
+
+
+def test_dequeued_tasks_are_leased_until_acked(redis_client):
+    """A dequeued task sits in the worker's processing list with a lease until it is acked."""
+    queue = QueueManager(redis_client=redis_client, visibility_timeout=60)
+    queue.enqueue(make_task())
+
+    task = queue.dequeue_blocking('w1', timeout=1)
+    assert task is not None and task.task_id == 't1'
+    assert redis_client.llen(queue.processing_list('w1')) == 1
+    assert redis_client.zcard(queue.leases_key) == 1
+    assert queue.is_empty()
+
+    queue.ack(task)
+    assert redis_client.llen(queue.processing_list('w1')) == 0
+    assert redis_client.zcard(queue.leases_key) == 0
+    assert queue.dequeue_blocking('w1', timeout=0.1) is None
+
+
+def test_reaper_requeues_expired_leases_only(redis_client):
+    """Tasks whose lease expired go back to their lane; extended or acked ones stay put."""
+    queue = QueueManager(redis_client=redis_client, visibility_timeout=60)
+    queue.register_worker('w1')
+    queue.enqueue(make_task('stuck'))
+    queue.enqueue(make_task('alive'))
+    stuck = queue.dequeue_blocking('w1', timeout=1)
+    alive = queue.dequeue_blocking('w1', timeout=1)
+    assert stuck is not None and alive is not None
+
+    redis_client.zadd(queue.leases_key, {stuck._receipt: time.time() - 1, alive._receipt: time.time() - 1})
+    assert queue.extend_lease(alive)
+    assert queue.reap_expired() == 1
+
+    requeued = queue.dequeue_blocking('w2', timeout=1)
+    assert requeued is not None and requeued.task_id == 'stuck'
+    # The lost lease can no longer be extended or acked by the first worker
+    assert not queue.extend_lease(stuck)
+    queue.ack(stuck)
+    assert redis_client.llen(queue.processing_list('w2')) == 1
+
+
+def test_nack_puts_the_current_task_state_back(redis_client):
+    """A nacked task is released and queued again with the state it had when handed back."""
+    queue = QueueManager(redis_client=redis_client, visibility_timeout=60)
+    queue.enqueue(make_task())
+    task = queue.dequeue_blocking('w1', timeout=1)
+    assert task is not None
+    task.retries = 2
+
+    queue.nack(task)
+    assert redis_client.zcard(queue.leases_key) == 0
+    again = queue.dequeue_blocking('w1', timeout=1)
+    assert again is not None and again.retries == 2
+
+
+def test_scheduled_retries_are_promoted_once_due(redis_client):
+    """A retry waits in the scheduled set until due, then goes back to its lane exactly once."""
+    queue = QueueManager(redis_client=redis_client, visibility_timeout=60)
+    queue.enqueue(make_task('later'))
+    queue.enqueue(make_task('now', scraper_type='afc'))
+    later = queue.dequeue_blocking('w1', timeout=1)
+    now = queue.dequeue_blocking('w1', timeout=1)
+    assert later is not None and now is not None
+
+    queue.schedule_retry(later, delay=60)
+    queue.schedule_retry(now, delay=0)
+    assert redis_client.zcard(queue.leases_key) == 0
+    assert redis_client.llen(queue.processing_list('w1')) == 0
+    assert queue.get_scheduled_size() == 2
+
+    assert queue.promote_due() == 1
+    assert queue.promote_due() == 0
+    assert queue.get_scheduled_size() == 1
+    promoted = queue.dequeue_blocking('w1', timeout=1)
+    assert promoted is not None and promoted.task_id == 'now'
+    assert queue.dequeue_blocking('w1', timeout=0.1) is None
+
+
+def test_failed_tasks_end_in_the_dlq(redis_client):
+    """Moving a task to the DLQ releases its lease."""
+    queue = QueueManager(redis_client=redis_client, visibility_timeout=60)
+    queue.enqueue(make_task())
+    task = queue.dequeue_blocking('w1', timeout=1)
+    assert task is not None
+
+    queue.enqueue_dlq(task)
+    assert redis_client.zcard(queue.leases_key) == 0
+    assert redis_client.lrange(queue.dlq_name, 0, -1)[0] == task.json()
+
+
+async def test_enqueue_unique_enqueues_once_per_dedup_key(redis_client, async_redis_client):
+    """The first task claiming a key is enqueued, later ones get its id back and are not enqueued."""
+    producer = AsyncQueueManager(redis_client=async_redis_client)
+    assert await producer.enqueue_unique(make_task('first'), 'dedup:user', ttl=60) is None
+    assert await producer.enqueue_unique(make_task('second'), 'dedup:user', ttl=60) == 'first'
+    assert 0 < redis_client.ttl('dedup:user') <= 60
+
+    queue = QueueManager(redis_client=redis_client, visibility_timeout=60)
+    assert queue.get_queue_size() == 1
+    task = queue.dequeue_blocking('w1', timeout=1)
+    assert task is not None and task.task_id == 'first'
+
+
+async def test_enqueue_unique_many_dedups_within_the_batch(redis_client, async_redis_client):
+    """A batch reports, per entry, the task holding its key, including earlier entries of the same batch."""
+    producer = AsyncQueueManager(redis_client=async_redis_client)
+    assert await producer.enqueue_unique(make_task('queued'), 'dedup:a', ttl=60) is None
+
+    entries = [
+        (make_task('t1'), 'dedup:a'),
+        (make_task('t2', scraper_type='afc'), 'dedup:b'),
+        (make_task('t3', scraper_type='afc'), 'dedup:b'),
+    ]
+    assert await producer.enqueue_unique_many(entries, ttl=60) == ['queued', None, 't2']
+    assert await producer.enqueue_unique_many([], ttl=60) == []
+
+    queue = QueueManager(redis_client=redis_client, visibility_timeout=60)
+    assert queue.get_queue_size() == 2
+
+
+def test_idle_workers_only_wake_up_for_their_own_lanes(redis_client):
+    """A task rings its lane's doorbell only, so an idle worker of another lane cannot swallow the wakeup."""
+    cmf_worker = QueueManager(redis_client=redis_client, visibility_timeout=60, lanes=['cmf'])
+    afc_worker = QueueManager(redis_client=redis_client, visibility_timeout=60, lanes=['afc'])
+    taken = {}
+
+    def work(name: str, queue: QueueManager):
+        """Block for a task like an idle worker."""
+        taken[name] = queue.dequeue_blocking(name, timeout=1)
+
+    workers = [threading.Thread(target=work, args=args) for args in (('cmf', cmf_worker), ('afc', afc_worker))]
+    for worker in workers:
+        worker.start()
+    time.sleep(0.1)  # Both workers are blocked on their doorbells
+    afc_worker.enqueue(make_task('afc-task', scraper_type='afc'))
+    for worker in workers:
+        worker.join()
+
+    assert taken['cmf'] is None
+    assert taken['afc'] is not None and taken['afc'].task_id == 'afc-task'
+    assert redis_client.llen(afc_worker.doorbell_key(afc_worker.lane_key('afc'))) == 0
+
+
+def test_a_wakeup_for_another_lane_is_handed_back(redis_client):
+    """A worker woken by one lane but served by another gives the wakeup back to the first lane."""
+    queue = QueueManager(redis_client=redis_client, visibility_timeout=60, lanes=['cmf', 'afc'])
+    queue.enqueue(make_task('afc-task', scraper_type='afc'))
+    queue.enqueue(make_task('cmf-task', scraper_type='cmf'))
+    afc_doorbell = queue.doorbell_key(queue.lane_key('afc'))
+    cmf_doorbell = queue.doorbell_key(queue.lane_key('cmf'))
+    redis_client.lpop(afc_doorbell)  # Consumed by the wakeup
+
+    task = queue._take_next('w1', woken_by=afc_doorbell)
+    assert task is not None and task.task_id == 'cmf-task'
+    assert redis_client.llen(afc_doorbell) == 1
+    assert redis_client.llen(cmf_doorbell) == 0
+
+
+def test_peek_by_lane_type_sees_past_other_backlogs(redis_client):
+    """Peeking the afc and all lanes finds their tasks behind any backlog of the other lanes."""
+    queue = QueueManager(redis_client=redis_client, visibility_timeout=60)
+    for index in range(5):
+        queue.enqueue(make_task(f'cmf-{index}', scraper_type='cmf'))
+    queue.enqueue(make_task('afc-task', scraper_type='afc'))
+    queue.enqueue(make_task('all-task', scraper_type='all'))
+
+    assert all(task.scraper_type == 'cmf' for task in queue.peek(3))
+    assert sorted(task.task_id for task in queue.peek(3, ('afc', 'all'))) == ['afc-task', 'all-task']
@@ -0,0 +1,26 @@
+from src.browser.request_filter import RequestFilter
+
+RECAPTCHA_SCRIPT = 'https://www.google.com/recaptcha/api.js'
+RECAPTCHA_IMAGE = 'https://www.google.com/recaptcha/api2/payload?p=challenge'
+
+
+def test_recaptcha_is_only_allowed_on_the_sites_that_solve_it():
+    """An AFC page loads reCAPTCHA and its challenge images, CMF and SII pages do not."""
+    request_filter = RequestFilter()
+    afc_page = 'https://webafiliados.afc.cl/WUI.AAP.OVIRTUAL/Default.aspx'
+    assert not request_filter.should_block(RECAPTCHA_SCRIPT, 'script', afc_page)
+    assert not request_filter.should_block(RECAPTCHA_IMAGE, 'image', afc_page)
+    assert request_filter.should_block('https://webafiliados.afc.cl/img/logo.png', 'image', afc_page)
+
+    for page in ('https://conocetudeuda.cmfchile.cl/informe-deudas/', 'https://zeus.sii.cl/cvc/'):
+        assert request_filter.should_block(RECAPTCHA_SCRIPT, 'script', page)
+        assert not request_filter.should_block(page, 'document', page)
+
+
+def test_fonts_and_analytics_are_blocked_everywhere():
+    """Font stylesheets and analytics are denied by URL whatever the site."""
+    request_filter = RequestFilter()
+    for page in ('https://webafiliados.afc.cl/', 'https://conocetudeuda.cmfchile.cl/', 'http://localhost:8001/'):
+        assert request_filter.should_block('https://fonts.googleapis.com/css?family=Roboto', 'stylesheet', page)
+        assert request_filter.should_block('https://www.googletagmanager.com/gtag/js', 'script', page)
+        assert not request_filter.should_block(f'{page}styles.css', 'stylesheet', page)
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from src.cache.result_cache import ResultCache
+from src.models.clave_unica import ClaveUnica
+
+
+class FakeRedis:
+    """The subset of the asyncio Redis client used by the cache, over a dict."""
+
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        """Return the stored value, or None."""
+        return self.values.get(key)
+
+    async def setex(self, key, ttl, value):
+        """Store a value, ignoring its TTL."""
+        self.values[key] = value
+
+    async def delete(self, key):
+        """Drop a value."""
+        self.values.pop(key, None)
+
+
+def counting_scrape(result):
+    """Build a scrape returning ``result``, with the list of its calls."""
+    calls = []
+
+    async def scrape():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return result
+
+    return scrape, calls
+
+
+async def test_identical_scrapes_share_one_run_and_the_cached_result():
+    """Concurrent identical scrapes run once, and the encrypted result serves later ones with the same password."""
+    redis = FakeRedis()
+    cache = ResultCache('secret', redis_client=redis)
+    scrape, calls = counting_scrape({'debt_data': {'total': 1000}})
+    clave_unica = ClaveUnica('11.111.111-1', 'password')
+
+    results = await asyncio.gather(*(cache.get_or_run(clave_unica, scrape, 'cmf') for _ in range(3)))
+    assert results == [{'debt_data': {'total': 1000}}] * 3
+    assert len(calls) == 1
+
+    assert await cache.get_or_run(clave_unica, scrape, 'cmf') == {'debt_data': {'total': 1000}}
+    assert len(calls) == 1
+    # Stored encrypted, and out of reach of anyone with another password
+    assert b'1000' not in next(iter(redis.values.values()))
+    await cache.get_or_run(ClaveUnica('11.111.111-1', 'another'), scrape, 'cmf')
+    assert len(calls) == 2
+
+
+async def test_failures_and_partial_results_are_not_cached():
+    """Failed scrapes and 'all' results with per-source errors are never cached."""
+    cache = ResultCache('secret', redis_client=FakeRedis())
+    clave_unica = ClaveUnica('11.111.111-1', 'password')
+
+    async def failing():
+        raise RuntimeError('login failed')
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_run(clave_unica, failing, 'sii')
+
+    partial, calls = counting_scrape({'data': {'cmf': {}}, 'errors': {'afc': 'timeout'}})
+    await cache.get_or_run(clave_unica, partial, 'all', sources=['cmf', 'afc'])
+    await cache.get_or_run(clave_unica, partial, 'all', sources=['afc', 'cmf'])
+    assert len(calls) == 2
@@ -0,0 +1,55 @@
+import asyncio
+from typing import List
+
+import httpx
+
+from src.queue.retry_policy import RetryPolicy
+from src.webhooks.webhook_dispatcher import WebhookDispatcher
+
+
+def dispatcher_answering(statuses: List[int], calls: List[str], max_attempts: int = 3) -> WebhookDispatcher:
+    """Build a dispatcher whose receiver answers with ``statuses`` in turn, recording each request."""
+    answers = iter(statuses)
+
+    def receive(request: httpx.Request) -> httpx.Response:
+        calls.append(str(request.url))
+        return httpx.Response(next(answers))
+
+    dispatcher = WebhookDispatcher(
+        concurrency=2,
+        max_attempts=max_attempts,
+        retry_policy=RetryPolicy(base_delay=0.01, max_delay=0.01, jitter=0),
+    )
+    dispatcher.client = httpx.AsyncClient(transport=httpx.MockTransport(receive))
+    return dispatcher
+
+
+async def wait_for_requests(calls: List[str], count: int):
+    """Wait until the receiver has been called ``count`` times, retries included."""
+    while len(calls) < count:
+        await asyncio.sleep(0.01)
+
+
+async def test_server_errors_are_retried_until_delivered():
+    """A 503 is retried with backoff and the notification is still delivered before close returns."""
+    calls: List[str] = []
+    dispatcher = dispatcher_answering([503, 502, 200], calls)
+    await dispatcher.start()
+    await dispatcher.submit('http://receiver.test/hook', {'status': 'success'})
+    await asyncio.wait_for(wait_for_requests(calls, 3), timeout=5)
+    await dispatcher.close(drain_timeout=1)
+    assert calls == ['http://receiver.test/hook'] * 3
+
+
+async def test_client_errors_and_exhausted_attempts_are_not_retried():
+    """A 4xx is final, and a failing receiver gets at most ``max_attempts`` requests."""
+    calls: List[str] = []
+    dispatcher = dispatcher_answering([404, 500, 500, 500], calls, max_attempts=2)
+    await dispatcher.start()
+    await dispatcher.submit('http://receiver.test/gone', {'status': 'failed'})
+    await dispatcher._outbox.join()
+    await dispatcher.submit('http://receiver.test/down', {'status': 'failed'})
+    await asyncio.wait_for(wait_for_requests(calls, 3), timeout=5)
+    await asyncio.sleep(0.1)  # Longer than the retry delay: no third attempt follows
+    await dispatcher.close(drain_timeout=1)
+    assert calls == ['http://receiver.test/gone', 'http://receiver.test/down', 'http://receiver.test/down']